@@ -0,0 +1,250 @@
+# Client of the echo services of the MEC server, measuring the application-level latency from a UE.
+#
+# The UE images have no Python: the client runs on the host, in the network namespace of the UE container
+# (`nsenter -t <pid> -n python3 echo_client.py ...`, see `Runner.run_in_network`), bound to the uesimtun
+# interface of the session under test. It prints one JSON object with the samples of every reply.
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+from mec_server import ECHO_HEADER, ECHO_PORT, TCP_LENGTH
+
+# Default number of messages sent, interval between them (seconds) and size of a message (bytes)
+COUNT = 20
+INTERVAL = 0.05
+SIZE = 64
+# Default number of seconds to wait for the replies after the last message
+TIMEOUT = 2
+# Largest message: the payload of a UDP datagram
+MAX_SIZE = 65507
+# Socket option binding a socket to an interface (not exposed by every Python version)
+SO_BINDTODEVICE = getattr(socket, "SO_BINDTODEVICE", 25)
+
+
+class EchoSamples:
+    """
+    Collects the latency of the replies of an echo test.
+
+    The client and the server run on the same host (in different network namespaces), so they share the
+    same clock and the one-way latencies are measured with their timestamps.
+    """
+
+    def __init__(self):
+        """Initializes an EchoSamples object, without any message sent."""
+        self.sent = 0
+        self.replies = {}  # Round-trip, uplink and downlink latency (ms) of every reply, by sequence number
+
+    def message(self, size):
+        """
+        Builds the next message, with its sequence number and its send time, and counts it as sent.
+
+        Args:
+            size (int): The size of the message in bytes (at least the size of the header).
+
+        Returns:
+            bytearray: The message.
+        """
+        message = bytearray(size)
+        ECHO_HEADER.pack_into(message, 0, self.sent, time.time_ns(), 0)
+        self.sent += 1
+        return message
+
+    def add_reply(self, reply):
+        """
+        Records a reply (duplicated, unknown and truncated replies are ignored).
+
+        Args:
+            reply (bytes): The reply of the server.
+        """
+        received = time.time_ns()
+        if len(reply) < ECHO_HEADER.size:
+            return
+
+        sequence, sent, reflected = ECHO_HEADER.unpack_from(reply)
+        if sequence >= self.sent or sequence in self.replies:
+            return
+
+        self.replies[sequence] = ((received - sent) / 1e6, (reflected - sent) / 1e6, (received - reflected) / 1e6)
+
+    @property
+    def complete(self):
+        """bool: True if every message sent got its reply."""
+        return len(self.replies) == self.sent
+
+    def result(self):
+        """
+        Returns the results of the test.
+
+        Returns:
+            dict: The number of messages "sent" and "received", and the "rtt", "uplink" and "downlink"
+                  latency of every reply (ms, in order of sequence number).
+        """
+        samples = [self.replies[sequence] for sequence in sorted(self.replies)]
+        return {
+            "sent": self.sent,
+            "received": len(samples),
+            "rtt": [round(rtt, 3) for rtt, _, _ in samples],
+            "uplink": [round(uplink, 3) for _, uplink, _ in samples],
+            "downlink": [round(downlink, 3) for _, _, downlink in samples],
+        }
+
+
+def open_socket(kind, interface=None, address=None):
+    """
+    Opens a non-blocking socket bound to an interface and a source address.
+
+    Args:
+        kind (int): socket.SOCK_DGRAM or socket.SOCK_STREAM.
+        interface (str): The interface of the session (e.g. "uesimtun1"), None for the default route.
+        address (str): The source address (the address of the interface), None for any.
+
+    Returns:
+        socket.socket: The socket.
+    """
+    sock = socket.socket(socket.AF_INET, kind)
+    if interface:
+        sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, interface.encode())
+    if address:
+        sock.bind((address, 0))
+    sock.setblocking(False)
+    return sock
+
+
+async def send_messages(samples, send, count, interval, size):
+    # Send the messages at a fixed rate, whatever the time taken by every send
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for sequence in range(count):
+        await asyncio.sleep(max(0.0, start + sequence * interval - loop.time()))
+        await send(samples.message(size))
+
+
+async def wait_replies(samples, timeout):
+    # Wait for the missing replies, the ones still missing after the timeout are lost
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not samples.complete and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+
+
+async def udp_echo(server, port, interface, address, count, interval, size, timeout):
+    """
+    Runs an echo test over UDP.
+
+    Args:
+        server (str): Address of the MEC server.
+        port (int): Port of the UDP echo service.
+        interface (str): Interface of the session under test.
+        address (str): Address of the interface.
+        count (int): Number of messages.
+        interval (float): Seconds between two messages.
+        size (int): Size of a message in bytes.
+        timeout (float): Seconds to wait for the replies after the last message.
+
+    Returns:
+        dict: The results (see `EchoSamples.result`).
+    """
+    loop = asyncio.get_running_loop()
+    samples = EchoSamples()
+
+    sock = open_socket(socket.SOCK_DGRAM, interface, address)
+    sock.connect((server, port))
+
+    class Receiver(asyncio.DatagramProtocol):
+        def datagram_received(self, data, addr):
+            samples.add_reply(data)
+
+    transport, _ = await loop.create_datagram_endpoint(Receiver, sock=sock)
+    try:
+        async def send(message):
+            transport.sendto(message)
+
+        await send_messages(samples, send, count, interval, size)
+        await wait_replies(samples, timeout)
+    finally:
+        transport.close()
+
+    return samples.result()
+
+
+async def tcp_echo(server, port, interface, address, count, interval, size, timeout):
+    """
+    Runs an echo test over a TCP connection (the replies missing at the end of the test are counted as lost).
+
+    Args:
+        server (str): Address of the MEC server.
+        port (int): Port of the TCP echo service.
+        interface (str): Interface of the session under test.
+        address (str): Address of the interface.
+        count (int): Number of messages.
+        interval (float): Seconds between two messages.
+        size (int): Size of a message in bytes.
+        timeout (float): Seconds to wait for the connection, and for the replies after the last message.
+
+    Returns:
+        dict: The results (see `EchoSamples.result`).
+    """
+    loop = asyncio.get_running_loop()
+    samples = EchoSamples()
+
+    sock = open_socket(socket.SOCK_STREAM, interface, address)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, (server, port)), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    reader, writer = await asyncio.open_connection(sock=sock)
+
+    async def receive():
+        while True:
+            length = TCP_LENGTH.unpack(await reader.readexactly(TCP_LENGTH.size))[0]
+            samples.add_reply(await reader.readexactly(length))
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        async def send(message):
+            writer.write(TCP_LENGTH.pack(len(message)) + message)
+            await writer.drain()
+
+        await send_messages(samples, send, count, interval, size)
+        await wait_replies(samples, timeout)
+    finally:
+        receiver.cancel()
+        writer.close()
+
+    return samples.result()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the latency to the echo services of the MEC server.")
+    parser.add_argument("server", help="Address of the MEC server.")
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp", help="Protocol of the test (default: udp).")
+    parser.add_argument("--port", type=int, default=ECHO_PORT, help=f"Port of the echo service (default: {ECHO_PORT}).")
+    parser.add_argument("--interface", default=None, help="Interface of the session under test (e.g. uesimtun1).")
+    parser.add_argument("--address", default=None, help="Source address (the address of the interface).")
+    parser.add_argument("-c", "--count", type=int, default=COUNT, help=f"Number of messages (default: {COUNT}).")
+    parser.add_argument("-i", "--interval", type=float, default=INTERVAL,
+                        help=f"Seconds between two messages (default: {INTERVAL}).")
+    parser.add_argument("-s", "--size", type=int, default=SIZE, help=f"Size of a message in bytes (default: {SIZE}).")
+    parser.add_argument("-W", "--timeout", type=float, default=TIMEOUT,
+                        help=f"Seconds to wait for the replies after the last message (default: {TIMEOUT}).")
+    args = parser.parse_args()
+
+    if not ECHO_HEADER.size <= args.size <= MAX_SIZE:
+        parser.error(f"The size must be between {ECHO_HEADER.size} and {MAX_SIZE} bytes")
+    if args.count < 1 or args.interval < 0:
+        parser.error("The count must be positive and the interval not negative")
+
+    echo = udp_echo if args.protocol == "udp" else tcp_echo
+    try:
+        result = asyncio.run(echo(args.server, args.port, args.interface, args.address,
+                                  args.count, args.interval, args.size, args.timeout))
+    except (OSError, asyncio.TimeoutError) as e:
+        print(json.dumps({"error": str(e) or type(e).__name__}))
+        raise SystemExit(1)
+
+    print(json.dumps(result))
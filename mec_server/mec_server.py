@@ -1,44 +1,305 @@
+import argparse
+import asyncio
 import socket
 import struct
+import time
 
-def icmp_listener():
+# Default number of seconds between two statistics lines
+STATS_INTERVAL = 10
+# Size of the receive buffer, reused for every packet (the largest IPv4 packet)
+BUFFER_SIZE = 65535
+# Size requested for the receive queue of the socket in the kernel, to absorb the bursts of many UEs
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024
+# Maximum number of packets read each time the socket is readable, before letting the other tasks run
+BATCH_SIZE = 64
+# Maximum number of sources listed in a statistics line (the busiest ones)
+TOP_SOURCES = 10
+# ICMP type and code of an Echo Request (ping request)
+ICMP_ECHO_REQUEST = (8, 0)
+# Default port of the UDP and TCP echo services
+ECHO_PORT = 9000
+# Header of the echo messages: sequence number, send time of the client and receive time of the server
+# (nanoseconds since the epoch: the containers share the clock of the host)
+ECHO_HEADER = struct.Struct("!IQQ")
+# Offset of the receive time of the server in the header
+SERVER_TIME_OFFSET = 12
+# Length prefix of the echo messages over TCP (a stream has no message boundaries)
+TCP_LENGTH = struct.Struct("!H")
+
+
+def parse_icmp(packet, length):
+    """
+    Returns the type and the code of the ICMP message carried by an IPv4 packet.
+
+    The ICMP message starts after the IP header, whose length is given by the IHL field (in 32-bit words):
+    it is longer than 20 bytes when the packet carries IP options.
+
+    Args:
+        packet (bytearray): The buffer holding the packet (IP header included, as received by a raw socket).
+        length (int): The length of the packet in the buffer.
+
+    Returns:
+        tuple or None: The ICMP type and code, or None if the packet is truncated.
+    """
+    if length < 20:
+        return None
+
+    header_length = (packet[0] & 0x0F) * 4
+    if header_length < 20 or length < header_length + 8:
+        return None
+
+    return packet[header_length], packet[header_length + 1]
+
+
+class SourceCounters:
+    """
+    Counts the packets and the bytes received from every source address, in memory.
+
+    The counters are never printed per packet: `report` returns one aggregated line for the packets
+    received since the previous report.
+    """
+
+    def __init__(self, name):
+        """
+        Initializes a SourceCounters object.
+
+        Args:
+            name (str): Name of the counted packets in the reports (e.g. "ICMP echo requests").
+        """
+        self.name = name
+        self.packets = {}  # Packets received from every source, by address
+        self.bytes = {}  # Bytes received from every source, by address
+        self._reported = {}  # Packets received from every source at the previous report
+
+    def add(self, source, length):
+        """
+        Counts a packet.
+
+        Args:
+            source (str): The source address.
+            length (int): The length of the packet in bytes.
+        """
+        self.packets[source] = self.packets.get(source, 0) + 1
+        self.bytes[source] = self.bytes.get(source, 0) + length
+
+    @property
+    def total(self):
+        """int: The number of packets received from all the sources."""
+        return sum(self.packets.values())
+
+    def report(self, elapsed):
+        """
+        Returns the statistics of the packets received since the previous report.
+
+        Args:
+            elapsed (float): The number of seconds since the previous report.
+
+        Returns:
+            str: One line with the number and the rate of the packets, the number of active sources and
+                 the packets of the busiest ones.
+        """
+        interval = {source: count - self._reported.get(source, 0) for source, count in self.packets.items()}
+        interval = {source: count for source, count in interval.items() if count}
+        self._reported = dict(self.packets)
+
+        count = sum(interval.values())
+        busiest = sorted(interval.items(), key=lambda item: item[1], reverse=True)[:TOP_SOURCES]
+        sources = " ".join(f"{source}={packets}" for source, packets in busiest)
+        if len(interval) > TOP_SOURCES:
+            sources += f" (+{len(interval) - TOP_SOURCES} more)"
+
+        return (f"{time.strftime('%Y-%m-%d %H:%M:%S')} {self.name}: {count} in {elapsed:.1f}s "
+                f"({count / elapsed if elapsed else 0:.1f}/s) from {len(interval)} sources, "
+                f"{self.total} in total{': ' + sources if sources else ''}")
+
+
+class IcmpListener:
+    """
+    Counts the ICMP Echo Requests (ping requests) received by the server, per source address.
+
+    The raw socket is non-blocking and watched by the event loop: every time it is readable, up to
+    `batch_size` packets are read into the same buffer, so a ping flood from many UEs neither allocates a
+    buffer per packet nor starves the other tasks of the server.
+    """
+
+    def __init__(self, counters, batch_size=BATCH_SIZE):
+        """
+        Initializes an IcmpListener object.
+
+        Args:
+            counters (SourceCounters): The counters of the Echo Requests.
+            batch_size (int): Maximum number of packets read each time the socket is readable.
+        """
+        self.counters = counters
+        self.batch_size = batch_size
+        self.buffer = bytearray(BUFFER_SIZE)
+
+        # Create a raw socket receiving the ICMP packets, with their IP header
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        self.socket.setblocking(False)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+
+    def start(self, loop):
+        """
+        Starts reading the packets in the event loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The running event loop.
+        """
+        loop.add_reader(self.socket.fileno(), self._read)
+
+    def _read(self):
+        # Drain up to a batch of packets: the loop calls again while the socket is still readable
+        for _ in range(self.batch_size):
+            try:
+                length, (source, _) = self.socket.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+
+            if parse_icmp(self.buffer, length) == ICMP_ECHO_REQUEST:
+                self.counters.add(source, length)
+
+
+def reflect(message):
+    """
+    Writes the receive time of the server in an echo message, the rest of the message is echoed unchanged.
+
+    Args:
+        message (bytearray): The message (messages shorter than the header are echoed unchanged).
+
+    Returns:
+        bytearray: The message.
+    """
+    if len(message) >= ECHO_HEADER.size:
+        struct.pack_into("!Q", message, SERVER_TIME_OFFSET, time.time_ns())
+    return message
+
+
+class UdpReflector(asyncio.DatagramProtocol):
+    """Sends every UDP datagram back to its source, with the receive time of the server (see `reflect`)."""
+
+    def __init__(self, counters):
+        """
+        Initializes a UdpReflector object.
+
+        Args:
+            counters (SourceCounters): The counters of the echo requests.
+        """
+        self.counters = counters
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.counters.add(addr[0], len(data))
+        self.transport.sendto(reflect(bytearray(data)), addr)
+
+
+async def tcp_reflector(counters, reader, writer):
     """
-    Listens for incoming ICMP Echo Request (ping) packets and prints the address of the client.
+    Sends every message of a TCP connection back to the client, with the receive time of the server.
 
-    This function creates a raw socket to listen for ICMP Echo Requests (ping requests) and prints the
-    source address when such a request is received.
+    Every message is preceded by its length (see `TCP_LENGTH`).
 
-    The server will continuously listen for ICMP packets and handle them accordingly.
+    Args:
+        counters (SourceCounters): The counters of the echo requests.
+        reader (asyncio.StreamReader): The stream of the client.
+        writer (asyncio.StreamWriter): The stream to the client.
     """
-    
-    # Create a raw socket to listen for ICMP packets
-    icmp_socket = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
-    
-    # Set a timeout for the socket (optional; to avoid hanging indefinitely)
-    icmp_socket.settimeout(5)  # Timeout of 5 seconds
-    
-    print("Server started.")
-    
-    # Infinite loop to continuously listen for packets
+    source = writer.get_extra_info("peername")[0]
+
+    # Send the replies at once, without waiting for more data to fill a segment
+    writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    try:
+        while True:
+            length = TCP_LENGTH.unpack(await reader.readexactly(TCP_LENGTH.size))[0]
+            message = reflect(bytearray(await reader.readexactly(length)))
+            counters.add(source, length)
+            writer.write(TCP_LENGTH.pack(length) + message)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # The client closed the connection
+    finally:
+        writer.close()
+
+
+async def report_stats(counters, interval):
+    """
+    Prints the statistics of the counters at a fixed interval.
+
+    Args:
+        counters (list): The SourceCounters objects to report.
+        interval (float): The number of seconds between two reports.
+    """
+    loop = asyncio.get_running_loop()
+    last = loop.time()
+
     while True:
-        try:
-            # Receive an ICMP packet (maximum size 65565 bytes)
-            packet, addr = icmp_socket.recvfrom(65565)
-            
-            # Extract the ICMP header (start from byte 20 to byte 28)
-            icmp_header = packet[20:28]
-            
-            # Unpack the ICMP header to get type, code, and other fields
-            icmp_type, icmp_code, _, _, _ = struct.unpack("bbHHh", icmp_header)
-            
-            # Check if the packet is an ICMP Echo Request (ping request)
-            if icmp_type == 8 and icmp_code == 0:
-                # ICMP Echo Request received, print the source address
-                print(f"Received a ping request from client: {addr}")
-        
-        except socket.timeout:
-            # Handle socket timeout (if no packet is received within the timeout period)
-            pass
+        await asyncio.sleep(interval)
+        now = loop.time()
+        for source_counters in counters:
+            print(source_counters.report(now - last), flush=True)
+        last = now
+
+
+async def serve(interval=STATS_INTERVAL, udp_port=ECHO_PORT, tcp_port=ECHO_PORT):
+    """
+    Runs the MEC server: counts the ping requests, reflects the UDP and TCP echo messages, and prints their
+    statistics periodically.
+
+    Args:
+        interval (float): The number of seconds between two statistics lines.
+        udp_port (int): Port of the UDP echo service (0: disabled).
+        tcp_port (int): Port of the TCP echo service (0: disabled).
+    """
+    loop = asyncio.get_running_loop()
+
+    icmp_counters = SourceCounters("ICMP echo requests")
+    IcmpListener(icmp_counters).start(loop)
+    counters = [icmp_counters]
+
+    if udp_port:
+        udp_counters = SourceCounters("UDP echo requests")
+        await loop.create_datagram_endpoint(lambda: UdpReflector(udp_counters), local_addr=("0.0.0.0", udp_port))
+        counters.append(udp_counters)
+
+    if tcp_port:
+        tcp_counters = SourceCounters("TCP echo requests")
+        await asyncio.start_server(lambda reader, writer: tcp_reflector(tcp_counters, reader, writer),
+                                   "0.0.0.0", tcp_port)
+        counters.append(tcp_counters)
+
+    print(f"Server started (UDP echo port: {udp_port or 'disabled'}, TCP echo port: {tcp_port or 'disabled'}).",
+          flush=True)
+    await report_stats(counters, interval)
+
 
 if __name__ == "__main__":
-    icmp_listener()  # Start the ICMP listener when the script is run
+    parser = argparse.ArgumentParser(description="MEC server counting the ping requests of the UEs and "
+                                                 "reflecting their UDP and TCP echo messages.")
+    parser.add_argument(
+        "-i", "--interval",
+        type=float,
+        default=STATS_INTERVAL,
+        help=f"Seconds between two statistics lines (default: {STATS_INTERVAL})."
+    )
+    parser.add_argument(
+        "--udp-port",
+        type=int,
+        default=ECHO_PORT,
+        help=f"Port of the UDP echo service, 0 to disable it (default: {ECHO_PORT})."
+    )
+    parser.add_argument(
+        "--tcp-port",
+        type=int,
+        default=ECHO_PORT,
+        help=f"Port of the TCP echo service, 0 to disable it (default: {ECHO_PORT})."
+    )
+    args = parser.parse_args()
+
+    if args.interval <= 0:
+        parser.error("The interval must be positive")
+
+    asyncio.run(serve(args.interval, args.udp_port, args.tcp_port))  # Start the server when the script is run
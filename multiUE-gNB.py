@@ -2,20 +2,86 @@ import os
 
 from comnetsemu.cli import CLI
 from comnetsemu.net import Containernet
+from comnetsemu.node import DockerHost
 from mininet.link import TCLink
 from mininet.log import info, setLogLevel
 from mininet.node import Controller
 
-from python_modules.Open5GS import Open5GS
-import sys
+from python_modules.Open5GS import AsyncOpen5GS
+from python_modules.allocator import Allocator
+import python_modules.allocator as allocation
+from python_modules.docker_api import create_runner
+from python_modules.attach import AttachTracker, containers_of
+from python_modules.attach_storm import ARRIVALS, ARRIVAL_RATE, arrival_times, start_storm, storm_report
+from python_modules.readiness import READY_TIMEOUT, LogProbe, signal_stage, sctp_listening, tcp_listening, wait_until
+import argparse
 
 import ueransim.config.ue_setup as ue_setup
 import ueransim.config.gnb_setup as gnb_setup
 import python_modules.ue_configuration as ue_configuration
-import json
-import math
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 
+# Default number of Docker hosts created at the same time
+HOST_WORKERS = 8
+# SBI address of the NRF and NGAP port of the AMF (see open5gs/config/nrf.yaml and amf.yaml)
+NRF_SBI = ("127.0.0.10", 7777)
+NGAP_PORT = 38412
+# Timeout of a readiness check executed in a container (seconds)
+PROBE_TIMEOUT = 5
+# Maximum number of seconds to wait for all the UEs to be attached
+ATTACH_TIMEOUT = 120
+
+# Lock of the bookkeeping of the network while Docker hosts are created concurrently (see `add_docker_host`)
+net_lock = threading.Lock()
+
+
+def host_env(name):
+    """
+    Returns the environment variables of a Docker host.
+
+    Every host gets its own copy of the shared environment, so the hosts can be created concurrently.
+
+    Args:
+        name (str): The name of the host, passed as COMPONENT_NAME.
+
+    Returns:
+        dict: The environment variables of the host.
+    """
+    return dict(env, COMPONENT_NAME=name)
+
+
+def add_docker_host(name, **params):
+    """
+    Adds a Docker host to the network, like `Containernet.addDockerHost`, from any thread.
+
+    The bookkeeping of Mininet in `addHost` (counter of the default IP and MAC addresses, `net.hosts`,
+    `net.nameToNode`) is not thread-safe, so it runs under a lock. The lock is only released while the
+    host itself is constructed, which creates and starts its container and its shell: the slow part,
+    which only touches the new host and the Docker daemon, runs in parallel.
+
+    Args:
+        name (str): The name of the host.
+        **params: The parameters of the host (see `Containernet.addDockerHost`).
+
+    Returns:
+        DockerHost: The host.
+    """
+
+    def construct(name, **defaults):
+        # Called by `addHost` between the two parts of its bookkeeping, with the lock held
+        net_lock.release()
+        try:
+            return DockerHost(name, **defaults)
+        finally:
+            net_lock.acquire()
+
+    with net_lock:
+        return net.addHost(name, cls=construct, **params)
+
 def instantiate_cp():
     """
     Instantiates the Open5GS Control Plane (CP) as a Docker container with the necessary configurations.
@@ -30,16 +96,14 @@ def instantiate_cp():
     # Log message indicating the addition of the Control Plane host
     info("*** Adding Host for open5gs CP\n")
     
-    # Set environment variable for the component name
-    env["COMPONENT_NAME"] = "cp"
-    
     # Add the Docker host for Open5GS CP with necessary configurations
-    cp = net.addDockerHost(
+    cp = add_docker_host(
         "cp",  # Name of the host
         dimage="my5gc_v2-4-4",  # Docker image for the Open5GS Control Plane
-        ip="192.168.0.111/24",  # IP address for the CP container
+        ip=allocator.interface(allocator.address("cp")),  # IP address for the CP container
         dcmd="bash /open5gs/install/etc/open5gs/5gc_cp_init.sh",  # Command to initialize the CP
         docker_args={
+            "environment": host_env("cp"),  # Pass environment variables to the container
             "ports": {"3000/tcp": 3000},  # Map port 3000 for web interface access
             "volumes": {
                 prj_folder + "/log": {
@@ -83,17 +147,14 @@ def instantiate_upf_cld():
     # Log message indicating the addition of the User Plane Function (UPF) Cloud host
     info("*** Adding Host for open5gs UPF\n")
     
-    # Set environment variable for the component name
-    env["COMPONENT_NAME"] = "upf_cld"
-    
     # Add the Docker host for Open5GS UPF Cloud with necessary configurations
-    upf_cld = net.addDockerHost(
+    upf_cld = add_docker_host(
         "upf_cld",  # Name of the host
         dimage="my5gc_v2-4-4",  # Docker image for the Open5GS UPF Cloud
-        ip="192.168.0.112/24",  # IP address for the UPF Cloud container
+        ip=allocator.interface(allocator.address("upf_cld")),  # IP address for the UPF Cloud container
         dcmd="bash /open5gs/install/etc/open5gs/temp/5gc_up_init.sh",  # Command to initialize the UPF Cloud
         docker_args={
-            "environment": env,  # Pass environment variables to the container
+            "environment": host_env("upf_cld"),  # Pass environment variables to the container
             "volumes": {
                 prj_folder + "/log": {
                     "bind": "/open5gs/install/var/log/open5gs",  # Bind project log folder to UPF logs
@@ -135,17 +196,14 @@ def instantiate_upf_mec():
     # Log message indicating the addition of the User Plane Function (UPF) MEC host
     info("*** Adding Host for open5gs UPF MEC\n")
     
-    # Set environment variable for the component name
-    env["COMPONENT_NAME"] = "upf_mec"
-    
     # Add the Docker host for Open5GS UPF MEC with necessary configurations
-    upf_mec = net.addDockerHost(
+    upf_mec = add_docker_host(
         "upf_mec",  # Name of the host
         dimage="my5gc_v2-4-4",  # Docker image for the Open5GS UPF MEC
-        ip="192.168.0.113/24",  # IP address for the UPF MEC container
+        ip=allocator.interface(allocator.address("upf_mec")),  # IP address for the UPF MEC container
         dcmd="bash /open5gs/install/etc/open5gs/temp/5gc_up_init.sh",  # Command to initialize the UPF MEC
         docker_args={
-            "environment": env,  # Pass environment variables to the container
+            "environment": host_env("upf_mec"),  # Pass environment variables to the container
             "volumes": {
                 prj_folder + "/log": {
                     "bind": "/open5gs/install/var/log/open5gs",  # Bind project log folder to UPF logs
@@ -187,17 +245,14 @@ def instantiate_mec_server():
     # Log message indicating the addition of the MEC Server host
     info("*** Adding MEC SERVER\n")
     
-    # Set environment variable for the component name
-    env["COMPONENT_NAME"] = "mec_server"
-    
     # Add the Docker host for MEC Server with necessary configurations
-    mec_server = net.addDockerHost(
+    mec_server = add_docker_host(
         "mec_server",  # Name of the host
         dimage="mec_server",  # Docker image for the MEC Server
-        ip="192.168.0.140/24",  # IP address for the MEC Server container
+        ip=allocator.interface(allocator.address("mec_server")),  # IP address for the MEC Server container
         dcmd="bash /mnt/mec_server/mec_server.sh",  # Command to initialize the MEC Server
         docker_args={
-            "environment": env,  # Pass environment variables to the container
+            "environment": host_env("mec_server"),  # Pass environment variables to the container
             "volumes": {
                 prj_folder + "/mec_server": {
                     "bind": "/mnt/mec_server",  # Bind project folder to MEC server
@@ -223,167 +278,283 @@ def instantiate_mec_server():
     # Return the instantiated MEC Server Docker container
     return mec_server
 
-def instantiate_gnbs(ngNB):
+def instantiate_gnb(i):
     """
-    Instantiates multiple gNodeBs (gNBs) as Docker containers with the necessary configurations.
+    Instantiates a gNodeB (gNB) as a Docker container with the necessary configurations.
 
-    This function adds the specified number of gNB containers to the network, binds relevant volumes for
-    logging, configuration, and time-related files, and initializes each gNB container using the specified
-    startup script.
+    This function adds the gNB container to the network, binds relevant volumes for logging, configuration,
+    and time-related files, and initializes the gNB container using the specified startup script.
 
     Args:
-        ngNB (int): The number of gNodeBs (gNBs) to instantiate.
+        i (int): The number of the gNodeB (starting from 1).
 
     Returns:
-        list: A list of instantiated gNodeB (gNB) Docker containers.
+        gnb (DockerHost): The instantiated gNodeB (gNB) Docker container.
     """
     
-    # Log message indicating the addition of the gNB hosts
-    info("*** Adding gNB\n")
+    # Log message indicating the addition of the gNB host
+    info(f"*** Adding gNB {i}\n")
     
-    # List to hold instantiated gNB Docker containers
-    gnb_list = []
-    
-    # Loop through the range of gNBs to instantiate
-    for i in range(1, ngNB + 1):
-        # Set the environment variable for the component name (e.g., "gnb1", "gnb2", etc.)
-        env["COMPONENT_NAME"] = f"gnb{i}"
-        
-        # Add the Docker host for each gNB with necessary configurations
-        gnb_list.append(net.addDockerHost(
-            f"gnb{i}",  # Name of the host (e.g., gnb1, gnb2)
-            dimage="myueransim_v3-2-6",  # Docker image for the gNB
-            ip=f"192.168.0.{130 + i}/24",  # IP address for the gNB container
-            dcmd=f"bash /mnt/ueransim/open5gs_gnb_init.sh {i}",  # Command to initialize the gNB
-            docker_args={
-                "environment": env,  # Pass environment variables to the container
-                "volumes": {
-                    prj_folder + "/ueransim/config": {
-                        "bind": "/mnt/ueransim",  # Bind project configuration folder
-                        "mode": "rw",  # Read-write mode
-                    },
-                    prj_folder + "/log": {
-                        "bind": "/mnt/log",  # Bind log folder
-                        "mode": "rw",  # Read-write mode
-                    },
-                    "/etc/timezone": {
-                        "bind": "/etc/timezone",  # Bind timezone file
-                        "mode": "ro",  # Read-only mode
-                    },
-                    "/etc/localtime": {
-                        "bind": "/etc/localtime",  # Bind localtime file
-                        "mode": "ro",  # Read-only mode
-                    },
-                    "/dev": {
-                        "bind": "/dev",  # Bind /dev directory for device access
-                        "mode": "rw",  # Read-write mode
-                    },
+    # Add the Docker host for the gNB with necessary configurations
+    gnb = add_docker_host(
+        f"gnb{i}",  # Name of the host (e.g., gnb1, gnb2)
+        dimage="myueransim_v3-2-6",  # Docker image for the gNB
+        ip=allocator.interface(allocator.gnb_ip(i)),  # IP address for the gNB container
+        dcmd=f"bash /mnt/ueransim/open5gs_gnb_init.sh {i}",  # Command to initialize the gNB
+        docker_args={
+            "environment": host_env(f"gnb{i}"),  # Pass environment variables to the container
+            "volumes": {
+                prj_folder + "/ueransim/config": {
+                    "bind": "/mnt/ueransim",  # Bind project configuration folder
+                    "mode": "rw",  # Read-write mode
+                },
+                prj_folder + "/log": {
+                    "bind": "/mnt/log",  # Bind log folder
+                    "mode": "rw",  # Read-write mode
+                },
+                "/etc/timezone": {
+                    "bind": "/etc/timezone",  # Bind timezone file
+                    "mode": "ro",  # Read-only mode
+                },
+                "/etc/localtime": {
+                    "bind": "/etc/localtime",  # Bind localtime file
+                    "mode": "ro",  # Read-only mode
+                },
+                "/dev": {
+                    "bind": "/dev",  # Bind /dev directory for device access
+                    "mode": "rw",  # Read-write mode
                 },
-                "cap_add": ["NET_ADMIN"],  # Add NET_ADMIN capability to the container
-                "devices": "/dev/net/tun:/dev/net/tun:rwm"  # Grant access to TUN device for networking
             },
-        ))
+            "cap_add": ["NET_ADMIN"],  # Add NET_ADMIN capability to the container
+            "devices": "/dev/net/tun:/dev/net/tun:rwm"  # Grant access to TUN device for networking
+        },
+    )
     
-    # Return the list of instantiated gNodeB Docker containers
-    return gnb_list
+    # Return the instantiated gNodeB Docker container
+    return gnb
 
-def instantiate_ues(nUE):
+def instantiate_ue(i, nUE):
     """
-    Instantiates multiple User Equipments (UEs) as Docker containers with the necessary configurations.
+    Instantiates a User Equipment (UE) container with the necessary configurations.
 
-    This function adds the specified number of UE containers to the network, binds relevant volumes for
-    logging, configuration, and time-related files, and initializes each UE container using the specified
-    startup script.
+    This function adds the UE container to the network, binds relevant volumes for logging, configuration,
+    and time-related files, and initializes the UE container using the specified startup script.
+    By default every UE has its own container; in packed mode (see `Allocator`) a container runs several
+    UEs in a single `nr-ue -n` process, each with its own uesimtun interfaces.
 
     Args:
-        nUE (int): The number of User Equipments (UEs) to instantiate.
+        i (int): The number of the UE container (starting from 1).
+        nUE (int): The total number of User Equipments (UEs).
 
     Returns:
-        list: A list of instantiated UE (User Equipment) Docker containers.
+        ue (DockerHost): The instantiated UE Docker container.
     """
     
-    # Log message indicating the addition of the User Equipment (UE) hosts
-    info("*** Adding UE\n")
+    # Log message indicating the addition of the User Equipment (UE) host
+    info(f"*** Adding UE container {i}\n")
     
-    # List to hold instantiated UE Docker containers
-    ue_list = []
-    
-    # Loop through the range of UEs to instantiate
-    for i in range(1, nUE + 1):
-        # Set the environment variable for the component name (e.g., "ue1", "ue2", etc.)
-        env["COMPONENT_NAME"] = f"ue{i}"
-        
-        # Add the Docker host for each UE with necessary configurations
-        ue_list.append(net.addDockerHost(
-            f"ue{i}",  # Name of the host (e.g., ue1, ue2)
-            dimage="myueransim_v3-2-6",  # Docker image for the UE
-            ip=f"192.168.0.{140 + i}/24",  # IP address for the UE container
-            dcmd=f"bash /mnt/ueransim/open5gs_ue_init.sh {i}",  # Command to initialize the UE
-            docker_args={
-                "environment": env,  # Pass environment variables to the container
-                "volumes": {
-                    prj_folder + "/ueransim/config": {
-                        "bind": "/mnt/ueransim",  # Bind project configuration folder
-                        "mode": "rw",  # Read-write mode
-                    },
-                    prj_folder + "/log": {
-                        "bind": "/mnt/log",  # Bind log folder for the UE
-                        "mode": "rw",  # Read-write mode
-                    },
-                    "/etc/timezone": {
-                        "bind": "/etc/timezone",  # Bind timezone file
-                        "mode": "ro",  # Read-only mode
-                    },
-                    "/etc/localtime": {
-                        "bind": "/etc/localtime",  # Bind localtime file
-                        "mode": "ro",  # Read-only mode
-                    },
-                    "/dev": {
-                        "bind": "/dev",  # Bind /dev directory for device access
-                        "mode": "rw",  # Read-write mode
-                    },
+    # Name of the container (e.g., "ue1", "ue2", or "uepack1" when packed)
+    name = allocator.container_name(i)
+
+    # In packed mode the init script starts as many UEs as the container hosts
+    dcmd = f"bash /mnt/ueransim/open5gs_ue_init.sh {i}"
+    if allocator.packed:
+        dcmd += f" {len(allocator.container_ues(i, nUE))}"
+
+    # Add the Docker host for the UE(s) with necessary configurations
+    ue = add_docker_host(
+        name,  # Name of the host (e.g., ue1, ue2)
+        dimage="myueransim_v3-2-6",  # Docker image for the UE
+        ip=allocator.interface(allocator.ue_ip(i)),  # IP address for the UE container
+        dcmd=dcmd,  # Command to initialize the UE(s)
+        docker_args={
+            "environment": host_env(name),  # Pass environment variables to the container
+            "volumes": {
+                prj_folder + "/ueransim/config": {
+                    "bind": "/mnt/ueransim",  # Bind project configuration folder
+                    "mode": "rw",  # Read-write mode
+                },
+                prj_folder + "/log": {
+                    "bind": "/mnt/log",  # Bind log folder for the UE
+                    "mode": "rw",  # Read-write mode
+                },
+                "/etc/timezone": {
+                    "bind": "/etc/timezone",  # Bind timezone file
+                    "mode": "ro",  # Read-only mode
+                },
+                "/etc/localtime": {
+                    "bind": "/etc/localtime",  # Bind localtime file
+                    "mode": "ro",  # Read-only mode
+                },
+                "/dev": {
+                    "bind": "/dev",  # Bind /dev directory for device access
+                    "mode": "rw",  # Read-write mode
                 },
-                "cap_add": ["NET_ADMIN"],  # Add NET_ADMIN capability to the container
-                "devices": "/dev/net/tun:/dev/net/tun:rwm"  # Grant access to TUN device for networking
             },
-        ))
+            "cap_add": ["NET_ADMIN"],  # Add NET_ADMIN capability to the container
+            "devices": "/dev/net/tun:/dev/net/tun:rwm"  # Grant access to TUN device for networking
+        },
+    )
     
-    # Return the list of instantiated UE Docker containers
-    return ue_list
+    # Return the instantiated UE Docker container
+    return ue
 
-def add_subscribers(nUE):
+async def add_subscribers(nUE):
     """
-    Adds subscribers to Open5GS from a JSON configuration file.
+    Adds the subscribers of the UEs to Open5GS.
 
-    This function reads a JSON file containing subscriber information and adds each subscriber to 
-    Open5GS using the `addSubscriber` method. It logs the number of successfully added subscribers.
+    This function generates the subscriber profiles lazily and resets the Open5GS subscribers to exactly
+    these profiles (`resetSubscribers`), applying only the difference with the subscribers already
+    provisioned. The profiles are also written to `python_modules/subscribers.json` while they are
+    consumed. The writes are batched and run concurrently by the asynchronous Open5GS API, so that the
+    provisioning can overlap with the creation of the Docker hosts. It logs the number of subscribers
+    added, updated and removed.
 
     Args:
-        nUE (int): The number of User Equipment (UE) subscribers to add (though not directly used in the function).
+        nUE (int): The number of User Equipment (UE) subscribers to add.
+
+    Raises:
+        ConnectionError: If MongoDB does not accept connections in time.
     """
     
-    # Generate the subscriber configuration JSON
-    ue_configuration.generate_json(nUE)
+    # MongoDB is started with the CP container: wait until it accepts connections
+    if not await wait_until(o5gs.ping):
+        raise ConnectionError(f"MongoDB not reachable at {o5gs.o5gs.server}:{o5gs.o5gs.port} after "
+                              f"{READY_TIMEOUT}s, is the cp container the first one of the Docker bridge?")
+    info("*** Open5GS: MongoDB ready\n")
     
-    # Open the subscribers JSON file and load its content
-    with open(prj_folder + "/python_modules/subscribers.json", 'r') as f:
-        data = json.load(f)
+    # Generate the subscriber profiles, saving a copy to the subscribers file on the way (no re-read)
+    subscribers = ue_configuration.write_subscribers(ue_configuration.generate_subscribers(nUE, allocator=allocator),
+                                                     prj_folder + "/python_modules/subscribers.json")
+    
+    # Reset the Open5GS subscribers to the profiles (the unchanged ones are not rewritten)
+    added, updated, removed = await o5gs.resetSubscribers(subscribers)
+    
+    # Log the changes applied to the subscribers
+    info(f"*** Open5GS: Successfully added {added}, updated {updated} and removed {removed} subscribers\n")
+
+def upfs_associated(probe, count=2):
+    """
+    Checks in the log of the SMF that the UPFs are associated (PFCP).
+
+    Args:
+        probe (LogProbe): Probe of the SMF log, matching the "PFCP associated" lines.
+        count (int): The number of UPFs.
+
+    Returns:
+        bool: True if all the UPFs are associated.
+    """
+    # Depending on the version, the SMF logs the address of the UPF or only "PFCP associated"
+    matches = probe.poll()
+    addresses = {match.group(1) for match in matches if match.group(1)}
+    return len(addresses or matches) >= count
+
+async def bring_up(nUE, ngNB, arrival=None, times=None):
+    """
+    Starts the components of the network in order, every one as soon as the ones it depends on are ready.
 
-    # Check if "subscribers" key exists in the loaded JSON data
-    if "subscribers" in data:
-        subscribers = data["subscribers"]
-        n = 0
+    The init scripts of the containers wait for the signal of their stage (see `signal_stage`) instead of
+    sleeping for a fixed time: the UPFs start at once, the SMF once the NRF answers on its SBI, the AMF and
+    the other network functions once the SMF is up, the gNBs once the AMF listens on NGAP, and the UEs once
+    every gNB has completed its NG Setup and the SMF is associated with both UPFs. A stage that is not ready
+    in time is reported and the next components are started anyway. Finally the UE logs are followed until
+    all the UEs are attached, and the attach latency of the UEs is logged.
+    
+    In an attach storm the UE containers are started at their arrival times instead of all at once, and the
+    registration and PDU session rates reached by the control plane are logged with the failures and the
+    tail attach latency.
+
+    Args:
+        nUE (int): The number of UEs.
+        ngNB (int): The number of gNodeBs.
+        arrival (str): The arrival pattern of an attach storm (see `arrival_times`), None to start all the
+                       UEs at once.
+        times (list): The start time of every UE container in the attach storm, relative to the start of the
+                      storm.
+    """
+    
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    runner = create_runner("api", timeout=PROBE_TIMEOUT)
+    
+    async def stage(name, *checks):
+        # Wait for all the checks of a stage at the same time
+        if all(await asyncio.gather(*(wait_until(check) for check in checks))):
+            info(f"*** {name} ready after {loop.time() - start:.1f}s\n")
+        else:
+            info(f"*** {name} not ready in time, starting the next components anyway\n")
+    
+    async def signal(containers, name):
+        await asyncio.gather(*(signal_stage(runner, container, name) for container in containers))
+    
+    try:
+        # The UPFs do not depend on the control plane: the SMF associates with them once it is started
+        pfcp = LogProbe(prj_folder + "/log/smf.log", r"PFCP associated(?: \[([^\]]+)\])?")
+        await signal(["upf_cld", "upf_mec"], "upf")
         
-        # Iterate over the list of subscribers and add each one to Open5GS
-        for subscriber in subscribers:
-            n += 1
-            o5gs.addSubscriber(subscriber)  # Add subscriber to Open5GS
+        # The NRF is started with the CP container, the other network functions register to it
+        await stage("NRF (SBI)", partial(tcp_listening, runner, "cp", *NRF_SBI))
+        smf = LogProbe(prj_folder + "/log/smf.log", r"NF registered|PFCP associated")
+        await signal(["cp"], "core")
         
-        # Log the number of successfully added subscribers
-        info(f"*** Open5GS: Successfully added {n} subscribers")
+        # The SMF is started first, the AMF and the other network functions once it is up (registered to
+        # the NRF, or already associated with a UPF)
+        await stage("SMF", smf.poll)
+        await signal(["cp"], "amf")
+        
+        # The gNBs connect to the NGAP server of the AMF (their logs, and the ones of the UEs, are followed
+        # from the start of the components)
+        containers = containers_of(allocator, nUE)
+        tracker = AttachTracker(prj_folder + "/log", containers, ngNB, config_folder=prj_folder + "/ueransim/config",
+                                truncate=True)
+        await stage("AMF (NGAP)", partial(sctp_listening, runner, "cp", NGAP_PORT))
+        await signal([f"gnb{i}" for i in range(1, ngNB + 1)], "gnb")
+        
+        # The UEs register through the gNBs and establish their PDU sessions through the UPFs
+        await stage("gNBs (NG Setup) and UPFs (PFCP)", partial(upfs_associated, pfcp), tracker.gnbs_ready)
+        if arrival is None:
+            await signal(containers, "ue")
+            info(f"*** UEs started after {loop.time() - start:.1f}s\n")
+        else:
+            info(f"*** Attach storm: starting {len(containers)} UE containers ({arrival})\n")
+            duration = await start_storm(list(containers), partial(signal_stage, runner, stage="ue"), times)
+            info(f"*** UEs started in {duration:.1f}s, after {loop.time() - start:.1f}s\n")
+    finally:
+        await runner.close()
+    
+    # Wait for the registration and the PDU sessions of all the UEs
+    if await tracker.wait_ready(ATTACH_TIMEOUT):
+        info(f"*** All {nUE} UEs attached after {loop.time() - start:.1f}s\n")
     else:
-        # Log a message if no subscribers are found in the JSON file
-        info("*** Open5GS: No subscribers found")
+        info(f"*** {tracker.ready_count}/{nUE} UEs attached after {ATTACH_TIMEOUT}s\n")
+    
+    if arrival is not None:
+        log_storm_report(storm_report(tracker))
+        return
+    
+    summary = tracker.summary()
+    if summary["avg"] is not None:
+        info(f"*** Attach latency (s): min {summary['min']:.2f}, avg {summary['avg']:.2f}, "
+             f"p95 {summary['p95']:.2f}, max {summary['max']:.2f}\n")
+
+def log_storm_report(report):
+    """
+    Logs the results of an attach storm.
+
+    Args:
+        report (dict): The results, as returned by `storm_report`.
+    """
+    def value(number):
+        return "-" if number is None else f"{number:.2f}"
+    
+    info(f"*** Attach storm: {report['attached']}/{report['ues']} UEs attached, "
+         f"{report['registration_failures']} with registration failures, "
+         f"{report['session_failures']} with PDU session failures\n")
+    info(f"*** Registrations/s: avg {value(report['registrations_per_s'])}, "
+         f"peak {value(report['peak_registrations_per_s'])}\n")
+    info(f"*** PDU sessions/s: avg {value(report['sessions_per_s'])}, peak {value(report['peak_sessions_per_s'])}\n")
+    info(f"*** Attach latency (s): p50 {value(report['p50'])}, p95 {value(report['p95'])}, "
+         f"p99 {value(report['p99'])}, max {value(report['max'])}\n")
 
 
 if __name__ == "__main__":
@@ -392,27 +563,112 @@ if __name__ == "__main__":
     User Plane Functions (UPFs), and a MEC server, and connects them using Docker containers.
     It sets up the network with specific bandwidth and delay configurations for each link.
     
-    The number of UEs must be passed as a command-line argument, and must be between 1 and 10.
+    The number of UEs must be passed as a command-line argument. The addresses and identifiers of the gNBs
+    and UEs are assigned by the allocator, whose subnets, ranges and UE-per-gNB ratio can be configured.
+    Several UEs can be packed in the same container to run more UEs on the same machine.
     """
     
-    # Check if the number of UE (User Equipment) is passed as a command-line argument
-    if len(sys.argv) <= 1:
-        print("Please, pass the number of UE that you want to generate as parameter")
-        sys.exit(-1)
+    # Parse the command-line arguments
+    parser = argparse.ArgumentParser(description="Start the 5G network with multiple UEs and gNBs.")
+    
+    # Define the command-line argument for the number of UEs
+    parser.add_argument("nUE", type=int, help="Number of UEs to generate.")
+    
+    # Define the command-line arguments of the allocator
+    parser.add_argument(
+        "-g", "--ues-per-gnb",
+        type=int,
+        default=allocation.UES_PER_GNB,
+        help=f"Maximum number of UEs served by a gNB (default: {allocation.UES_PER_GNB})."
+    )
+    parser.add_argument(
+        "-k", "--ues-per-container",
+        type=int,
+        default=allocation.UES_PER_CONTAINER,
+        help="Number of UEs hosted by a container, run by a single nr-ue process "
+             f"(default: {allocation.UES_PER_CONTAINER}, one container per UE)."
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=HOST_WORKERS,
+        help=f"Maximum number of Docker hosts created at the same time (default: {HOST_WORKERS})."
+    )
+    parser.add_argument(
+        "--fixed-delays",
+        action="store_true",
+        help="Start the components after the fixed delays of the init scripts instead of readiness checks."
+    )
+    
+    # Define the command-line arguments of the attach storm benchmark
+    parser.add_argument(
+        "--arrival",
+        choices=ARRIVALS,
+        default=None,
+        help="Run an attach storm: start the UEs all at once (burst), at random (poisson) or at a rising rate (ramp), "
+             "and report the registration throughput of the control plane."
+    )
+    parser.add_argument(
+        "--arrival-rate",
+        type=float,
+        default=ARRIVAL_RATE,
+        help=f"Arrival rate of the UEs in the attach storm, mean (poisson) or final (ramp) (UEs/s, default: {ARRIVAL_RATE})."
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the random arrivals of the attach storm."
+    )
+    parser.add_argument(
+        "--subnet",
+        default=allocation.SUBNET,
+        help=f"Subnet of all the hosts (default: {allocation.SUBNET})."
+    )
+    parser.add_argument(
+        "--gnb-range",
+        default=allocation.GNB_RANGE,
+        help=f"Range of the addresses of the gNBs, inside the subnet (default: {allocation.GNB_RANGE})."
+    )
+    parser.add_argument(
+        "--ue-range",
+        default=allocation.UE_RANGE,
+        help=f"Range of the addresses of the UEs, inside the subnet (default: {allocation.UE_RANGE})."
+    )
+    parser.add_argument(
+        "--msin-start",
+        type=int,
+        default=allocation.MSIN_START,
+        help=f"The i-th UE gets the MSIN (last digits of the IMSI) start + i (default: {allocation.MSIN_START})."
+    )
     
-    nUE = int(sys.argv[1])  # Command-line argument for the number of UEs
+    args = parser.parse_args()
+    nUE = args.nUE
     
-    # Validate the number of UEs
-    if nUE <= 0 or nUE > 10:
-        print("Make sure that the number of UE is between 1 and 10")
-        sys.exit(-1)
+    # Create the allocator and check that it can address all the UEs and gNBs
+    try:
+        allocator = Allocator(subnet=args.subnet, gnb_range=args.gnb_range, ue_range=args.ue_range,
+                              ues_per_gnb=args.ues_per_gnb, msin_start=args.msin_start,
+                              ues_per_container=args.ues_per_container)
+        allocator.check(nUE)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.workers < 1:
+        parser.error("The number of workers must be at least 1")
+    
+    # The UE containers of an attach storm are started by this script: the start-up must be orchestrated
+    if args.arrival and args.fixed_delays:
+        parser.error("An attach storm cannot be run with --fixed-delays")
+    if args.arrival_rate <= 0:
+        parser.error("The arrival rate must be positive")
     
     # Calculate the number of gNodeBs based on the number of UEs
-    ngNB = math.ceil(nUE / 3)
+    ngNB = allocator.gnb_count(nUE)
     
     # Generate YAML configuration files for UEs and gNBs
-    ue_setup.generate_yaml(nUE, ngNB)
-    gnb_setup.generate_yaml(ngNB)
+    ue_setup.generate_yaml(nUE, ngNB, allocator)
+    gnb_setup.generate_yaml(ngNB, allocator)
     
     # Get AUTOTEST_MODE environment variable (defaults to 0 if not set)
     AUTOTEST_MODE = os.environ.get("COMNETSEMU_AUTOTEST_MODE", 0)
@@ -428,19 +684,45 @@ if __name__ == "__main__":
     homepath = os.getenv("HOME")  # Works only for Linux
     mongodb_folder = f"{homepath}/mongodbdata"
     
-    # Initialize environment dictionary
+    # Initialize environment dictionary (shared by all the hosts, see `host_env`)
     env = dict()
     
+    # The init scripts wait for the signals of `bring_up` instead of sleeping
+    if not args.fixed_delays:
+        env["ORCHESTRATED"] = "1"
+    
     # Initialize the network with a controller and link type
     net = Containernet(controller=Controller, link=TCLink)
     
-    # Instantiate network components (CP, UPF, gNB, UE, MEC Server)
+    # The CP container is created alone first: being the first container of the Docker bridge, it gets the
+    # address of MongoDB expected by the Open5GS clients (see `Open5GS.DEFAULT_SERVER`)
     cp = instantiate_cp()
-    upf_cld = instantiate_upf_cld()
-    upf_mec = instantiate_upf_mec()
-    mec_server = instantiate_mec_server()
-    gnb_list = instantiate_gnbs(ngNB)
-    ue_list = instantiate_ues(nUE)
+    
+    # Provision the subscribers in the background, while the other Docker hosts are created
+    print("*** Open5GS: Init subscriber for UE")
+    o5gs = AsyncOpen5GS()
+    provisioner = ThreadPoolExecutor(max_workers=1)
+    provisioning = provisioner.submit(asyncio.run, add_subscribers(nUE))
+    
+    # Instantiate the other network components (UPF, gNB, UE, MEC Server) concurrently: creating and starting 
+    # a container mostly waits for the Docker daemon, so the hosts are created by a bounded pool of threads
+    # (`add_docker_host` keeps the bookkeeping of the network under a lock)
+    info(f"*** Adding the Docker hosts ({args.workers} at a time)\n")
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        core = [executor.submit(instantiate) for instantiate in
+                (instantiate_upf_cld, instantiate_upf_mec, instantiate_mec_server)]
+        gnbs = [executor.submit(instantiate_gnb, i) for i in range(1, ngNB + 1)]
+        ues = [executor.submit(instantiate_ue, i, nUE) for i in range(1, allocator.container_count(nUE) + 1)]
+    
+    # Collect the hosts in order (the errors raised while creating a host are raised here)
+    upf_cld, upf_mec, mec_server = (future.result() for future in core)
+    gnb_list = [future.result() for future in gnbs]
+    ue_list = [future.result() for future in ues]
+    
+    # The hosts were added to the network in the order their creation completed: restore the order of
+    # creation (core, gNBs, UEs), so that the network is listed and started the same way at every run
+    host_order = {host: n for n, host in enumerate([cp, upf_cld, upf_mec, mec_server, *gnb_list, *ue_list])}
+    net.hosts.sort(key=lambda host: host_order.get(host, len(host_order)))
     
     # Add controller to the network
     info("*** Add controller\n")
@@ -462,9 +744,9 @@ if __name__ == "__main__":
     net.addLink(upf_cld, s3, bw=1000, delay="1ms", intfName1="upf_cld-s3", intfName2="s3-upf_cld")
     net.addLink(upf_mec, s2, bw=1000, delay="1ms", intfName1="upf_mec-s2", intfName2="s2-upf_mec")
     
-    # Add links for UEs and gNBs
-    for i in range(nUE):
-        net.addLink(ue_list[i], s1, bw=1000, delay="1ms", intfName1=f"ue{i+1}-s1", intfName2=f"s1-ue{i+1}")
+    # Add links for UEs and gNBs (one link per UE container)
+    for ue in ue_list:
+        net.addLink(ue, s1, bw=1000, delay="1ms", intfName1=f"{ue.name}-s1", intfName2=f"s1-{ue.name}")
     
     for i in range(ngNB):
         net.addLink(gnb_list[i], s1, bw=1000, delay="1ms", intfName1=f"gnb{i+1}-s1", intfName2=f"s1-gnb{i+1}")
@@ -472,16 +754,25 @@ if __name__ == "__main__":
     # Add link between MEC Server and switch
     net.addLink(mec_server, s3, bw=1000, delay="5ms", intfName1="mec_server-s3", intfName2="s3-mec_server")
     
-    # Initialize Open5GS and subscribers
-    print("*** Open5GS: Init subscriber for UE")
-    o5gs = Open5GS("172.17.0.2", "27017")
-    o5gs.removeAllSubscribers()
-    add_subscribers(nUE)
+    # Wait for the subscribers, which must be provisioned before the UEs attach (errors are raised here)
+    info("*** Open5GS: Waiting for the subscriber provisioning\n")
+    provisioning.result()
+    provisioner.shutdown()
+    o5gs.close()
     
     # Start the network
     info("\n*** Starting network\n")
     net.start()
     
+    # Start the components in order, as soon as they can be started
+    if not args.fixed_delays:
+        info("*** Starting the components\n")
+        # A packed container starts all its UEs at once: the containers arrive at the rate of the UEs divided
+        # by the number of UEs per container
+        times = arrival_times(args.arrival, allocator.container_count(nUE),
+                              args.arrival_rate / args.ues_per_container, args.seed) if args.arrival else None
+        asyncio.run(bring_up(nUE, ngNB, args.arrival, times))
+    
     # If not in AUTOTEST_MODE, launch the CLI for manual control
     if not AUTOTEST_MODE:
         CLI(net)
@@ -2,15 +2,18 @@
 
 export DB_URI="mongodb://localhost/open5gs"
 
+# wait_stage <stage> <seconds>: waits for the signal of multiUE-gNB.py, or for a fixed delay
+source "$(dirname "$0")/wait_stage.sh"
+
 mongod --smallfiles --dbpath /var/lib/mongodb --logpath /open5gs/install/var/log/open5gs/mongodb.log --logRotate reopen --logappend --bind_ip_all &
 
 
 sleep 10 && cd webui && npm run dev &
 
 ./install/bin/open5gs-nrfd & 
-sleep 15
+wait_stage core 15
 ./install/bin/open5gs-smfd &
-sleep 5
+wait_stage amf 5
 ./install/bin/open5gs-amfd & 
 ./install/bin/open5gs-ausfd &
 ./install/bin/open5gs-udmd &
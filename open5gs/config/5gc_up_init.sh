@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# wait_stage <stage> <seconds>: waits for the signal of multiUE-gNB.py, or for a fixed delay
+source "$(dirname "$0")/wait_stage.sh"
+
 if [[ -z "$COMPONENT_NAME" ]]; then
 	echo "Error: COMPONENT_NAME environment variable not set"; exit 1;
 
@@ -27,5 +30,5 @@ else
 	echo "Error: Invalid component name: '$COMPONENT_NAME'"
 fi
 
-sleep 15
+wait_stage upf 15
 ./install/bin/open5gs-upfd
@@ -1,39 +1,164 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
 import pymongo
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+# MongoDB error code of a duplicate key (e.g. an IMSI already provisioned)
+DUPLICATE_KEY_ERROR = 11000
+
+# Default address of the Open5GS MongoDB (first container of the Docker bridge)
+DEFAULT_SERVER = "172.17.0.2"
+DEFAULT_PORT = 27017
+# Default maximum number of connections of a client
+MAX_POOL_SIZE = 10
+# Default time to wait for a reachable server before failing (ms)
+SERVER_SELECTION_TIMEOUT_MS = 3000
+
+# Default number of subscribers written by every bulk write
+BATCH_SIZE = 500
+# Default number of concurrent bulk writes of the asynchronous API
+MAX_WORKERS = 4
+
+# Shared MongoClient of every URI
+_clients = {}
+
+
+def get_client(uri, max_pool_size=MAX_POOL_SIZE, server_selection_timeout_ms=SERVER_SELECTION_TIMEOUT_MS):
+    """
+    Returns the shared MongoClient of a URI, creating it on first use.
+
+    The client does not connect until the first operation, so creating it costs nothing when the database
+    is not used, and an unreachable server makes the first operation fail after the selection timeout.
+    The pool settings are those of the first call for the URI.
+
+    Args:
+        uri (str): The MongoDB URI (e.g. "mongodb://172.17.0.2:27017/").
+        max_pool_size (int): Maximum number of connections of the client.
+        server_selection_timeout_ms (int): Time to wait for a reachable server before failing (ms).
+
+    Returns:
+        pymongo.MongoClient: The client.
+    """
+    if uri not in _clients:
+        _clients[uri] = pymongo.MongoClient(uri, maxPoolSize=max_pool_size,
+                                            serverSelectionTimeoutMS=server_selection_timeout_ms, connect=False)
+    return _clients[uri]
+
+
+def batches(items, size=BATCH_SIZE):
+    """
+    Splits an iterable (e.g. a generator of profiles) in lists of at most `size` items, lazily.
+
+    Args:
+        items (iterable): The items.
+        size (int): Maximum number of items of a batch.
+
+    Yields:
+        list: The next batch.
+    """
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def close_clients():
+    """Closes all the shared clients."""
+    while _clients:
+        _clients.popitem()[1].close()
+
 
 class Open5GS:
-    def __init__(self, server, port):
+    def __init__(self, server=DEFAULT_SERVER, port=DEFAULT_PORT,
+                 max_pool_size=MAX_POOL_SIZE, server_selection_timeout_ms=SERVER_SELECTION_TIMEOUT_MS):
         self.server = server
         self.port = port
-        self.myclient = pymongo.MongoClient("mongodb://" + str(self.server) + ":" + str(self.port) + "/")
+        # The client is shared by all the Open5GS objects of the same server, and connects lazily
+        self.myclient = get_client("mongodb://" + str(self.server) + ":" + str(self.port) + "/",
+                                   max_pool_size, server_selection_timeout_ms)
+        # Collection handle, looked up once (no round trip until it is used)
+        self.subscribers = self.myclient["open5gs"]["subscribers"]
+        self.imsi_index = False  # True once the unique index on the IMSI has been ensured
 
-    def _GetSubscribers(self):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
-        subs_list = []
-        for x in mycol.find():
-            subs_list.append(x)
-            pass
+    def _IterSubscribers(self, query=None, fields=None):
+        mycol = self.subscribers
+        # Only the requested fields are sent by the server (the whole documents if fields is None)
+        projection = None if fields is None else dict({ f: 1 for f in fields }, _id=0)
+        # The cursor is returned as is, so the documents are fetched batch by batch while iterating
+        return mycol.find(query or {}, projection)
 
-        return subs_list
+    def _GetSubscribers(self):
+        return list(self._IterSubscribers())
 
     def _GetSubscriber(self, imsi):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
+        mycol = self.subscribers
         myquery = { "imsi": str(imsi)}
-        mydoc = mycol.find(myquery)
-        for x in mydoc:
-            return x
+        return mycol.find_one(myquery)
 
     def _AddSubscriber(self, sub_data):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
+        mycol = self.subscribers
 
         x = mycol.insert_one(sub_data)
         return x.inserted_id
 
+    def _EnsureImsiIndex(self):
+        # The unique index lets the database reject duplicate IMSIs, without reading the collection
+        if self.imsi_index:
+            return
+        mycol = self.subscribers
+        try:
+            mycol.create_index("imsi", unique=True)
+        except OperationFailure as e:
+            # The collection already holds duplicate IMSIs: the duplicates are looked up before every insert
+            print("Unable to create the unique IMSI index, checking the duplicates with queries: " + str(e))
+            return
+        self.imsi_index = True
+
+    def _SplitDuplicates(self, subs_data):
+        # Without the unique index the database accepts duplicates: look up the IMSIs of the batch first
+        existing = { s["imsi"] for s in self.getSubscribersByImsi([s["imsi"] for s in subs_data], fields=["imsi"]) }
+        new, duplicates = [], []
+        for s in subs_data:
+            if str(s["imsi"]) in existing:
+                duplicates.append(s["imsi"])
+            else:
+                existing.add(str(s["imsi"]))  # Also a duplicate if repeated later in the batch
+                new.append(s)
+        return new, duplicates
+
+    def _AddSubscribers(self, subs_data, upsert=False):
+        mycol = self.subscribers
+
+        if upsert:
+            # Replace the subscribers already there, insert the other ones
+            requests = [pymongo.ReplaceOne({ "imsi": str(s["imsi"]) }, s, upsert=True) for s in subs_data]
+            x = mycol.bulk_write(requests, ordered=False)
+            return x.upserted_count + x.matched_count, []
+
+        if not self.imsi_index:
+            subs_data, duplicates = self._SplitDuplicates(subs_data)
+            if subs_data:
+                mycol.insert_many(subs_data, ordered=False)
+            return len(subs_data), duplicates
+
+        try:
+            # Unordered: the duplicates are reported while all the other subscribers are inserted
+            x = mycol.insert_many(subs_data, ordered=False)
+            return len(x.inserted_ids), []
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            duplicates = [err["op"]["imsi"] for err in errors if err.get("code") == DUPLICATE_KEY_ERROR]
+            if len(duplicates) < len(errors):
+                raise
+            return e.details.get("nInserted", 0), duplicates
+
     def _UpdateSubscriber(self, imsi, sub_data):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
+        mycol = self.subscribers
         print("Attempting to update IMSI " + str(imsi))
         newvalues = { "$set": sub_data }
         myquery = { "imsi": str(imsi)}
@@ -42,46 +167,316 @@ class Open5GS:
         return True
 
     def _DeleteSubscriber(self, imsi):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
+        mycol = self.subscribers
         myquery = { "imsi": str(imsi)}
         x = mycol.delete_many(myquery)
         # print(x.deleted_count, " subscribers deleted.")
         return x.deleted_count
 
+    def _DeleteSubscribers(self, imsi_list=None):
+        mycol = self.subscribers
+        # A single server-side delete: all the subscribers, or the ones with the given IMSIs
+        myquery = {} if imsi_list is None else { "imsi": { "$in": [str(imsi) for imsi in imsi_list] } }
+        x = mycol.delete_many(myquery)
+        return x.deleted_count
+
 
 
     #####################################################
+    def ping( self ):
+        """
+        Checks that the MongoDB server accepts connections and answers commands.
+
+        Returns:
+            bool: True if the server answered, False if it could not be reached in time.
+        """
+        try:
+            self.myclient.admin.command("ping")
+        except PyMongoError:
+            return False
+        return True
+
+
     def getSubscribersImsiList(self):
-        subs = self._GetSubscribers()
-        s_list=[]
-        for s in subs:
-            s_list.append(s["imsi"])
-        return s_list
+        # Only the IMSIs are fetched, not the keys, slices and sessions of the subscribers
+        return [s["imsi"] for s in self._IterSubscribers(fields=["imsi"])]
+
+
+    def countSubscribers( self , query:dict = None ):
+        """
+        Counts the subscribers on the server side, without fetching them.
+
+        Args:
+            query (dict): Filter of the subscribers to count (all of them if None).
+
+        Returns:
+            int: The number of subscribers.
+        """
+        mycol = self.subscribers
+        return mycol.count_documents(query or {})
+
+
+    def getSubscribersByImsi( self , imsi_list:list , fields:list = None ):
+        """
+        Streams the subscribers with the given IMSIs, fetched with a single `$in` query.
+
+        Args:
+            imsi_list (list): The IMSIs of the subscribers.
+            fields (list): The fields to fetch (e.g. ["imsi", "slice"]); None fetches the whole documents.
+
+        Returns:
+            Cursor: The subscribers, fetched batch by batch while iterating.
+        """
+        return self._IterSubscribers({ "imsi": { "$in": [str(imsi) for imsi in imsi_list] } }, fields)
 
 
     def addSubscriber( self , profile:dict ):
         if "imsi" in profile.keys():
-            imsi_list = self.getSubscribersImsiList()
-            if profile["imsi"] in imsi_list:
-                print( "A subscriber with this IMSI is already there." )
-            else:
-                x = self._AddSubscriber(profile.copy())
+            self.addSubscribers([profile])
         else:
             print( "IMSI is required." )
 
 
+    def addSubscribers( self , profiles , upsert:bool = False ):
+        """
+        Adds many subscribers with bulk writes of BATCH_SIZE subscribers.
+
+        The duplicates are detected by the unique index on the IMSI, so the collection is not read (if the
+        index cannot be created, the IMSIs of every batch are looked up before it is inserted).
+        The profiles may be a generator: only one batch is kept in memory at a time.
+
+        Args:
+            profiles (iterable): The subscriber profiles (each one must have an "imsi").
+            upsert (bool): If True the subscribers already there are replaced instead of being reported.
+
+        Returns:
+            int: The number of subscribers added (or replaced).
+        """
+        n, skipped = 0, 0
+        self._EnsureImsiIndex()
+
+        for batch in batches(profiles):
+            # The profiles are copied, as the driver adds their "_id"
+            subs_data = [p.copy() for p in batch if "imsi" in p]
+            skipped += len(batch) - len(subs_data)
+            if not subs_data:
+                continue
+
+            inserted, duplicates = self._AddSubscribers(subs_data, upsert)
+            n += inserted
+            for imsi in duplicates:
+                print( "A subscriber with IMSI " + str(imsi) + " is already there." )
+
+        if skipped:
+            print( str(skipped) + " subscribers skipped: IMSI is required." )
+        return n
+
+
     def removeAllSubscribers(self):
-        subs = self._GetSubscribers()
-        for s in subs:
-            self._DeleteSubscriber(s["imsi"])
+        """
+        Removes all the subscribers with a single `delete_many` (the indexes are kept).
+
+        Returns:
+            int: The number of subscribers removed.
+        """
+        return self._DeleteSubscribers()
 
 
     def removeAllSubscribers_ByObjID(self):
-        mydb = self.myclient["open5gs"]
-        mycol = mydb["subscribers"]
-        for c in mycol.find():
-            aa = c["_id"]
-            myquery = { "_id": aa }
-            mycol.delete_many(myquery)
+        # Same as removeAllSubscribers: one delete for the whole collection instead of one per document
+        return self._DeleteSubscribers()
+
+
+    def resetSubscribers( self , profiles = None ):
+        """
+        Resets the subscribers, either removing all of them or making them exactly the given profiles.
+
+        With profiles, only the difference is applied: the subscribers that are not in the profiles are
+        removed, the new or changed profiles are written with one bulk upsert and the unchanged ones are
+        not touched.
+
+        Args:
+            profiles (iterable): The subscriber profiles to keep (None removes all the subscribers).
+
+        Returns:
+            tuple: (added, updated, removed) numbers of subscribers.
+        """
+        if profiles is None:
+            return 0, 0, self.removeAllSubscribers()
+
+        stale, changed, added = self._DiffSubscribers(profiles)
+
+        removed = self._DeleteSubscribers(stale) if stale else 0
+        if changed:
+            self._EnsureImsiIndex()
+            for batch in batches(changed):
+                self._AddSubscribers([p.copy() for p in batch], upsert=True)
+
+        return added, len(changed) - added, removed
+
+
+    def _DiffSubscribers( self , profiles ):
+        # The profiles are indexed by IMSI (the last profile wins, as with successive upserts)
+        wanted, count = {}, 0
+        for p in profiles:
+            count += 1
+            if "imsi" in p:
+                wanted[str(p["imsi"])] = p
+        if len(wanted) < count:
+            print( str(count - len(wanted)) + " profiles skipped: IMSI is required or duplicated." )
+
+        # Current subscribers, without their "_id" so that they can be compared with the profiles
+        mycol = self.subscribers
+        current = { s["imsi"]: s for s in mycol.find({}, { "_id": 0 }) }
+
+        # IMSIs to remove, profiles to write and number of new subscribers among them
+        stale = [imsi for imsi in current if imsi not in wanted]
+        changed = [p for imsi, p in wanted.items() if current.get(imsi) != p]
+        added = sum(1 for imsi in wanted if imsi not in current)
+        return stale, changed, added
+
+
+class AsyncOpen5GS:
+    """
+    Asynchronous variant of Open5GS, to provision the subscribers while other work goes on.
+
+    The blocking pymongo calls run in a thread pool and the bulk writes are split into batches written
+    concurrently (pymongo clients are thread-safe, and the pool of the shared client is sized for them).
+    """
+
+    def __init__(self, server=DEFAULT_SERVER, port=DEFAULT_PORT, max_workers=MAX_WORKERS, batch_size=BATCH_SIZE,
+                 server_selection_timeout_ms=SERVER_SELECTION_TIMEOUT_MS):
+        """
+        Initializes an AsyncOpen5GS object.
+
+        Args:
+            server (str): Address of the MongoDB server.
+            port (int): Port of the MongoDB server.
+            max_workers (int): Maximum number of concurrent database operations.
+            batch_size (int): Maximum number of subscribers written by a bulk write.
+            server_selection_timeout_ms (int): Time to wait for a reachable server before failing (ms).
+        """
+        self.o5gs = Open5GS(server, port, max(max_workers, MAX_POOL_SIZE), server_selection_timeout_ms)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+
+    async def _run(self, function, *args):
+        # Run a blocking call of the Open5GS object in the thread pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(function, *args))
+
+    async def _AddSubscribers(self, profiles, upsert=False):
+        # Write up to max_workers batches concurrently, collecting the subscribers written, the duplicates
+        # and the profiles skipped (only these batches are in memory, so the profiles can be a generator)
+        n, duplicates, skipped = 0, [], 0
+        pending = batches(profiles, self.batch_size)
+        # Without the unique IMSI index the duplicates are looked up before the inserts: one batch at a time,
+        # so that two concurrent batches cannot both insert the same IMSI
+        workers = self.max_workers if upsert or self.o5gs.imsi_index else 1
+
+        while True:
+            window = list(islice(pending, workers))
+            if not window:
+                return n, duplicates, skipped
+
+            # The profiles are copied, as the driver adds their "_id"
+            subs_data = [[p.copy() for p in batch if "imsi" in p] for batch in window]
+            skipped += sum(len(batch) for batch in window) - sum(len(batch) for batch in subs_data)
+
+            results = await asyncio.gather(*(self._run(self.o5gs._AddSubscribers, batch, upsert)
+                                             for batch in subs_data if batch))
+            n += sum(inserted for inserted, _ in results)
+            duplicates += [imsi for _, batch_duplicates in results for imsi in batch_duplicates]
+
+    async def ping(self):
+        """
+        Checks that the MongoDB server accepts connections and answers commands.
+
+        Returns:
+            bool: True if the server answered, False if it could not be reached in time.
+        """
+        return await self._run(self.o5gs.ping)
+
+    async def countSubscribers(self, query=None):
+        """
+        Counts the subscribers on the server side, without fetching them.
+
+        Args:
+            query (dict): Filter of the subscribers to count (all of them if None).
+
+        Returns:
+            int: The number of subscribers.
+        """
+        return await self._run(self.o5gs.countSubscribers, query)
+
+    async def getSubscribersImsiList(self):
+        """
+        Returns the IMSIs of all the subscribers.
+
+        Returns:
+            list: The IMSIs.
+        """
+        return await self._run(self.o5gs.getSubscribersImsiList)
+
+    async def addSubscribers(self, profiles, upsert=False):
+        """
+        Adds many subscribers with concurrent bulk writes.
+
+        Args:
+            profiles (iterable): The subscriber profiles (each one must have an "imsi"), e.g. a generator.
+            upsert (bool): If True the subscribers already there are replaced instead of being reported.
+
+        Returns:
+            int: The number of subscribers added (or replaced).
+        """
+        await self._run(self.o5gs._EnsureImsiIndex)
+        n, duplicates, skipped = await self._AddSubscribers(profiles, upsert)
+        for imsi in duplicates:
+            print( "A subscriber with IMSI " + str(imsi) + " is already there." )
+        if skipped:
+            print( str(skipped) + " subscribers skipped: IMSI is required." )
+        return n
+
+    async def removeAllSubscribers(self):
+        """
+        Removes all the subscribers with a single `delete_many`.
+
+        Returns:
+            int: The number of subscribers removed.
+        """
+        return await self._run(self.o5gs.removeAllSubscribers)
+
+    async def resetSubscribers(self, profiles=None):
+        """
+        Resets the subscribers, either removing all of them or making them exactly the given profiles.
+
+        As with `Open5GS.resetSubscribers` only the difference is applied, with the changed profiles
+        written by concurrent batches of upserts while the stale subscribers are removed.
+
+        Args:
+            profiles (iterable): The subscriber profiles to keep (None removes all the subscribers).
+
+        Returns:
+            tuple: (added, updated, removed) numbers of subscribers.
+        """
+        if profiles is None:
+            return 0, 0, await self.removeAllSubscribers()
+
+        stale, changed, added = await self._run(self.o5gs._DiffSubscribers, profiles)
+        if changed:
+            await self._run(self.o5gs._EnsureImsiIndex)
+
+        # Remove the stale subscribers (if any) while the changed profiles are written
+        writes = [self._AddSubscribers(changed, upsert=True)]
+        if stale:
+            writes.append(self._run(self.o5gs._DeleteSubscribers, stale))
+        results = await asyncio.gather(*writes)
+        removed = results[1] if stale else 0
+
+        return added, len(changed) - added, removed
+
+    def close(self):
+        """Waits for the pending operations and stops the thread pool."""
+        self.executor.shutdown(wait=True)
 
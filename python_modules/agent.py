@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import shlex
+import uuid
+
+from python_modules.runner import CommandResult, Runner, stop_process
+
+
+# Default maximum number of agents (shells) started in the same container
+MAX_AGENTS = 4
+# Byte starting the end-of-command markers written by the agents (ASCII record separator)
+MARKER_PREFIX = "\x1e"
+# Size of the chunks read from the output of the agents
+READ_SIZE = 65536
+
+
+async def read_frame(stream, marker):
+    """
+    Reads the output of a command from an agent stream, up to the line holding its end marker.
+
+    Args:
+        stream (asyncio.StreamReader): The stream of the agent (stdout or stderr).
+        marker (bytes): The end marker of the command.
+
+    Returns:
+        tuple: (output, trailer) where output is everything written before the marker and trailer is the
+               rest of the marker line (None if the stream ended before the marker, i.e. the agent died).
+    """
+
+    data = bytearray()
+    start = 0
+
+    while True:
+        index = data.find(marker, start)
+        if index >= 0:
+            end = data.find(b"\n", index)
+            if end >= 0:
+                return bytes(data[:index]), data[index + len(marker):end].decode().strip()
+        else:
+            # The marker may be split between two chunks
+            start = max(0, len(data) - len(marker))
+
+        chunk = await stream.read(READ_SIZE)
+        if not chunk:
+            return bytes(data), None
+        data += chunk
+
+
+class ShellAgent:
+    """
+    Represents a long-lived shell running in a container, executing the commands written on its stdin.
+
+    Every command is followed by an end marker on stdout (with the exit code) and on stderr, so the output
+    of consecutive commands is split without starting a new process for each of them. The markers hold a
+    random token and a counter, so they cannot be confused with the output of the commands.
+    An agent executes one command at a time.
+    """
+
+    def __init__(self, container, process):
+        """
+        Initializes a ShellAgent object.
+
+        Args:
+            container (str): Name of the Docker container.
+            process (asyncio.subprocess.Process): The shell, started with its stdin open.
+        """
+        self.container = container
+        self.process = process
+        self._token = uuid.uuid4().hex
+        self._counter = itertools.count()
+        self._stopped = False
+
+    @property
+    def alive(self):
+        """bool: True if the shell can still execute commands."""
+        return (not self._stopped and self.process.returncode is None and self.process.stdin is not None
+                and not self.process.stdout.at_eof())
+
+    async def execute(self, args):
+        """
+        Executes a command in the shell and waits for its completion.
+
+        Args:
+            args (list): The command and its arguments.
+
+        Returns:
+            CommandResult: The outcome of the command (exit code 1 if the shell died).
+        """
+
+        marker = f"{MARKER_PREFIX}{self._token}-{next(self._counter)}"
+
+        # The command must not read the stdin of the shell, which carries the next commands
+        script = (f"{shlex.join(args)} </dev/null; "
+                  f"printf '%s %d\\n' '{marker}' $?; printf '%s\\n' '{marker}' >&2\n")
+
+        if self.alive:
+            try:
+                self.process.stdin.write(script.encode())
+                await self.process.stdin.drain()
+            except ConnectionError:
+                pass  # The shell died: its output is read below up to the end of the streams
+
+        (stdout, exit_code), (stderr, _) = await asyncio.gather(
+            read_frame(self.process.stdout, marker.encode()), read_frame(self.process.stderr, marker.encode()))
+
+        returncode = int(exit_code) if exit_code else 1
+        return CommandResult(self.container, args, returncode,
+                             stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+    def kill(self):
+        """Kills the shell (e.g. when the coroutine waiting for its command is cancelled)."""
+        self._stopped = True
+        self.process.kill()
+
+    async def close(self, timeout=2):
+        """
+        Stops the shell, closing its stdin first so that it exits by itself.
+
+        Args:
+            timeout (float): Seconds to wait for the shell before killing it.
+        """
+        if self.alive:
+            self.process.stdin.close()
+        self._stopped = True
+        await stop_process(self.process, timeout)
+
+
+class AgentRunner(Runner):
+    """
+    Runner executing the short commands through persistent shells, instead of one exec per command.
+
+    The agents of a container are started on first use, reused by the following commands and kept until
+    the runner is closed. Up to `max_agents` commands run at the same time through the agents of the same
+    container: when they are all busy, a command is executed by the underlying runner instead of waiting,
+    so that concurrent measurements (e.g. the iperf3 clients of a load test) still start together.
+    An agent whose command times out or is cancelled is stopped and replaced by a new one on demand.
+    Long-running processes (`spawn`) bypass the agents.
+    """
+
+    def __init__(self, runner, max_agents=MAX_AGENTS):
+        """
+        Initializes an AgentRunner object.
+
+        Args:
+            runner (Runner): The runner starting the agents and the long-running processes.
+            max_agents (int): Maximum number of agents started in the same container.
+        """
+        super().__init__(concurrency=runner.concurrency, timeout=runner.timeout)
+        self.runner = runner
+        self.max_agents = max_agents
+        self._agents = {}  # Agents (and free slots, as None) of every container, in a LIFO queue
+        self._started = set()  # All the agents started, to stop them on close
+
+    def _queue(self, container):
+        # The queue starts with one free slot per agent; the idle agents are pushed on top of the slots
+        if container not in self._agents:
+            self._agents[container] = asyncio.LifoQueue()
+            for _ in range(self.max_agents):
+                self._agents[container].put_nowait(None)
+        return self._agents[container]
+
+    async def _acquire(self, container):
+        # Reuse an idle agent, or start a new one in a free slot (None if all the agents are busy)
+        try:
+            agent = self._queue(container).get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+        if agent is not None and agent.alive:
+            return agent
+
+        if agent is not None:
+            self._started.discard(agent)
+
+        try:
+            process = await self.runner.spawn(container, "sh", stdin=True)
+        except BaseException:
+            self._queue(container).put_nowait(None)
+            raise
+
+        agent = ShellAgent(container, process)
+        self._started.add(agent)
+        return agent
+
+    def _release(self, agent):
+        # A dead agent gives its slot back, so that a new one is started by the next command
+        self._queue(agent.container).put_nowait(agent if agent.alive else None)
+        if not agent.alive:
+            self._started.discard(agent)
+
+    async def run(self, container, *args, timeout=None):
+        """
+        Executes a command inside a container through one of its agents and waits for its completion.
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            timeout (float): Timeout of the command in seconds (default: the timeout of the runner).
+
+        Returns:
+            CommandResult: The outcome of the command.
+        """
+        timeout = timeout or self.timeout
+
+        async with self._limit():
+            agent = await self._acquire(container)
+            if agent is None:
+                return await self.runner.run(container, *args, timeout=timeout)
+
+            try:
+                result = await asyncio.wait_for(agent.execute(args), timeout)
+            except asyncio.TimeoutError:
+                # The shell is still busy with the command: replace it
+                await agent.close(timeout=0)
+                self._release(agent)
+                return CommandResult(container, args, None, "", "", timed_out=True)
+            except asyncio.CancelledError:
+                agent.kill()
+                self._release(agent)
+                raise
+
+            self._release(agent)
+
+        return result
+
+    async def spawn(self, container, *args, stdin=False):
+        """
+        Starts a long-running command inside a container, outside of the agents.
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            stdin (bool): If True the standard input of the command is available as `process.stdin`.
+
+        Returns:
+            asyncio.subprocess.Process: The process, with its stdout and stderr available as streams.
+        """
+        return await self.runner.spawn(container, *args, stdin=stdin)
+
+    async def container_pid(self, container):
+        """
+        Returns the PID of the main process of a container on the host (see `Runner.container_pid`).
+
+        Args:
+            container (str): Name of the Docker container.
+
+        Returns:
+            int or None: The PID, or None if the container is not running.
+        """
+        return await self.runner.container_pid(container)
+
+    async def close(self):
+        """Stops all the agents and closes the underlying runner."""
+        await asyncio.gather(*(agent.close() for agent in self._started))
+        self._started.clear()
+        self._agents.clear()
+        await self.runner.close()
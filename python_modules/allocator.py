@@ -0,0 +1,307 @@
+import ipaddress
+import math
+
+
+# Subnet of all the hosts of the network (CP, UPFs, MEC server, gNBs and UEs)
+SUBNET = "192.168.0.0/16"
+# Ranges of the addresses of the gNBs and of the UEs
+GNB_RANGE = "192.168.1.0/24"
+UE_RANGE = "192.168.16.0/20"
+# Fixed addresses of the core hosts (also written in the Open5GS configuration files)
+CORE_ADDRESSES = {
+    "cp": "192.168.0.111",
+    "upf_cld": "192.168.0.112",
+    "upf_mec": "192.168.0.113",
+    "mec_server": "192.168.0.140",
+}
+# Default number of UEs served by a gNB
+UES_PER_GNB = 3
+# Default number of UEs hosted by a container (more than 1: packed mode, one `nr-ue -n` process per container)
+UES_PER_CONTAINER = 1
+# Mobile Country Code and Mobile Network Code of the PLMN
+MCC = "001"
+MNC = "01"
+# The i-th UE gets the MSIN (and IMEI, IMEISV) start + i
+MSIN_START = 1234567800
+IMEI_START = 356938035643800
+IMEISV_START = 4370816125816100
+
+
+def serving_gnb(i, ngNB):
+    """
+    Returns the number of the gNB serving a UE (the UEs are spread over the gNBs in round robin).
+
+    Args:
+        i (int): The number of the UE (starting from 1).
+        ngNB (int): The number of gNBs.
+
+    Returns:
+        int: The number of the gNB (starting from 1).
+    """
+    return (i - 1) % ngNB + 1
+
+
+class Allocator:
+    """
+    Allocates the addresses and the identifiers of the gNBs and the UEs.
+
+    The i-th gNB and the i-th UE container get the i-th host address of their range, so the allocation is
+    deterministic and every script (network set-up, configuration generators, tests) computes the same
+    addresses and identifiers from the same settings.
+
+    By default every UE has its own container. In packed mode (`ues_per_container` > 1) the k-th container
+    hosts the UEs (k-1)*ues_per_container+1 to k*ues_per_container, run by a single `nr-ue -n` process:
+    the UEs of a container share its address and its gNB, and have consecutive identifiers.
+    """
+
+    def __init__(self, subnet=SUBNET, gnb_range=GNB_RANGE, ue_range=UE_RANGE, ues_per_gnb=UES_PER_GNB,
+                 mcc=MCC, mnc=MNC, msin_start=MSIN_START, imei_start=IMEI_START, imeisv_start=IMEISV_START,
+                 ues_per_container=UES_PER_CONTAINER):
+        """
+        Initializes an Allocator object.
+
+        Args:
+            subnet (str): Subnet of all the hosts (e.g. "192.168.0.0/16").
+            gnb_range (str): Range of the addresses of the gNBs, inside the subnet (e.g. "192.168.1.0/24").
+            ue_range (str): Range of the addresses of the UEs, inside the subnet (e.g. "192.168.16.0/20").
+            ues_per_gnb (int): Number of UEs served by a gNB.
+            mcc (str): Mobile Country Code (3 digits).
+            mnc (str): Mobile Network Code (2 or 3 digits).
+            msin_start (int): The i-th UE gets the MSIN msin_start + i.
+            imei_start (int): The i-th UE gets the IMEI imei_start + i.
+            imeisv_start (int): The i-th UE gets the IMEISV imeisv_start + i.
+            ues_per_container (int): Number of UEs hosted by a container.
+
+        Raises:
+            ValueError: If the ranges are not inside the subnet, overlap, or include a core address.
+        """
+        self.subnet = ipaddress.ip_network(subnet)
+        self.gnb_range = ipaddress.ip_network(gnb_range)
+        self.ue_range = ipaddress.ip_network(ue_range)
+        self.ues_per_gnb = ues_per_gnb
+        self.mcc = mcc
+        self.mnc = mnc
+        self.msin_start = msin_start
+        self.imei_start = imei_start
+        self.imeisv_start = imeisv_start
+        self.ues_per_container = ues_per_container
+
+        if ues_per_gnb < 1:
+            raise ValueError("The number of UEs per gNB must be at least 1")
+        if ues_per_container < 1:
+            raise ValueError("The number of UEs per container must be at least 1")
+
+        for name, ip_range in (("gNB", self.gnb_range), ("UE", self.ue_range)):
+            if not ip_range.subnet_of(self.subnet):
+                raise ValueError(f"The {name} range {ip_range} is not inside the subnet {self.subnet}")
+            for host, address in CORE_ADDRESSES.items():
+                if ipaddress.ip_address(address) in ip_range:
+                    raise ValueError(f"The {name} range {ip_range} includes the address of {host} ({address})")
+
+        if self.gnb_range.overlaps(self.ue_range):
+            raise ValueError(f"The gNB range {self.gnb_range} overlaps the UE range {self.ue_range}")
+
+    def _host(self, ip_range, i):
+        # The i-th host address of a range (the network address is skipped)
+        if not 1 <= i <= self.capacity(ip_range):
+            raise ValueError(f"No address left in {ip_range} for host {i}")
+        return str(ip_range.network_address + i)
+
+    def capacity(self, ip_range):
+        """
+        Returns the number of host addresses of a range.
+
+        Args:
+            ip_range (ipaddress.IPv4Network): The range.
+
+        Returns:
+            int: The number of addresses, without the network and broadcast addresses.
+        """
+        return ip_range.num_addresses - 2
+
+    @property
+    def packed(self):
+        """bool: True if the containers host several UEs."""
+        return self.ues_per_container > 1
+
+    def container_count(self, nUE):
+        """
+        Returns the number of containers hosting the UEs.
+
+        Args:
+            nUE (int): The number of UEs.
+
+        Returns:
+            int: The number of containers.
+        """
+        return math.ceil(nUE / self.ues_per_container)
+
+    def container_name(self, k):
+        """
+        Returns the name of a UE container (also the name of its configuration and log files).
+
+        Args:
+            k (int): The number of the container (starting from 1).
+
+        Returns:
+            str: "ue{k}", or "uepack{k}" in packed mode.
+        """
+        return f"uepack{k}" if self.packed else f"ue{k}"
+
+    def container_ues(self, k, nUE):
+        """
+        Returns the UEs hosted by a container.
+
+        Args:
+            k (int): The number of the container (starting from 1).
+            nUE (int): The number of UEs.
+
+        Returns:
+            range: The numbers of the UEs (consecutive, the last container may host fewer UEs).
+        """
+        return range((k - 1) * self.ues_per_container + 1, min(k * self.ues_per_container, nUE) + 1)
+
+    def container_of(self, i):
+        """
+        Returns the container hosting a UE.
+
+        Args:
+            i (int): The number of the UE (starting from 1).
+
+        Returns:
+            int: The number of the container (starting from 1).
+        """
+        return (i - 1) // self.ues_per_container + 1
+
+    def gnb_count(self, nUE):
+        """
+        Returns the number of gNBs needed to serve the UEs.
+
+        The UEs of a container are all served by the same gNB, so in packed mode a gNB serves as many whole
+        containers as fit in `ues_per_gnb` (at least one).
+
+        Args:
+            nUE (int): The number of UEs.
+
+        Returns:
+            int: The number of gNBs.
+        """
+        containers_per_gnb = max(1, self.ues_per_gnb // self.ues_per_container)
+        return math.ceil(self.container_count(nUE) / containers_per_gnb)
+
+    def ue_gnb(self, i, ngNB):
+        """
+        Returns the gNB serving a UE (the containers are spread over the gNBs in round robin).
+
+        Args:
+            i (int): The number of the UE (starting from 1).
+            ngNB (int): The number of gNBs.
+
+        Returns:
+            int: The number of the gNB (starting from 1).
+        """
+        return serving_gnb(self.container_of(i), ngNB)
+
+    def check(self, nUE):
+        """
+        Checks that there are enough addresses and identifiers for the UEs and their gNBs.
+
+        Args:
+            nUE (int): The number of UEs.
+
+        Raises:
+            ValueError: If a range is too small.
+        """
+        if nUE < 1:
+            raise ValueError("The number of UEs must be at least 1")
+        if self.container_count(nUE) > self.capacity(self.ue_range):
+            raise ValueError(f"The UE range {self.ue_range} has only {self.capacity(self.ue_range)} addresses")
+        if self.gnb_count(nUE) > self.capacity(self.gnb_range):
+            raise ValueError(f"The gNB range {self.gnb_range} has only {self.capacity(self.gnb_range)} addresses")
+        if len(str(self.msin_start + nUE)) > 15 - len(self.mcc) - len(self.mnc):
+            raise ValueError(f"Not enough MSINs after {self.msin_start} for {nUE} UEs")
+
+    def address(self, name):
+        """
+        Returns the address of a core host.
+
+        Args:
+            name (str): The name of the host ("cp", "upf_cld", "upf_mec" or "mec_server").
+
+        Returns:
+            str: The IP address.
+        """
+        return CORE_ADDRESSES[name]
+
+    def interface(self, address):
+        """
+        Returns the address of a host with the prefix length of the subnet (as expected by addDockerHost).
+
+        Args:
+            address (str): The IP address.
+
+        Returns:
+            str: The address with its prefix length (e.g. "192.168.1.1/16").
+        """
+        return f"{address}/{self.subnet.prefixlen}"
+
+    def gnb_ip(self, i):
+        """
+        Returns the IP address of a gNB.
+
+        Args:
+            i (int): The number of the gNB (starting from 1).
+
+        Returns:
+            str: The IP address.
+        """
+        return self._host(self.gnb_range, i)
+
+    def ue_ip(self, k):
+        """
+        Returns the IP address of a UE container (the address of the UE when it has its own container).
+
+        Args:
+            k (int): The number of the container (starting from 1).
+
+        Returns:
+            str: The IP address.
+        """
+        return self._host(self.ue_range, k)
+
+    def imsi(self, i):
+        """
+        Returns the IMSI of a UE: MCC, MNC and MSIN (15 digits in total).
+
+        Args:
+            i (int): The number of the UE (starting from 1).
+
+        Returns:
+            str: The IMSI (e.g. "001011234567801").
+        """
+        msin_length = 15 - len(self.mcc) - len(self.mnc)
+        return f"{self.mcc}{self.mnc}{self.msin_start + i:0{msin_length}d}"
+
+    def imei(self, i):
+        """
+        Returns the IMEI of a UE.
+
+        Args:
+            i (int): The number of the UE (starting from 1).
+
+        Returns:
+            str: The IMEI (15 digits).
+        """
+        return f"{self.imei_start + i:015d}"
+
+    def imeisv(self, i):
+        """
+        Returns the IMEISV of a UE.
+
+        Args:
+            i (int): The number of the UE (starting from 1).
+
+        Returns:
+            str: The IMEISV (16 digits).
+        """
+        return f"{self.imeisv_start + i:016d}"
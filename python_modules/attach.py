@@ -0,0 +1,300 @@
+import asyncio
+import math
+import os
+import re
+from datetime import datetime
+
+from python_modules.log_follower import LogFollower
+from python_modules.readiness import wait_until
+
+
+# Number of PDU sessions established by every UE (see the UE configuration)
+SESSIONS = 2
+# Timestamp starting every line of the UERANSIM logs, e.g. "[2024-01-01 10:00:00.123]"
+TIMESTAMP = re.compile(r"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d+)\]")
+# Prefix of the log lines of a UE when nr-ue runs several UEs, e.g. "[imsi-001011234567801|nas]"
+UE_PREFIX = re.compile(r"\[imsi-(\d+)\|")
+# Steps of the attach logged by a UE, with the first line of each one
+STEPS = {
+    "rrc": re.compile(r"RRC connection established"),
+    "registered": re.compile(r"Registration accept received|Initial Registration is successful"),
+}
+# Failures logged by a UE, by kind (the UE may retry and succeed later)
+FAILURES = {
+    "registration": re.compile(r"Registration (?:reject|failed)", re.IGNORECASE),
+    "session": re.compile(r"PDU Session Establishment Reject|PDU session establishment.*fail", re.IGNORECASE),
+}
+# A PDU session is usable once its TUN interface is up
+PDU_SESSION = re.compile(r"PDU session\[(\d+)\].*TUN interface\[(\w+), ([\d.]+)\]")
+# Line of a gNB once it is connected to the AMF
+NG_SETUP = re.compile(r"NG Setup procedure is successful")
+
+
+def parse_time(line):
+    """
+    Returns the timestamp of a UERANSIM log line.
+
+    Args:
+        line (str): The log line.
+
+    Returns:
+        float or None: The POSIX timestamp, or None if the line has no timestamp.
+    """
+    match = TIMESTAMP.match(line)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1)[:26], "%Y-%m-%d %H:%M:%S.%f").timestamp()
+
+
+def containers_of(allocator, nUE):
+    """
+    Returns the UEs hosted by every UE container.
+
+    Args:
+        allocator (Allocator): The allocator of the network.
+        nUE (int): The number of UEs.
+
+    Returns:
+        dict: The numbers of the UEs, by container name.
+    """
+    return {allocator.container_name(k): list(allocator.container_ues(k, nUE))
+            for k in range(1, allocator.container_count(nUE) + 1)}
+
+
+def percentile(values, p):
+    """
+    Returns a percentile of values (nearest rank).
+
+    Args:
+        values (list): The values.
+        p (float): The percentile (0-100).
+
+    Returns:
+        float or None: The percentile, or None if there is no value.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(1, math.ceil(p / 100 * len(values))) - 1]
+
+
+class UEAttach:
+    """Represents the attach of a UE: the time of every step, taken from the log of the UE."""
+
+    def __init__(self, number, sessions=SESSIONS):
+        """
+        Initializes a UEAttach object.
+
+        Args:
+            number (int): The number of the UE.
+            sessions (int): The number of PDU sessions established by the UE.
+        """
+        self.number = number
+        self.sessions = sessions
+        self.started = None  # First line logged by the UE
+        self.steps = {}  # Time of every step, by name (see STEPS)
+        self.pdu_sessions = {}  # (time, interface, IP address) of every PDU session, by PDU session ID
+        self.failures = {}  # Number of failures, by kind (see FAILURES)
+
+    def update(self, line, time):
+        """
+        Updates the attach with a line of the log of the UE.
+
+        Args:
+            line (str): The log line.
+            time (float): The timestamp of the line.
+        """
+        if self.started is None:
+            self.started = time
+
+        for step, pattern in STEPS.items():
+            if step not in self.steps and pattern.search(line):
+                self.steps[step] = time
+
+        match = PDU_SESSION.search(line)
+        if match:
+            self.pdu_sessions[int(match.group(1))] = (time, match.group(2), match.group(3))
+
+        for kind, pattern in FAILURES.items():
+            if pattern.search(line):
+                self.failures[kind] = self.failures.get(kind, 0) + 1
+
+    @property
+    def ready(self):
+        """bool: True once all the PDU sessions of the UE are established."""
+        return len(self.pdu_sessions) >= self.sessions
+
+    @property
+    def attached(self):
+        """float or None: The time at which the last PDU session was established, None if not ready."""
+        return max(time for time, _, _ in self.pdu_sessions.values()) if self.ready else None
+
+    def latency(self, step=None):
+        """
+        Returns the time elapsed between the start of the UE and a step of its attach.
+
+        Args:
+            step (str): "rrc", "registered", a PDU session ID, or None for the whole attach.
+
+        Returns:
+            float or None: The latency in seconds, or None if the step was not reached.
+        """
+        if step is None:
+            time = self.attached
+        elif step in self.pdu_sessions:
+            time = self.pdu_sessions[step][0]
+        else:
+            time = self.steps.get(step)
+
+        if time is None or self.started is None:
+            return None
+        return time - self.started
+
+
+class AttachTracker:
+    """
+    Tracks the registration and the PDU sessions of the UEs by following the UE and gNB logs.
+
+    The logs are followed incrementally (see `LogFollower`): every poll only reads the lines appended since
+    the previous one. A UE log without IMSI prefixes belongs to the single UE of its container; in a packed
+    container the IMSI of every line gives the UE, numbered from the IMSI of the configuration of the container.
+    """
+
+    def __init__(self, log_folder, containers, ngNB=0, config_folder=None, sessions=SESSIONS, truncate=False):
+        """
+        Initializes an AttachTracker object.
+
+        Args:
+            log_folder (str): Folder of the logs written by the init scripts (ue<k>.log, uepack<k>.log, gnb<i>.log).
+            containers (dict): The numbers of the UEs hosted by every UE container, by container name (see `containers_of`).
+            ngNB (int): The number of gNBs whose NG Setup is tracked.
+            config_folder (str): Folder of the UE configurations, needed for the packed containers.
+            sessions (int): The number of PDU sessions established by every UE.
+            truncate (bool): If True the logs are emptied first (before the components are started).
+        """
+        self.containers = containers
+        self.ngNB = ngNB
+        self.config_folder = config_folder
+        self.ues = {i: UEAttach(i, sessions) for numbers in containers.values() for i in numbers}
+        self.ng_setup = {}  # Time of the NG Setup of every gNB, by number
+        self.follower = LogFollower()
+        self._sources = {}  # Container name or gNB number of every log, by path
+        self._first_imsi = {}  # IMSI of the first UE of every packed container
+        self._ready = None
+
+        for container in containers:
+            path = os.path.join(log_folder, f"{container}.log")
+            self.follower.add(path, truncate=truncate)
+            self._sources[path] = container
+
+        for i in range(1, ngNB + 1):
+            path = os.path.join(log_folder, f"gnb{i}.log")
+            self.follower.add(path, truncate=truncate)
+            self._sources[path] = i
+
+    @property
+    def ready_event(self):
+        """asyncio.Event: Set once all the UEs are ready (created on first use, in the running event loop)."""
+        if self._ready is None:
+            self._ready = asyncio.Event()
+            if self.ready_count == len(self.ues):
+                self._ready.set()
+        return self._ready
+
+    @property
+    def ready_count(self):
+        """int: The number of UEs whose PDU sessions are all established."""
+        return sum(ue.ready for ue in self.ues.values())
+
+    def _ue(self, container, line):
+        # The UE of a log line: the single UE of the container, or the UE of the IMSI prefix
+        numbers = self.containers[container]
+        match = UE_PREFIX.search(line)
+        if not match:
+            return self.ues[numbers[0]] if len(numbers) == 1 else None
+
+        if container not in self._first_imsi:
+            self._first_imsi[container] = self._read_first_imsi(container)
+        if self._first_imsi[container] is None:
+            return None
+
+        return self.ues.get(numbers[0] + int(match.group(1)) - self._first_imsi[container])
+
+    def _read_first_imsi(self, container):
+        # nr-ue numbers the UEs of a packed container from the IMSI of its configuration
+        try:
+            with open(os.path.join(self.config_folder or "", f"open5gs_{container}.yaml")) as f:
+                match = re.search(r"^supi: 'imsi-(\d+)'", f.read(), re.MULTILINE)
+        except OSError:
+            return None
+        return int(match.group(1)) if match else None
+
+    def poll(self):
+        """
+        Reads the lines appended to the logs since the previous poll and updates the attach of the UEs.
+
+        Returns:
+            bool: True if all the UEs are ready.
+        """
+        for path, lines in self.follower.poll().items():
+            source = self._sources[path]
+            for line in lines:
+                time = parse_time(line)
+                if time is None:
+                    continue
+
+                if isinstance(source, int):
+                    if source not in self.ng_setup and NG_SETUP.search(line):
+                        self.ng_setup[source] = time
+                    continue
+
+                ue = self._ue(source, line)
+                if ue:
+                    ue.update(line, time)
+
+        ready = self.ready_count == len(self.ues)
+        if ready and self._ready is not None:
+            self._ready.set()
+        return ready
+
+    def gnbs_ready(self):
+        """
+        Reads the lines appended to the logs since the previous poll and checks the NG Setup of the gNBs.
+
+        Returns:
+            bool: True if every gNB has completed its NG Setup.
+        """
+        self.poll()
+        return len(self.ng_setup) == self.ngNB
+
+    async def wait_ready(self, timeout):
+        """
+        Follows the logs until all the UEs are ready (setting `ready_event`) or the timeout expires.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            bool: True if all the UEs are ready.
+        """
+        self.ready_event  # Created now, so that it is set by the polls below
+        return await wait_until(self.poll, timeout)
+
+    def summary(self):
+        """
+        Returns the statistics of the attach latency of the UEs.
+
+        Returns:
+            dict: The keys "ready" (number of UEs ready), "total", and "min", "avg", "p50", "p95", "max"
+                  (seconds, None if no UE is ready).
+        """
+        latencies = [ue.latency() for ue in self.ues.values() if ue.ready and ue.latency() is not None]
+        return {
+            "ready": self.ready_count,
+            "total": len(self.ues),
+            "min": min(latencies) if latencies else None,
+            "avg": sum(latencies) / len(latencies) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": max(latencies) if latencies else None,
+        }
@@ -0,0 +1,139 @@
+import asyncio
+import math
+import random
+
+from python_modules.attach import percentile
+
+
+# Arrival patterns of the UEs (see `arrival_times`)
+ARRIVALS = ("burst", "poisson", "ramp")
+# Default arrival rate of the UEs (UEs per second)
+ARRIVAL_RATE = 10
+# Width of the window of the peak rates (seconds)
+PEAK_WINDOW = 1.0
+
+
+def arrival_times(pattern, count, rate=ARRIVAL_RATE, seed=None):
+    """
+    Returns the start times of the arrivals of a storm, relative to the start of the storm.
+
+    Args:
+        pattern (str): "burst" (all at once), "poisson" (exponential inter-arrival times with the given mean
+                       rate) or "ramp" (rate rising linearly from 0 to the given rate at the last arrival).
+        count (int): The number of arrivals.
+        rate (float): The arrival rate (arrivals per second), unused by "burst".
+        seed (int): Seed of the random inter-arrival times (reproducible Poisson storms).
+
+    Returns:
+        list: The start time of every arrival in seconds, in increasing order.
+
+    Raises:
+        ValueError: If the pattern is unknown or the rate is not positive.
+    """
+    if pattern not in ARRIVALS:
+        raise ValueError(f"Unknown arrival pattern '{pattern}' (expected one of {', '.join(ARRIVALS)})")
+    if pattern != "burst" and rate <= 0:
+        raise ValueError("The arrival rate must be positive")
+
+    if pattern == "burst":
+        return [0.0] * count
+
+    if pattern == "poisson":
+        generator = random.Random(seed)
+        times, time = [], 0.0
+        for _ in range(count):
+            times.append(time)
+            time += generator.expovariate(rate)
+        return times
+
+    # Ramp: with a rate rising linearly to `rate` in `duration`, n arrivals happen by sqrt(n / count) * duration
+    duration = 2 * count / rate
+    return [duration * math.sqrt(n / count) for n in range(count)]
+
+
+async def start_storm(containers, start, times):
+    """
+    Starts the UE containers at their arrival times.
+
+    Args:
+        containers (list): The names of the UE containers, in order of arrival.
+        start (callable): Coroutine function starting a container, taking its name.
+        times (list): The start time of every container, relative to the start of the storm (see `arrival_times`).
+
+    Returns:
+        float: The duration of the arrivals in seconds (late arrivals included).
+    """
+    loop = asyncio.get_running_loop()
+    origin = loop.time()
+
+    async def arrive(container, time):
+        await asyncio.sleep(max(0.0, origin + time - loop.time()))
+        await start(container)
+
+    await asyncio.gather(*(arrive(container, time) for container, time in zip(containers, times)))
+    return loop.time() - origin
+
+
+def peak_rate(times, window=PEAK_WINDOW):
+    """
+    Returns the highest number of events per second over a sliding window.
+
+    Args:
+        times (list): The times of the events (seconds, in any order).
+        window (float): Width of the window in seconds.
+
+    Returns:
+        float: The peak rate (events per second), 0 without events.
+    """
+    times = sorted(times)
+    peak, first = 0, 0
+    for last, time in enumerate(times):
+        while time - times[first] > window:
+            first += 1
+        peak = max(peak, last - first + 1)
+    return peak / window
+
+
+def storm_report(tracker):
+    """
+    Returns the results of an attach storm, from the UE logs followed by an attach tracker.
+
+    The rates are measured from the first line logged by a UE, with the timestamps of the UERANSIM logs,
+    so they only depend on the clock of the containers.
+
+    Args:
+        tracker (AttachTracker): The tracker of the UEs of the storm (already polled).
+
+    Returns:
+        dict: The keys "ues", "attached", "registration_failures", "session_failures", "not_attached",
+              "registrations_per_s", "sessions_per_s" (average rates, None if unknown), "peak_registrations_per_s",
+              "peak_sessions_per_s", and the attach latency "p50", "p95", "p99", "max" (seconds, None if no UE
+              is attached).
+    """
+    ues = list(tracker.ues.values())
+    started = [ue.started for ue in ues if ue.started is not None]
+    registrations = [ue.steps["registered"] for ue in ues if "registered" in ue.steps]
+    sessions = [time for ue in ues for time, _, _ in ue.pdu_sessions.values()]
+    latencies = [ue.latency() for ue in ues if ue.ready]
+
+    def rate(times):
+        # Average rate from the start of the first UE to the last event
+        if not times or not started or max(times) <= min(started):
+            return None
+        return len(times) / (max(times) - min(started))
+
+    return {
+        "ues": len(ues),
+        "attached": len(latencies),
+        "registration_failures": sum(1 for ue in ues if ue.failures.get("registration")),
+        "session_failures": sum(1 for ue in ues if ue.failures.get("session")),
+        "not_attached": len(ues) - len(latencies),
+        "registrations_per_s": rate(registrations),
+        "sessions_per_s": rate(sessions),
+        "peak_registrations_per_s": peak_rate(registrations),
+        "peak_sessions_per_s": peak_rate(sessions),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else None,
+    }
@@ -0,0 +1,109 @@
+# UDP port of the GTP-U tunnels (N3 interface between the gNBs and the UPFs)
+GTPU_PORT = 2152
+
+
+class CaptureFilter:
+    """
+    Represents a tcpdump capture filter.
+
+    The filter is compiled into a BPF expression that tcpdump installs in the kernel, so the packets
+    that do not match are dropped before being copied to user space and written to the pipe.
+    """
+
+    def __init__(self, hosts=None, protocol=None, port=None, icmp_echo=False):
+        """
+        Initializes a CaptureFilter object.
+
+        Args:
+            hosts (list): IP addresses of which the packets (sent or received) are captured.
+            protocol (str): Protocol of the captured packets ("udp", "tcp" or "icmp").
+            port (int): Port (source or destination) of the captured packets.
+            icmp_echo (bool): If True only ICMP echo requests and replies are captured.
+        """
+        self.hosts = list(hosts or [])
+        self.protocol = protocol
+        self.port = port
+        self.icmp_echo = icmp_echo
+
+    def add_host(self, host):
+        """
+        Adds an IP address to the captured hosts.
+
+        Args:
+            host (str): The IP address.
+        """
+        if host and host not in self.hosts:
+            self.hosts.append(host)
+
+    def expression(self):
+        """
+        Compiles the filter into a BPF expression.
+
+        Returns:
+            str: The expression (e.g. "udp port 2152 and (host 10.45.0.2 or host 10.45.0.3)"),
+                 empty if the filter captures everything.
+        """
+        terms = []
+
+        if self.icmp_echo:
+            terms.append("(icmp[icmptype] == icmp-echo or icmp[icmptype] == icmp-echoreply)")
+        elif self.protocol and self.port:
+            terms.append(f"{self.protocol} port {self.port}")
+        elif self.protocol:
+            terms.append(self.protocol)
+        elif self.port:
+            terms.append(f"port {self.port}")
+
+        if self.hosts:
+            terms.append("(" + " or ".join(f"host {host}" for host in self.hosts) + ")")
+
+        return " and ".join(terms)
+
+    def __str__(self):
+        """
+        Returns a string representation of the CaptureFilter object.
+
+        Returns:
+            str: The BPF expression, or "all" if the filter captures everything.
+        """
+        return self.expression() or "all"
+
+
+def gtpu(hosts=None):
+    """
+    Creates a filter capturing the GTP-U traffic (user plane between the gNBs and the UPFs).
+
+    Args:
+        hosts (list): Restrict the capture to these IP addresses (gNBs or UPFs).
+
+    Returns:
+        CaptureFilter: The filter.
+    """
+    return CaptureFilter(hosts=hosts, protocol="udp", port=GTPU_PORT)
+
+
+def icmp_echo(hosts=None):
+    """
+    Creates a filter capturing the ICMP echo requests and replies (ping).
+
+    Args:
+        hosts (list): Restrict the capture to these IP addresses.
+
+    Returns:
+        CaptureFilter: The filter.
+    """
+    return CaptureFilter(hosts=hosts, protocol="icmp", icmp_echo=True)
+
+
+def udp(hosts=None, port=None):
+    """
+    Creates a filter capturing UDP traffic (e.g. the radio link simulation between UEs and gNBs).
+
+    Args:
+        hosts (list): Restrict the capture to these IP addresses.
+        port (int): Restrict the capture to this port.
+
+    Returns:
+        CaptureFilter: The filter.
+    """
+    return CaptureFilter(hosts=hosts, protocol="udp", port=port)
@@ -0,0 +1,414 @@
+import asyncio
+import json
+import os
+import signal
+import struct
+
+from python_modules.runner import Runner
+
+
+# Default Unix socket of the local Docker daemon
+DOCKER_SOCKET = "/var/run/docker.sock"
+# Default number of idle keep-alive connections kept by the client
+POOL_SIZE = 8
+# Attempts to read the exit code of an exec whose output stream has ended
+EXIT_CODE_RETRIES = 10
+
+
+class DockerApiError(Exception):
+    """Raised when the Docker daemon answers a request with an error status."""
+
+    def __init__(self, status, message):
+        """
+        Initializes a DockerApiError object.
+
+        Args:
+            status (int): HTTP status code of the response.
+            message (str): Error message returned by the daemon.
+        """
+        super().__init__(f"Docker API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def socket_path_from_env():
+    """
+    Returns the Unix socket of the Docker daemon, honouring DOCKER_HOST when it is a unix:// URL.
+
+    Returns:
+        str: Path of the socket.
+    """
+    docker_host = os.environ.get("DOCKER_HOST", "")
+    if docker_host.startswith("unix://"):
+        return docker_host[len("unix://"):]
+    return DOCKER_SOCKET
+
+
+class DockerClient:
+    """
+    Minimal asyncio client of the Docker Engine API over its Unix socket.
+
+    Regular requests (exec create and inspect) go through a pool of keep-alive HTTP connections, so
+    that a command costs a couple of round trips on an already open socket instead of spawning the
+    `docker` CLI. Starting an exec hijacks its connection for the output stream, so every start uses
+    a dedicated connection (connecting to a Unix socket only takes a few microseconds).
+
+    The socket path is configurable, so the client can be exercised against a local stand-in server.
+    """
+
+    def __init__(self, socket_path=DOCKER_SOCKET, pool_size=POOL_SIZE):
+        """
+        Initializes a DockerClient object (no connection is opened until the first request).
+
+        Args:
+            socket_path (str): Path of the Unix socket of the Docker daemon.
+            pool_size (int): Maximum number of idle keep-alive connections kept open.
+        """
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self._idle = []  # Idle keep-alive connections, as (reader, writer) pairs
+
+    async def _send(self, writer, method, path, body=None, upgrade=False):
+        # Send an HTTP/1.1 request with an optional JSON body (asking to upgrade the connection to a raw stream)
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\n"
+            "Host: docker\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            + ("Connection: Upgrade\r\nUpgrade: tcp\r\n" if upgrade else "")
+            + "\r\n"
+        )
+        writer.write(head.encode() + payload)
+        await writer.drain()
+
+    async def _read_head(self, reader):
+        # Read the status line and the headers of a response
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by the Docker daemon")
+
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        return status, headers
+
+    async def _read_body(self, reader, headers):
+        # Read the body of a response, returning it with a flag telling if the connection can be reused
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()  # Empty line after the last chunk
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()  # CRLF after the chunk
+        else:
+            return await reader.read(), False  # The body ends when the daemon closes the connection
+
+        return body, headers.get("connection", "").lower() != "close"
+
+    async def request(self, method, path, body=None):
+        """
+        Sends a request to the Docker daemon on a pooled keep-alive connection.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path of the endpoint (e.g. "/exec/<id>/json").
+            body (dict): JSON body of the request.
+
+        Returns:
+            dict or None: The decoded JSON response, None if the response is empty.
+
+        Raises:
+            DockerApiError: If the daemon answers with an error status.
+        """
+
+        # A pooled connection may have been closed by the daemon meanwhile: retry once on a new one
+        # (never on another pooled connection, which may be just as stale)
+        for attempt in range(2):
+            reused = not attempt and bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await asyncio.open_unix_connection(self.socket_path)
+
+            try:
+                await self._send(writer, method, path, body)
+                status, headers = await self._read_head(reader)
+                data, keep_alive = await self._read_body(reader, headers)
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused or attempt:
+                    raise
+
+        if keep_alive and len(self._idle) < self.pool_size:
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+        decoded = json.loads(data) if data.strip() else None
+        if status >= 400:
+            message = decoded.get("message") if isinstance(decoded, dict) else data.decode(errors="replace")
+            raise DockerApiError(status, message)
+
+        return decoded
+
+    async def exec_create(self, container, cmd, stdin=False):
+        """
+        Creates an exec instance running a command in a container, attached to its output.
+
+        Args:
+            container (str): Name or ID of the container.
+            cmd (list): The command and its arguments.
+            stdin (bool): If True the exec is also attached to the standard input of the command.
+
+        Returns:
+            str: ID of the exec instance.
+        """
+        body = {"AttachStdin": stdin, "AttachStdout": True, "AttachStderr": True, "Tty": False, "Cmd": list(cmd)}
+        response = await self.request("POST", f"/containers/{container}/exec", body)
+        return response["Id"]
+
+    async def exec_start(self, exec_id, stdin=False):
+        """
+        Starts an exec instance and returns the process reading its output stream.
+
+        Args:
+            exec_id (str): ID of the exec instance.
+            stdin (bool): If True the standard input of the command is available as `process.stdin`
+                          (the exec must have been created with `stdin=True`).
+
+        Returns:
+            ExecProcess: The running process.
+        """
+
+        # The daemon hijacks this connection to stream the output, so it cannot go back to the pool
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        await self._send(writer, "POST", f"/exec/{exec_id}/start", {"Detach": False, "Tty": False}, upgrade=True)
+        status, headers = await self._read_head(reader)
+
+        if status >= 400:
+            data, _ = await self._read_body(reader, headers)
+            writer.close()
+            raise DockerApiError(status, data.decode(errors="replace").strip())
+
+        return ExecProcess(self, exec_id, reader, writer, stdin=stdin)
+
+    async def exec_inspect(self, exec_id):
+        """
+        Returns the state of an exec instance (e.g. "Running" and "ExitCode").
+
+        Args:
+            exec_id (str): ID of the exec instance.
+
+        Returns:
+            dict: The state of the exec instance.
+        """
+        return await self.request("GET", f"/exec/{exec_id}/json")
+
+    async def close(self):
+        """Closes the idle pooled connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+class ExecProcess:
+    """
+    Represents a command running in a container through the Docker API.
+
+    It exposes the same interface as `asyncio.subprocess.Process` (stdin, stdout and stderr streams,
+    wait, communicate, terminate, kill, returncode), so that it can be used by the runner helpers. The
+    output stream of the exec is demultiplexed into stdout and stderr in the background, while the
+    standard input is written directly on the hijacked connection.
+    """
+
+    def __init__(self, client, exec_id, reader=None, writer=None, error=None, stdin=False):
+        """
+        Initializes an ExecProcess object.
+
+        Args:
+            client (DockerClient): The client that started the exec.
+            exec_id (str): ID of the exec instance (None if the exec could not be started).
+            reader (asyncio.StreamReader): Hijacked connection carrying the output stream.
+            writer (asyncio.StreamWriter): Writing side of the hijacked connection.
+            error (str): Error message of an exec that could not be started (reported on stderr).
+            stdin (bool): If True `stdin` is the writing side of the connection (None otherwise).
+        """
+        self.client = client
+        self.exec_id = exec_id
+        self.stdout = asyncio.StreamReader()
+        self.stderr = asyncio.StreamReader()
+        self.returncode = None
+        self._writer = writer
+        self._terminated = False
+        self.stdin = writer if stdin and error is None else None
+
+        if error is not None:
+            # Behave like a process that failed immediately, as the docker CLI does
+            self.stderr.feed_data(error.encode())
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+            self.returncode = 1
+            self._pump = None
+        else:
+            self._pump = asyncio.ensure_future(self._demultiplex(reader))
+
+    async def _demultiplex(self, reader):
+        # Every frame has an 8 bytes header: stream type (1 = stdout, 2 = stderr), 3 zero bytes, size
+        try:
+            while True:
+                stream, size = struct.unpack(">BxxxL", await reader.readexactly(8))
+                data = await reader.readexactly(size)
+                (self.stderr if stream == 2 else self.stdout).feed_data(data)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # The command ended (or the connection was closed)
+        finally:
+            self.stdout.feed_eof()
+            self.stderr.feed_eof()
+            self._writer.close()
+
+    async def wait(self):
+        """
+        Waits for the end of the output stream and returns the exit code of the command.
+
+        Returns:
+            int: The exit code (-SIGTERM if the stream was closed while the command was still running).
+        """
+        if self.returncode is not None:
+            return self.returncode
+
+        await self._pump
+
+        # The daemon may need a moment to record the exit code after closing the stream
+        for _ in range(EXIT_CODE_RETRIES):
+            try:
+                state = await self.client.exec_inspect(self.exec_id)
+            except (DockerApiError, OSError):
+                break
+
+            if not state.get("Running") and state.get("ExitCode") is not None:
+                self.returncode = state["ExitCode"]
+                return self.returncode
+            if self._terminated:
+                break  # Still running, but no longer followed
+            await asyncio.sleep(0.01)
+
+        self.returncode = -signal.SIGTERM
+        return self.returncode
+
+    async def communicate(self):
+        """
+        Reads the whole output of the command and waits for its end.
+
+        Returns:
+            tuple: (stdout, stderr) as bytes.
+        """
+        stdout, stderr = await asyncio.gather(self.stdout.read(), self.stderr.read())
+        await self.wait()
+        return stdout, stderr
+
+    def terminate(self):
+        """
+        Stops following the command by closing its output stream.
+
+        As with `docker exec`, the command itself keeps running inside the container until it ends.
+        """
+        self._terminated = True
+        if self._writer is not None:
+            self._writer.close()
+
+    def kill(self):
+        """Same as `terminate`: the Docker API has no way to signal an exec instance."""
+        self.terminate()
+
+
+class DockerApiRunner(Runner):
+    """
+    Runner executing the commands through the Docker Engine API instead of the `docker` CLI.
+
+    It avoids the start-up of a `docker` process and the connection to the daemon for every command,
+    which cuts the overhead of a command from hundreds of milliseconds to a few milliseconds.
+    """
+
+    def __init__(self, concurrency=None, timeout=None, socket_path=DOCKER_SOCKET, pool_size=None):
+        """
+        Initializes a DockerApiRunner object.
+
+        Args:
+            concurrency (int): Maximum number of commands running at the same time (None: no limit).
+            timeout (float): Default timeout of a command in seconds (None: no timeout).
+            socket_path (str): Path of the Unix socket of the Docker daemon.
+            pool_size (int): Maximum number of idle keep-alive connections (default: the concurrency, or 8).
+        """
+        super().__init__(concurrency=concurrency, timeout=timeout)
+        self.client = DockerClient(socket_path, pool_size or concurrency or POOL_SIZE)
+
+    async def spawn(self, container, *args, stdin=False):
+        """
+        Starts a command inside a container through the Docker API.
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            stdin (bool): If True the standard input of the command is available as `process.stdin`.
+
+        Returns:
+            ExecProcess: The process (already ended with exit code 1 if the exec could not be started).
+        """
+        try:
+            exec_id = await self.client.exec_create(container, args, stdin=stdin)
+            return await self.client.exec_start(exec_id, stdin=stdin)
+        except (DockerApiError, OSError) as e:
+            return ExecProcess(self.client, None, error=f"Error: {e}\n")
+
+    async def container_pid(self, container):
+        """
+        Returns the PID of the main process of a container on the host, from the Docker API.
+
+        Args:
+            container (str): Name of the Docker container.
+
+        Returns:
+            int or None: The PID, or None if the container is not running.
+        """
+        try:
+            response = await self.client.request("GET", f"/containers/{container}/json")
+        except (DockerApiError, OSError):
+            return None
+        return response["State"]["Pid"] or None
+
+    async def close(self):
+        """Closes the pooled connections to the Docker daemon."""
+        await self.client.close()
+
+
+def create_runner(backend="api", concurrency=None, timeout=None):
+    """
+    Creates the runner of the selected backend, falling back to the CLI when the API is not reachable.
+
+    Args:
+        backend (str): "api" (Docker Engine API over the Unix socket) or "cli" (`docker exec`).
+        concurrency (int): Maximum number of commands running at the same time (None: no limit).
+        timeout (float): Default timeout of a command in seconds (None: no timeout).
+
+    Returns:
+        Runner: The runner.
+    """
+    socket_path = socket_path_from_env()
+
+    if backend == "api":
+        if os.access(socket_path, os.R_OK | os.W_OK):
+            return DockerApiRunner(concurrency=concurrency, timeout=timeout, socket_path=socket_path)
+        print(f"Docker socket '{socket_path}' not accessible, falling back to the docker CLI")
+
+    return Runner(concurrency=concurrency, timeout=timeout)
+
@@ -0,0 +1,149 @@
+import json
+
+
+class Iperf3Result:
+    """Represents the result of an iperf3 test, parsed from its JSON output (`iperf3 -J`)."""
+
+    def __init__(self):
+        """Initializes an empty result (all the measures are None until they are parsed)."""
+        self.protocol = None        # "TCP" or "UDP"
+        self.reverse = False        # True if the server was sending (iperf3 -R)
+        self.sent_bps = None        # Bits per second sent by the sender
+        self.received_bps = None    # Bits per second received by the receiver
+        self.retransmits = None     # TCP retransmissions of the sender
+        self.cpu_local = None       # CPU utilisation (%) of the client host
+        self.cpu_remote = None      # CPU utilisation (%) of the server host
+        self.jitter_ms = None       # UDP jitter measured by the receiver
+        self.lost_packets = None    # UDP packets lost
+        self.packets = None         # UDP packets sent
+        self.lost_percent = None    # UDP loss (%)
+        self.intervals = []         # (start, end, bits per second) of every reporting interval
+        self.error = None           # Error message, if the test failed
+
+    def __str__(self):
+        """
+        Returns a string representation of the result.
+
+        Returns:
+            str: The per-interval samples followed by the summary of the test.
+        """
+        if self.error:
+            return f"iperf3 error: {self.error}"
+
+        result = ""
+        for start, end, bps in self.intervals:
+            result += f"  {start:6.2f}-{end:6.2f} sec  {to_mbps(bps)} Mbits/sec\n"
+
+        result += f"{self.protocol}: sent {to_mbps(self.sent_bps)} Mbits/sec, received {to_mbps(self.received_bps)} Mbits/sec"
+        if self.protocol == "UDP":
+            result += f", jitter {self.jitter_ms} ms, lost {self.lost_packets}/{self.packets} ({self.lost_percent}%)"
+        else:
+            result += f", retransmits {self.retransmits}"
+        result += f", CPU local {self.cpu_local}% remote {self.cpu_remote}%"
+
+        return result
+
+
+def to_mbps(value):
+    """
+    Converts a bitrate in bits per second to Mbits per second.
+
+    Args:
+        value (float): The bitrate in bits per second.
+
+    Returns:
+        float or None: The bitrate in Mbits/sec rounded to two decimals, or None if the value is missing.
+    """
+    return None if value is None else round(value / 1e6, 2)
+
+
+def client_command(server, port=None, bind=None, duration=5, reverse=False, udp=False, bitrate=None):
+    """
+    Builds the command line of an iperf3 client with JSON output.
+
+    Args:
+        server (str): IP address of the iperf3 server.
+        port (int): Port of the server (default: the iperf3 default port).
+        bind (str): Local IP address to bind to (selects the UE interface).
+        duration (int): Duration of the test in seconds.
+        reverse (bool): If True the server sends and the client receives (downlink).
+        udp (bool): If True run a UDP test instead of a TCP test.
+        bitrate (str): Target bitrate (e.g. "10M"), mandatory to load the link with UDP.
+
+    Returns:
+        list: The command and its arguments.
+    """
+
+    command = ["iperf3", "-J", "-c", server, "-t", str(duration)]
+
+    if port:
+        command += ["-p", str(port)]
+    if bind:
+        command += ["-B", bind]
+    if reverse:
+        command.append("-R")
+    if udp:
+        command.append("-u")
+    if bitrate:
+        command += ["-b", str(bitrate)]
+
+    return command
+
+
+def parse_json(output):
+    """
+    Parses the JSON output of an iperf3 client.
+
+    Args:
+        output (str): The output of `iperf3 -J`.
+
+    Returns:
+        Iperf3Result: The parsed result (with `error` set if the test failed or the output is not valid JSON).
+    """
+
+    result = Iperf3Result()
+
+    try:
+        data = json.loads(output)
+    except (TypeError, ValueError):
+        result.error = (output or "no output").strip()
+        return result
+
+    if data.get("error"):
+        result.error = data["error"]
+        return result
+
+    test_start = data.get("start", {}).get("test_start", {})
+    result.protocol = test_start.get("protocol")
+    result.reverse = bool(test_start.get("reverse"))
+
+    for interval in data.get("intervals", []):
+        summary = interval.get("sum", {})
+        result.intervals.append((summary.get("start"), summary.get("end"), summary.get("bits_per_second")))
+
+    end = data.get("end", {})
+
+    if result.protocol == "UDP":
+        # The receiver statistics (jitter and loss) are in "sum"
+        summary = end.get("sum", {})
+        result.jitter_ms = summary.get("jitter_ms")
+        result.lost_packets = summary.get("lost_packets")
+        result.packets = summary.get("packets")
+        result.lost_percent = summary.get("lost_percent")
+        result.sent_bps = end.get("sum_sent", summary).get("bits_per_second")
+
+        if "sum_received" in end:
+            result.received_bps = end["sum_received"].get("bits_per_second")
+        elif result.sent_bps is not None and result.lost_percent is not None:
+            # Older versions only report the sending rate: derive the received rate from the loss
+            result.received_bps = result.sent_bps * (1 - result.lost_percent / 100)
+    else:
+        result.sent_bps = end.get("sum_sent", {}).get("bits_per_second")
+        result.received_bps = end.get("sum_received", {}).get("bits_per_second")
+        result.retransmits = end.get("sum_sent", {}).get("retransmits")
+
+    cpu = end.get("cpu_utilization_percent", {})
+    result.cpu_local = cpu.get("host_total")
+    result.cpu_remote = cpu.get("remote_total")
+
+    return result
@@ -0,0 +1,78 @@
+import os
+
+
+class LogFollower:
+    """
+    Follows log files, reading only the bytes appended to every file since its previous read.
+
+    The offset of every file is kept between two reads, and the last line is only returned once it is
+    complete. A file that shrinks (truncated, or rewritten by a component started with `>`) is read again
+    from the start. The files may not exist yet when they are added.
+    """
+
+    def __init__(self):
+        """Initializes a LogFollower object, following no file."""
+        self._files = {}  # Offset and incomplete last line of every file, by path
+
+    @property
+    def paths(self):
+        """list: The paths of the followed files."""
+        return list(self._files)
+
+    def add(self, path, from_end=False, truncate=False):
+        """
+        Starts following a file.
+
+        Args:
+            path (str): Path of the file.
+            from_end (bool): If True the content already in the file is skipped.
+            truncate (bool): If True the file is emptied first (for the logs rewritten by their component when
+                             it starts, whose new content could otherwise be mistaken for the end of the old one).
+        """
+        if truncate and os.path.exists(path):
+            open(path, "w").close()
+        self._files[path] = [self._size(path) if from_end else 0, b""]
+
+    def _size(self, path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def read(self, path):
+        """
+        Reads the lines appended to a file since its previous read.
+
+        Args:
+            path (str): Path of the file (it must have been added).
+
+        Returns:
+            list: The new complete lines, without their newline.
+        """
+        state = self._files[path]
+
+        # The file was truncated or replaced: read it from the start
+        if self._size(path) < state[0]:
+            state[0], state[1] = 0, b""
+
+        try:
+            with open(path, "rb") as f:
+                f.seek(state[0])
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        state[0] += len(data)
+        *lines, state[1] = (state[1] + data).split(b"\n")
+
+        return [line.decode(errors="replace") for line in lines]
+
+    def poll(self):
+        """
+        Reads the lines appended to all the files since their previous read.
+
+        Returns:
+            dict: The new complete lines of every file, by path (files without new lines are omitted).
+        """
+        lines = {path: self.read(path) for path in self._files}
+        return {path: new_lines for path, new_lines in lines.items() if new_lines}
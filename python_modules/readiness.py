@@ -0,0 +1,133 @@
+import asyncio
+import re
+
+from python_modules.log_follower import LogFollower
+
+
+# Seconds between two checks of a probe
+PROBE_INTERVAL = 0.2
+# Default maximum number of seconds to wait for a component to be ready
+READY_TIMEOUT = 120
+# Directory of the files signalling the init scripts to start a stage (see `signal_stage`)
+STAGE_DIRECTORY = "/tmp"
+
+
+class LogProbe:
+    """
+    Watches a log file for the lines matching a pattern.
+
+    Only the lines appended after the probe was created are considered, so the lines of a previous run
+    (the Open5GS logs are appended to) do not make a component look ready. Every check reads only the
+    bytes appended since the previous one (see `LogFollower`).
+    """
+
+    def __init__(self, path, pattern, truncate=False):
+        """
+        Initializes a LogProbe object.
+
+        Args:
+            path (str): Path of the log file (it may not exist yet).
+            pattern (str): Regular expression searched in every line.
+            truncate (bool): If True the log is emptied first, for the logs rewritten by their component
+                             when it starts (a new log could otherwise be mistaken for the end of the old one).
+        """
+        self.path = path
+        self.pattern = re.compile(pattern)
+        self.matches = []  # Match objects of the matching lines, in order
+        self._follower = LogFollower()
+        self._follower.add(path, from_end=True, truncate=truncate)
+
+    def poll(self):
+        """
+        Reads the lines appended to the log since the previous check.
+
+        Returns:
+            list: All the matches found so far.
+        """
+        for line in self._follower.read(self.path):
+            match = self.pattern.search(line)
+            if match:
+                self.matches.append(match)
+
+        return self.matches
+
+
+async def wait_until(check, timeout=READY_TIMEOUT, interval=PROBE_INTERVAL):
+    """
+    Checks a condition until it holds, without waiting past the timeout.
+
+    Args:
+        check (callable): Function or coroutine function without arguments returning a truthy value when ready.
+        timeout (float): Maximum number of seconds to wait.
+        interval (float): Seconds between two checks.
+
+    Returns:
+        bool: True if the condition holds, False if the timeout expired first.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    while True:
+        ready = check()
+        if asyncio.iscoroutine(ready):
+            ready = await ready
+        if ready:
+            return True
+
+        if loop.time() + interval > deadline:
+            return False
+        await asyncio.sleep(interval)
+
+
+async def tcp_listening(runner, container, address, port):
+    """
+    Checks that a TCP server accepts connections, from inside a container (e.g. an SBI server on a loopback address).
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        container (str): Name of the Docker container.
+        address (str): Address of the server.
+        port (int): Port of the server.
+
+    Returns:
+        bool: True if the connection succeeded.
+    """
+    # bash opens the connection itself, no client is needed in the image
+    result = await runner.run(container, "bash", "-c", f"exec 3<>/dev/tcp/{address}/{port}")
+    return result.ok
+
+
+async def sctp_listening(runner, container, port):
+    """
+    Checks that an SCTP server is listening on a port inside a container (e.g. the NGAP server of the AMF).
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        container (str): Name of the Docker container.
+        port (int): The port.
+
+    Returns:
+        bool: True if an SCTP endpoint is bound to the port.
+    """
+    # The listening SCTP endpoints are listed by the kernel, one per line with their local port
+    result = await runner.run(container, "grep", "-qw", str(port), "/proc/net/sctp/eps")
+    return result.ok
+
+
+async def signal_stage(runner, container, stage):
+    """
+    Lets the init script of a container start a stage (see `wait_stage` in the init scripts).
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        container (str): Name of the Docker container.
+        stage (str): Name of the stage (e.g. "core").
+
+    Returns:
+        bool: True if the signal was delivered.
+    """
+    result = await runner.run(container, "touch", f"{STAGE_DIRECTORY}/start_{stage}")
+    if not result.ok:
+        print(f"Unable to start the stage '{stage}' of {container}: {result} {result.stderr.strip()}")
+    return result.ok
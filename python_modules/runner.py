@@ -0,0 +1,274 @@
+import asyncio
+
+
+class CommandResult:
+    """Represents the outcome of a command executed inside a Docker container."""
+
+    def __init__(self, container, args, returncode, stdout, stderr, timed_out=False):
+        """
+        Initializes a CommandResult object.
+
+        Args:
+            container (str): Name of the Docker container.
+            args (list): The command and its arguments.
+            returncode (int): Exit code of the command (None if it was killed by the timeout).
+            stdout (str): Standard output of the command.
+            stderr (str): Standard error of the command.
+            timed_out (bool): True if the command was killed because it exceeded its timeout.
+        """
+        self.container = container
+        self.args = list(args)
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+    @property
+    def ok(self):
+        """bool: True if the command completed with exit code 0."""
+        return self.returncode == 0
+
+    @property
+    def output(self):
+        """str: Standard output followed by standard error."""
+        return self.stdout + self.stderr
+
+    def __str__(self):
+        """
+        Returns a string representation of the CommandResult object.
+
+        Returns:
+            str: The container, the command and how it ended.
+        """
+        status = "timed out" if self.timed_out else f"exit code {self.returncode}"
+        return f"{self.container}: '{' '.join(self.args)}' ({status})"
+
+
+class _Unlimited:
+    """Async context manager used in place of a semaphore when the concurrency is not limited."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class Runner:
+    """
+    Runs commands inside Docker containers with asyncio subprocesses.
+
+    Every command is executed with `docker exec` through `asyncio.create_subprocess_exec` (no shell).
+    At most `concurrency` short-lived commands run at the same time, each one is killed when it exceeds
+    its timeout, and cancelling the coroutine that is waiting for a command kills its process.
+    Long-running processes (captures, servers) are started with `spawn` and are not counted in the limit.
+    Subclasses may execute the commands differently by overriding `spawn` (see `DockerApiRunner`).
+
+    Note that killing the local `docker exec` process does not stop the process inside the container,
+    so the commands should bound their own duration (e.g. `ping -c`, `timeout`).
+    """
+
+    def __init__(self, concurrency=None, timeout=None):
+        """
+        Initializes a Runner object.
+
+        Args:
+            concurrency (int): Maximum number of commands running at the same time (None: no limit).
+            timeout (float): Default timeout of a command in seconds (None: no timeout).
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._semaphore = None
+
+    def _limit(self):
+        # The semaphore is created on first use, so that it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency) if self.concurrency else _Unlimited()
+        return self._semaphore
+
+    def command(self, container, args, stdin=False):
+        """
+        Builds the command line executing a command inside a container.
+
+        Args:
+            container (str): Name of the Docker container.
+            args (list): The command and its arguments.
+            stdin (bool): If True the standard input of the command is kept open (`docker exec -i`).
+
+        Returns:
+            list: The full command line.
+        """
+        return ["docker", "exec", *(["-i"] if stdin else []), container, *args]
+
+    async def run(self, container, *args, timeout=None):
+        """
+        Executes a command inside a container and waits for its completion.
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            timeout (float): Timeout of the command in seconds (default: the timeout of the runner).
+
+        Returns:
+            CommandResult: The outcome of the command.
+        """
+        timeout = timeout or self.timeout
+
+        async with self._limit():
+            process = await self.spawn(container, *args)
+            return await self._communicate(container, args, process, timeout)
+
+    async def _communicate(self, container, args, process, timeout):
+        # Wait for a command, killing it when it exceeds its timeout or when the caller is cancelled
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await stop_process(process, timeout=0)
+            return CommandResult(container, args, None, "", "", timed_out=True)
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+
+        return CommandResult(container, args, process.returncode,
+                             stdout.decode(errors="replace"), stderr.decode(errors="replace"))
+
+    async def container_pid(self, container):
+        """
+        Returns the PID of the main process of a container on the host.
+
+        Args:
+            container (str): Name of the Docker container.
+
+        Returns:
+            int or None: The PID, or None if the container is not running.
+        """
+        process = await asyncio.create_subprocess_exec(
+            "docker", "inspect", "-f", "{{.State.Pid}}", container,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+        stdout, _ = await process.communicate()
+
+        pid = stdout.decode(errors="replace").strip()
+        return int(pid) if process.returncode == 0 and pid.isdigit() and int(pid) > 0 else None
+
+    async def run_in_network(self, container, *args, timeout=None):
+        """
+        Executes a command of the host in the network namespace of a container and waits for its completion.
+
+        The command sees the interfaces, addresses and routes of the container but runs the programs of the
+        host (e.g. a Python client for a container whose image has no Python). It needs the privileges of
+        `nsenter` (root).
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            timeout (float): Timeout of the command in seconds (default: the timeout of the runner).
+
+        Returns:
+            CommandResult: The outcome of the command.
+        """
+        timeout = timeout or self.timeout
+
+        pid = await self.container_pid(container)
+        if pid is None:
+            return CommandResult(container, args, 1, "", f"Error: container '{container}' not running\n")
+
+        async with self._limit():
+            process = await asyncio.create_subprocess_exec(
+                "nsenter", "-t", str(pid), "-n", *args,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            return await self._communicate(container, args, process, timeout)
+
+    async def spawn(self, container, *args, stdin=False):
+        """
+        Starts a long-running command inside a container (e.g. tcpdump or an iperf3 server).
+
+        Args:
+            container (str): Name of the Docker container.
+            *args (str): The command and its arguments.
+            stdin (bool): If True the standard input of the command is available as `process.stdin`.
+
+        Returns:
+            asyncio.subprocess.Process: The process, with its stdout and stderr available as streams.
+        """
+        return await asyncio.create_subprocess_exec(
+            *self.command(container, args, stdin),
+            stdin=asyncio.subprocess.PIPE if stdin else None,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+
+    async def close(self):
+        """Releases the resources of the runner (nothing to release for the docker CLI)."""
+
+
+async def stop_process(process, timeout=2):
+    """
+    Gracefully terminates a process started by the runner, killing it if it does not exit in time.
+
+    Args:
+        process (asyncio.subprocess.Process): The process (None is ignored).
+        timeout (float): Seconds to wait after the termination request before killing the process.
+    """
+
+    if process is None or process.returncode is not None:
+        return
+
+    try:
+        process.terminate()
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+    except ProcessLookupError:
+        pass  # The process already exited
+
+
+async def wait_for_text(stream, text, timeout):
+    """
+    Reads a stream until the given text shows up, without waiting past the timeout.
+
+    Args:
+        stream (asyncio.StreamReader): The stream to read (e.g. process.stderr).
+        text (str): The text to wait for.
+        timeout (float): Maximum number of seconds to wait.
+
+    Returns:
+        tuple: (found, output) where found tells whether the text was seen and output is everything read so far.
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    output = ""
+
+    while text not in output:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False, output
+
+        try:
+            chunk = await asyncio.wait_for(stream.read(4096), remaining)
+        except asyncio.TimeoutError:
+            return False, output
+
+        if not chunk:
+            return False, output  # The process closed the stream
+
+        output += chunk.decode(errors="replace")
+
+    return True, output
+
+
+async def read_lines(stream):
+    """
+    Yields the lines of a stream as soon as they are available, until the stream is closed.
+
+    Args:
+        stream (asyncio.StreamReader): The stream to read (e.g. process.stdout).
+
+    Yields:
+        str: A line, without the trailing newline.
+    """
+
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        yield line.decode(errors="replace").rstrip("\n")
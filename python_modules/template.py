@@ -0,0 +1,136 @@
+import hashlib
+import os
+import string
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Default number of files compared and written at the same time
+WORKERS = 8
+
+
+class Template:
+    """
+    Represents a text template with `{name}` and `{name:format}` fields, as in f-strings.
+
+    The template is parsed once, when it is created, so rendering only formats the values and joins the
+    parts. Only plain names are supported as fields (no expressions): compute the values beforehand.
+    """
+
+    def __init__(self, text):
+        """
+        Initializes a Template object.
+
+        Args:
+            text (str): The template (literal braces are written `{{` and `}}`).
+        """
+        # Literal text followed by a field name (None after the last field) and its format specification
+        self.parts = [(literal, field, spec or "") for literal, field, spec, _ in string.Formatter().parse(text)]
+
+    def render(self, **values):
+        """
+        Renders the template.
+
+        Args:
+            **values: The value of every field.
+
+        Returns:
+            str: The rendered text.
+        """
+        return "".join(literal if field is None else literal + format(values[field], spec)
+                       for literal, field, spec in self.parts)
+
+
+def file_hash(path):
+    """
+    Returns the SHA-256 hash of the content of a file.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        str or None: The hex digest, or None if the file does not exist.
+    """
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def write_if_changed(path, content):
+    """
+    Writes a file atomically, unless it already has the same content.
+
+    The content is written to a temporary file of the same directory, which then replaces the file, so
+    that a reader (e.g. a container with the directory bind-mounted) never sees a partial file.
+
+    Args:
+        path (str): Path of the file.
+        content (str): The content of the file.
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged.
+    """
+    data = content.encode()
+    if file_hash(path) == hashlib.sha256(data).hexdigest():
+        return False
+
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)  # mkstemp creates the file readable by its owner only
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    return True
+
+
+def render_files(template, files, workers=WORKERS):
+    """
+    Renders a template into many files, writing only the files whose content changed.
+
+    Args:
+        template (Template): The template.
+        files (dict): The values of the fields of every file, by path.
+        workers (int): Number of files compared and written at the same time.
+
+    Returns:
+        list: The paths of the files written (new or changed).
+    """
+    contents = [(path, template.render(**values)) for path, values in files.items()]
+
+    # The comparisons and writes are I/O bound: run them in a thread pool
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        written = list(executor.map(lambda item: write_if_changed(*item), contents))
+
+    return [path for (path, _), changed in zip(contents, written) if changed]
+
+
+def remove_stale(directory, prefix, suffix, keep):
+    """
+    Removes the files of a directory generated by a previous run and no longer needed.
+
+    Args:
+        directory (str): The directory.
+        prefix (str): Prefix of the generated files (e.g. "open5gs_ue").
+        suffix (str): Suffix of the generated files (e.g. ".yaml").
+        keep (iterable): Paths of the files to keep.
+
+    Returns:
+        list: The names of the files removed.
+    """
+    keep = {os.path.abspath(path) for path in keep}
+    removed = []
+
+    for file_name in sorted(os.listdir(directory)):
+        path = os.path.abspath(os.path.join(directory, file_name))
+        if file_name.startswith(prefix) and file_name.endswith(suffix) and path not in keep:
+            os.remove(path)
+            removed.append(file_name)
+
+    return removed
@@ -1,4 +1,156 @@
 import json
+import os
+import sys
+
+if __name__ == "__main__":
+    # Run as a script: make the python_modules package importable from the root of the repository
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from python_modules.allocator import Allocator
+
+def generate_subscriber(i, allocator=None):
+    """
+    Generates the subscriber profile of the i-th User Equipment (UE).
+
+    The profile contains the IMSI, network access mode, the sessions of both slices with their 
+    AMBR (Aggregate Maximum Bit Rate) and QoS settings, and the security information of the UE.
+
+    Args:
+        i (int): The number of the UE (starting from 1).
+        allocator (Allocator): The allocator of the identifiers (default settings if None).
+
+    Returns:
+        dict: The subscriber profile.
+    """
+    
+    allocator = allocator or Allocator()
+    
+    return {
+        "imsi": allocator.imsi(i),  # Unique IMSI for each subscriber
+        "subscribed_rau_tau_timer": 12,
+        "network_access_mode": 0,
+        "subscriber_status": 0,
+        "access_restriction_data": 32,
+        "slice": [
+            {
+                "sst": 1,  # Slice Selection Type
+                "default_indicator": True,
+                "sd": "000001",
+                "session": [
+                    {
+                        "name": "internet",
+                        "type": 3,
+                        "pcc_rule": [],
+                        "ambr": {
+                            "Comment": "unit=2 ==> Mbps",
+                            "uplink": {"value": 5 * i, "unit": 2},
+                            "downlink": {"value": 5 * i, "unit": 2}
+                        },
+                        "qos": {
+                            "index": 8,
+                            "arp": {
+                                "priority_level": 15,
+                                "pre_emption_capability": 1,
+                                "pre_emption_vulnerability": 1
+                            }
+                        }
+                    }
+                ]
+            },
+            {
+                "sst": 2,
+                "default_indicator": None,
+                "sd": "000001",
+                "session": [
+                    {
+                        "name": "mec",
+                        "type": 3,
+                        "pcc_rule": [],
+                        "ambr": {
+                            "Comment": "unit=2 ==> Mbps",
+                            "uplink": {"value": 40 + 10 * i, "unit": 2},
+                            "downlink": {"value": 40 + 10 * i, "unit": 2}
+                        },
+                        "qos": {
+                            "index": 8,
+                            "arp": {
+                                "priority_level": 15,
+                                "pre_emption_capability": 1,
+                                "pre_emption_vulnerability": 1
+                            }
+                        }
+                    }
+                ]
+            }
+        ],
+        "ambr": {
+            "Comment": "unit=2 ==> Mbps",
+            "uplink": {"value": 1, "unit": 2},
+            "downlink": {"value": 1, "unit": 2}
+        },
+        "security": {
+            "k": "8baf473f2f8fd09487cccbd7097c6862",
+            "amf": "8000",
+            "op": "11111111111111111111111111111111",
+            "opc": None
+        },
+        "msisdn": [],
+        "schema_version": 1,
+        "__v": 0
+    }
+
+def generate_subscribers(nUE, start=1, allocator=None):
+    """
+    Generates the subscriber profiles of the UEs lazily, one at a time.
+
+    The profiles can be fed straight into the bulk writes of Open5GS, without being all kept in memory.
+
+    Args:
+        nUE (int): The number of subscribers (User Equipments) to generate.
+        start (int): The number of the first UE.
+        allocator (Allocator): The allocator of the identifiers (default settings if None).
+
+    Yields:
+        dict: The subscriber profile of every UE.
+    """
+    allocator = allocator or Allocator()
+    for i in range(start, start + nUE):
+        yield generate_subscriber(i, allocator)
+
+def write_subscribers(profiles, path, fmt="compact"):
+    """
+    Writes the subscriber profiles to a file while passing them through.
+
+    The profiles are written one at a time as they are consumed, so that the file is a side output of
+    the provisioning: "compact" writes the same structure as `generate_json` on a single line, "jsonl"
+    writes one profile per line (JSON lines).
+
+    Args:
+        profiles (iterable): The subscriber profiles.
+        path (str): Path of the file.
+        fmt (str): "compact" or "jsonl".
+
+    Returns:
+        generator: The same profiles, written to the file as they are yielded.
+    """
+    if fmt not in ("compact", "jsonl"):
+        raise ValueError(f"Unknown subscribers file format: {fmt}")
+    return _write_subscribers(profiles, path, fmt)
+
+def _write_subscribers(profiles, path, fmt):
+    with open(path, 'w', encoding='utf8') as f:
+        if fmt == "compact":
+            f.write('{"subscribers": [')
+
+        for n, profile in enumerate(profiles):
+            if fmt == "jsonl":
+                f.write(json.dumps(profile, ensure_ascii=False) + "\n")
+            else:
+                f.write(("," if n else "") + json.dumps(profile, ensure_ascii=False, separators=(",", ":")))
+            yield profile
+
+        if fmt == "compact":
+            f.write("]}\n")
 
 def generate_json(nUE):
     """
@@ -15,91 +167,11 @@ def generate_json(nUE):
         dict: The generated JSON data as a Python dictionary.
     """
     
-    # Initialize the data structure with an empty subscribers list
+    # Create the subscriber data of the UEs
     data = {
-        "subscribers": []
+        "subscribers": list(generate_subscribers(nUE))
     }
 
-    # Loop through the number of UEs (nUE) and create subscriber data
-    for i in range(1, nUE + 1):
-        # Define each subscriber's data
-        subscriber = {
-            "imsi": f"0010112345678{i:02d}",  # Unique IMSI for each subscriber
-            "subscribed_rau_tau_timer": 12,
-            "network_access_mode": 0,
-            "subscriber_status": 0,
-            "access_restriction_data": 32,
-            "slice": [
-                {
-                    "sst": 1,  # Slice Selection Type
-                    "default_indicator": True,
-                    "sd": "000001",
-                    "session": [
-                        {
-                            "name": "internet",
-                            "type": 3,
-                            "pcc_rule": [],
-                            "ambr": {
-                                "Comment": "unit=2 ==> Mbps",
-                                "uplink": {"value": 5 * i, "unit": 2},
-                                "downlink": {"value": 5 * i, "unit": 2}
-                            },
-                            "qos": {
-                                "index": 8,
-                                "arp": {
-                                    "priority_level": 15,
-                                    "pre_emption_capability": 1,
-                                    "pre_emption_vulnerability": 1
-                                }
-                            }
-                        }
-                    ]
-                },
-                {
-                    "sst": 2,
-                    "default_indicator": None,
-                    "sd": "000001",
-                    "session": [
-                        {
-                            "name": "mec",
-                            "type": 3,
-                            "pcc_rule": [],
-                            "ambr": {
-                                "Comment": "unit=2 ==> Mbps",
-                                "uplink": {"value": 40 + 10 * i, "unit": 2},
-                                "downlink": {"value": 40 + 10 * i, "unit": 2}
-                            },
-                            "qos": {
-                                "index": 8,
-                                "arp": {
-                                    "priority_level": 15,
-                                    "pre_emption_capability": 1,
-                                    "pre_emption_vulnerability": 1
-                                }
-                            }
-                        }
-                    ]
-                }
-            ],
-            "ambr": {
-                "Comment": "unit=2 ==> Mbps",
-                "uplink": {"value": 1, "unit": 2},
-                "downlink": {"value": 1, "unit": 2}
-            },
-            "security": {
-                "k": "8baf473f2f8fd09487cccbd7097c6862",
-                "amf": "8000",
-                "op": "11111111111111111111111111111111",
-                "opc": None
-            },
-            "msisdn": [],
-            "schema_version": 1,
-            "__v": 0
-        }
-
-        # Add the subscriber to the list
-        data["subscribers"].append(subscriber)
-
     # Write the generated data to a JSON file
     with open('./python_modules/subscribers.json', 'w', encoding='utf8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
@@ -2,4 +2,4 @@
 ./clean.sh log
 clear
 sleep 1
-sudo python3 multiUE-gNB.py $1
+sudo python3 multiUE-gNB.py "$@"
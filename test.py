@@ -1,12 +1,52 @@
 from python_modules.Open5GS import Open5GS
-import math
-import subprocess
+from pymongo.errors import PyMongoError
+import python_modules.ue_configuration as ue_configuration
+import python_modules.iperf3 as iperf3
+import python_modules.capture as capture
+from python_modules.runner import read_lines, stop_process, wait_for_text
+from python_modules.docker_api import create_runner
+from python_modules.agent import AgentRunner
+from python_modules.allocator import Allocator
+import python_modules.allocator as allocation
+from python_modules.attach import AttachTracker, containers_of, percentile
 import re
-import time
+import asyncio
 import argparse
+import json
+import sys
 import textwrap
 import os
 from prettytable import PrettyTable
+from functools import partial
+
+
+# Default timeout of a command executed in a container (seconds)
+COMMAND_TIMEOUT = 60
+# Echo requests sent by the routing test and the interval between them (seconds)
+ROUTING_PING_COUNT = 8
+ROUTING_PING_INTERVAL = 0.2
+# Seconds to wait for tcpdump to start capturing, and maximum duration of a capture
+TCPDUMP_READY_TIMEOUT = 5
+TCPDUMP_TIMEOUT = 10
+# Bytes captured per packet: the headers are enough to check the routing
+TCPDUMP_SNAPLEN = 128
+# Port of the iperf3 server of the bandwidth test
+IPERF3_PORT = 5201
+# First port used by the iperf3 servers of the load test (the UPFs already run a server on 5201)
+IPERF3_LOAD_PORT = 5301
+# Sessions of a UE (as in the UE configuration) by interface when the UE has its own container, 
+# and by PDU session ID when it shares its container (packed mode)
+SESSION_INTERFACES = {"uesimtun0": "internet", "uesimtun1": "mec"}
+PDU_SESSIONS = {1: "internet", 2: "mec"}
+# Folders of the logs written by the init scripts and of the UE configurations (read by the attach tracker)
+LOG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
+CONFIG_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ueransim", "config")
+# Client of the echo services of the MEC server, run on the host in the network namespace of the UEs
+ECHO_CLIENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mec_server", "echo_client.py")
+# Messages sent by every echo test, interval between them and seconds to wait for the last replies
+ECHO_COUNT = 20
+ECHO_INTERVAL = 0.05
+ECHO_TIMEOUT = 2
 
 
 class Network:
@@ -35,6 +75,18 @@ class Network:
     def get_component_list(self):
         return self.ue_list + self.gnb_list + [self.upf_mec] + [self.upf_cld] + [self.cp] + [self.mec_server]
 
+    def session_upf(self, session):
+        """
+        Returns the UPF anchoring a session of the UEs.
+
+        Args:
+            session (str): Name of the session ("internet" or "mec").
+
+        Returns:
+            Component: The UPF Cloud for "internet", the UPF MEC for "mec".
+        """
+        return self.upf_mec if session == "mec" else self.upf_cld
+
     def __str__(self):
         """Returns a formatted string representation of the network configuration.
 
@@ -153,13 +205,64 @@ class Component:
         """
         return f"Component: {self.name}, Ip: {self.ip}, Interfaces: {len(self.interfaces)}"
 
-def get_network_components(nUE, ngNB):
+
+class UE(Component):
+    """
+    Represents a User Equipment, hosted alone or with other UEs (packed mode) in a container.
+
+    The interfaces of a UE are its uesimtun interfaces: the commands of the tests are executed in its 
+    container, bound to the interface of the session under test.
+    """
+
+    def __init__(self, number, container, gnb):
+        """
+        Initializes a UE object.
+
+        Args:
+            number (int): Number of the UE (the number of its subscriber), the UE is named "ue<number>".
+            container (str): Name of the Docker container hosting the UE.
+            gnb (str): Name of the gNB serving the UE.
+        """
+        super().__init__(f"ue{number}")
+        self.number = number
+        self.container = container
+        self.gnb = gnb
+        self.sessions = {}  # Interface of every established session, by session name
+
+    def add_session(self, session, interface_name, interface_ip):
+        """
+        Adds the interface of a PDU session of the UE.
+
+        Args:
+            session (str): Name of the session ("internet" or "mec").
+            interface_name (str): Name of the uesimtun interface.
+            interface_ip (str): IP address of the interface.
+        """
+        self.interfaces[interface_name] = interface_ip
+        self.sessions[session] = interface_name
+
+    def __str__(self):
+        """
+        Returns a string representation of the UE object.
+
+        Returns:
+            str: A summary of the UE's name, container, gNB and the number of interfaces.
+        """
+        return f"UE: {self.name}, Container: {self.container}, gNB: {self.gnb}, Ip: {self.ip}, Interfaces: {len(self.interfaces)}"
+
+async def get_network_components(runner, nUE, allocator):
     """
     Creates and initializes network components, including UEs, gNBs, UPFs, CP, and MEC server.
 
+    Every container is inspected with a single discovery call (see `get_addresses`) and all the
+    containers are queried at the same time, so the discovery time is bounded by the slowest
+    container instead of growing with the total number of interfaces. In packed mode the uesimtun 
+    interfaces of a container are mapped to its UEs with the log of nr-ue (see `get_pdu_sessions`).
+
     Args:
+        runner (Runner): Runner executing the commands in the containers.
         nUE (int): Number of User Equipment (UE) components to create.
-        ngNB (int): Number of gNodeB (gNB) components to create.
+        allocator (Allocator): The allocator of the network, giving the UE containers and the gNBs.
 
     Returns:
         tuple: A tuple containing:
@@ -170,422 +273,956 @@ def get_network_components(nUE, ngNB):
             - cp (Component): Control Plane component.
             - mec_server (Component): MEC Server component.
     """
-    
+
+    ngNB = allocator.gnb_count(nUE)
+    nContainers = allocator.container_count(nUE)
+
+    ue_names = [allocator.container_name(k) for k in range(1, nContainers + 1)]
+    gnb_names = [f"gnb{i+1}" for i in range(ngNB)]
+    names = ue_names + gnb_names + ["upf_mec", "upf_cld", "cp", "mec_server"]
+
+    # Query all the containers concurrently, one discovery call each (plus the PDU sessions when packed)
+    components, sessions = await asyncio.gather(
+        asyncio.gather(*(build_component(runner, name) for name in names)),
+        asyncio.gather(*(get_pdu_sessions(runner, name) for name in ue_names if allocator.packed)),
+    )
+
     ue_list = []
-    for i in range(nUE):
-        ue = Component(name=f"ue{i+1}")
-        interfaces = get_interface(f"ue{i+1}")
-        
-        # Add all interfaces except "lo" (loopback) and "eth0" (default interface)
-        for interface in interfaces:
-            if interface not in {"lo", "eth0"}:
-                ip = get_ip(f"ue{i+1}", interface)
-                ue.add_interface(interface, ip)
-        
-        ue_list.append(ue)
+    for k, container in enumerate(components[:nContainers], start=1):
+        ue_list += build_ues(container, allocator.container_ues(k, nUE), allocator, ngNB,
+                             sessions[k - 1] if allocator.packed else None)
 
-    gnb_list = []
-    for i in range(ngNB):
-        gnb = Component(name=f"gnb{i+1}")
-        interfaces = get_interface(f"gnb{i+1}")
-        
-        for interface in interfaces:
-            if interface not in {"lo", "eth0"}:
-                ip = get_ip(f"gnb{i+1}", interface)
-                gnb.add_interface(interface, ip)
-        
-        gnb_list.append(gnb)
+    gnb_list = components[nContainers:nContainers + ngNB]
+    upf_mec, upf_cld, cp, mec_server = components[nContainers + ngNB:]
 
-    # Initialize UPF MEC component
-    upf_mec = Component(name="upf_mec")
-    interfaces = get_interface("upf_mec")
-    for interface in interfaces:
-        if interface not in {"lo", "eth0"}:
-            ip = get_ip("upf_mec", interface)
-            upf_mec.add_interface(interface, ip)
+    return ue_list, gnb_list, upf_mec, upf_cld, cp, mec_server
 
-    # Initialize UPF Cloud component
-    upf_cld = Component(name="upf_cld")
-    interfaces = get_interface("upf_cld")
-    for interface in interfaces:
-        if interface not in {"lo", "eth0"}:
-            ip = get_ip("upf_cld", interface)
-            upf_cld.add_interface(interface, ip)
+def build_ues(container, numbers, allocator, ngNB, sessions=None):
+    """
+    Creates the UEs hosted by a UE container.
 
-    # Initialize Control Plane (CP) component
-    cp = Component(name="cp")
-    interfaces = get_interface("cp")
-    for interface in interfaces:
-        if interface not in {"lo", "eth0"}:
-            ip = get_ip("cp", interface)
-            cp.add_interface(interface, ip)
+    Args:
+        container (Component): The UE container, with its interfaces.
+        numbers (range): The numbers of the UEs hosted by the container.
+        allocator (Allocator): The allocator of the network.
+        ngNB (int): Number of gNodeBs.
+        sessions (list): The PDU sessions of the container, as returned by `get_pdu_sessions` (packed mode), 
+                         None if the container hosts a single UE.
 
-    # Initialize MEC Server component
-    mec_server = Component(name="mec_server")
-    interfaces = get_interface("mec_server")
-    for interface in interfaces:
+    Returns:
+        list: The UEs, with the uesimtun interfaces of their sessions.
+    """
+
+    ues = {i: UE(i, container.name, f"gnb{allocator.ue_gnb(i, ngNB)}") for i in numbers}
+    for ue in ues.values():
+        ue.ip = container.ip
+
+    if sessions is None:
+        # A single UE: its sessions are on the first interfaces
+        ue = ues[numbers[0]]
+        for interface, session in SESSION_INTERFACES.items():
+            if container.interfaces.get(interface):
+                ue.add_session(session, interface, container.interfaces[interface])
+        return list(ues.values())
+
+    for offset, psi, interface, ip in sessions:
+        i = numbers[0] + offset
+        session = PDU_SESSIONS.get(psi)
+        # Skip the sessions of another run (e.g. an old log) whose interface no longer has this address
+        if i in ues and session and container.interfaces.get(interface) == ip:
+            ues[i].add_session(session, interface, ip)
+
+    return list(ues.values())
+
+async def get_pdu_sessions(runner, name):
+    """
+    Retrieves the PDU sessions of the UEs of a packed container, from the log of its nr-ue process.
+
+    nr-ue prefixes the log lines of every UE with its IMSI when it runs several UEs, and logs the uesimtun
+    interface created for every PDU session. The IMSI of the first UE is read from the configuration 
+    of the container, so the UEs are numbered without knowing the settings of the allocator.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        name (str): Name of the Docker container (also the name of its configuration and log files).
+
+    Returns:
+        list: The sessions as (offset of the UE in the container, PDU session ID, interface, IP address) tuples.
+    """
+
+    result = await runner.run(name, "grep", "-h", "-e", "^supi:", "-e", "TUN interface\\[",
+                              f"/mnt/ueransim/open5gs_{name}.yaml", f"/mnt/log/{name}.log")
+
+    # grep exits with 1 when nothing matches (e.g. no UE attached yet)
+    if result.returncode not in (0, 1):
+        print(f"Unable to read the PDU sessions of container '{name}': {result} {result.stderr.strip()}")
+        return []
+
+    return parse_pdu_sessions(result.stdout)
+
+def parse_pdu_sessions(output):
+    """
+    Extracts the PDU sessions from the configuration and the log of a packed UE container.
+
+    Args:
+        output (str): The "supi:" line of the configuration followed by the log lines of the TUN interfaces, e.g.
+                      "[...] [imsi-001011234567802|app] [info] Connection setup for PDU session[1] is successful, 
+                      TUN interface[uesimtun2, 10.45.0.3] is up."
+
+    Returns:
+        list: The sessions as (offset of the UE in the container, PDU session ID, interface, IP address) tuples.
+    """
+
+    match = re.search(r"^supi: 'imsi-(\d+)'", output, re.MULTILINE)
+    if not match:
+        return []
+    first = int(match.group(1))
+
+    sessions = []
+    for match in re.finditer(r"\[imsi-(\d+)\|app\].*PDU session\[(\d+)\].*TUN interface\[(\w+), ([\d.]+)\]", output):
+        sessions.append((int(match.group(1)) - first, int(match.group(2)), match.group(3), match.group(4)))
+
+    return sessions
+
+async def build_component(runner, name):
+    """
+    Creates a Component for a Docker container and fills it with the container's interfaces.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        name (str): Name of the Docker container.
+
+    Returns:
+        Component: The component with all its interfaces except "lo" (loopback) and "eth0" (default interface).
+    """
+
+    component = Component(name=name)
+
+    for interface, ip in (await get_addresses(runner, name)).items():
         if interface not in {"lo", "eth0"}:
-            ip = get_ip("mec_server", interface)
-            mec_server.add_interface(interface, ip)
+            component.add_interface(interface, ip)
 
-    return ue_list, gnb_list, upf_mec, upf_cld, cp, mec_server
+    return component
+
+async def start_tcpdump(runner, container, interface, capture_filter=None, count=None, timeout=TCPDUMP_TIMEOUT):
+    """
+    Starts tcpdump in the background and waits until it is actually capturing.
 
-def start_tcpdump(upf, interface):
-    """Starts tcpdump in the background and prints the output in real-time."""
+    The capture filter is compiled into a BPF expression, so the packets are filtered in the kernel 
+    and only the relevant ones go through the pipe, even when the data plane is loaded.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        container (str): Name of the Docker container.
+        interface (str): Interface to capture on.
+        capture_filter (CaptureFilter): Packets to capture, all the packets are captured if None.
+        count (int): Number of packets after which tcpdump exits, it runs until the timeout if None.
+        timeout (int): Maximum number of seconds tcpdump runs inside the container.
+
+    Returns:
+        asyncio.subprocess.Process or None: The tcpdump process, or None if it did not start listening.
+    """
     
-    # If the interface contains "s1", set a timeout of 4 seconds
-    if "s1" in interface:
-        cmd = f"docker exec {upf} timeout 4 tcpdump -i {interface} -n -l"
-    else:
-        # Otherwise, set a timeout of 12 seconds
-        cmd = f"docker exec {upf} timeout 12 tcpdump -i {interface} -n -l"
+    # The timeout is only a safety net: tcpdump exits as soon as it has captured `count` packets
+    command = ["timeout", str(timeout), "tcpdump", "-i", interface, "-n", "-l", "-s", str(TCPDUMP_SNAPLEN)]
+    if count:
+        command += ["-c", str(count)]
+    if capture_filter and capture_filter.expression():
+        command.append(capture_filter.expression())
     
     # Execute the tcpdump command inside the Docker container
-    process = subprocess.Popen(
-        cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
-    )
+    process = await runner.spawn(container, *command)
     
-    return process
-
-def stop_tcpdump(process):
-    """Gracefully terminates the tcpdump process."""
-    
-    if process:
-        process.terminate()  # Attempt to terminate the process
-        
-        try:
-            process.wait(timeout=2)  # Wait up to 2 seconds for termination
-        except subprocess.TimeoutExpired:
-            process.kill()  # Force kill the process if it doesn't terminate in time
-
-def print_tcpdump_output(process, ue):
-    """Reads tcpdump output in real-time and prints it."""
+    # tcpdump reports "listening on <interface>" on stderr once the capture is running
+    ready, output = await wait_for_text(process.stderr, "listening on", TCPDUMP_READY_TIMEOUT)
+    if not ready:
+        print(f"tcpdump on {container}[{interface}] not ready: {output.strip()}")
+        await stop_process(process)
+        return None
     
-    try:
-        output = ""
-        for line in iter(process.stdout.readline, ''):
-            stripped_line = line.strip()  # Remove whitespace and newline characters
-            
-            if ue:
-                # Check if the specified IP (e.g., 192.168.0.140) is present in the line
-                if ue in stripped_line and "UDP" in stripped_line:
-                    print(stripped_line)  # Print only if the IP is found
-                    output += " " + stripped_line
-            else:
-                print(stripped_line)  # Print all lines if no UE filter is provided
-                output += " " + stripped_line
-            
-        return output
-                
-    except KeyboardInterrupt:
-        pass  # Handle interruption gracefully
+    return process
 
-def get_ip(name, interface):
+async def print_tcpdump_output(process):
     """
-    Retrieves the IPv4 address of a specified network interface within a Docker container.
+    Prints the tcpdump output in real-time until the capture ends.
 
     Args:
-        name (str): Name of the Docker container.
-        interface (str): Name of the network interface (e.g., "eth1").
+        process (asyncio.subprocess.Process): The tcpdump process returned by `start_tcpdump`.
 
     Returns:
-        str or None: The IPv4 address of the interface if found, otherwise None.
+        str: The captured lines followed by the final statistics of tcpdump ("N packets captured", ...).
     """
     
-    command = f"docker exec {name} ip addr show {interface}"
+    if not process:
+        return ""
     
-    try:
-        # Execute the command and capture the output
-        ifconfig_output = subprocess.check_output(command, shell=True, universal_newlines=True)
-        
-        # Search for an IPv4 address pattern
-        match = re.search(r"inet\s+(\d+\.\d+\.\d+\.\d+)", ifconfig_output)
-        
-        if match:
-            return match.group(1)
-        else:
-            print(f"IP address not found for interface '{interface}' in container '{name}'")
-            return None
+    lines = []
+    async for line in read_lines(process.stdout):
+        print(line)
+        lines.append(line)
+    
+    # The statistics are printed on stderr when tcpdump exits
+    lines.append((await process.stderr.read()).decode(errors="replace"))
+    await process.wait()
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e}")
-        return None
+    return "\n".join(lines)
 
-def get_interface(ue):
+async def get_addresses(runner, name):
     """
-    Retrieves the list of network interfaces available in a Docker container.
+    Retrieves all the network interfaces of a Docker container with their IPv4 addresses.
+
+    A single `ip -j addr` call is executed inside the container and its JSON output is parsed,
+    instead of listing /sys/class/net and then querying every interface on its own.
 
     Args:
-        ue (str): Name of the Docker container.
+        runner (Runner): Runner executing the commands in the containers.
+        name (str): Name of the Docker container.
 
     Returns:
-        list: A list of network interface names available in the container.
+        dict: Interface names mapped to their IPv4 address (None if the interface has no IPv4 address).
     """
-    
-    command = f"docker exec {ue} ls /sys/class/net"
-    
+
+    result = await runner.run(name, "ip", "-j", "addr")
+
+    if not result.ok:
+        print(f"Error executing command: {result} {result.stderr.strip()}")
+        return {}
+
     try:
-        # Execute the command and capture the output
-        ifconfig_output = subprocess.check_output(command, shell=True, universal_newlines=True)
-        
-        # Return the list of interfaces, removing any trailing whitespace
-        return ifconfig_output.strip().split("\n")
+        interfaces = json.loads(result.stdout)
+    except json.JSONDecodeError as e:
+        print(f"Unable to parse the interfaces of container '{name}': {e}")
+        return {}
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e}")
-        return []
+    addresses = {}
+    for interface in interfaces:
+        # Keep the first IPv4 address of the interface, if any
+        ip = None
+        for address in interface.get("addr_info", []):
+            if address.get("family") == "inet":
+                ip = address.get("local")
+                break
+
+        if ip is None:
+            print(f"IP address not found for interface '{interface['ifname']}' in container '{name}'")
 
-def ping_test(container, interface, destination):
+        addresses[interface["ifname"]] = ip
+
+    return addresses
+
+async def ping_test(runner, container, interface, destination, count=8, interval=None):
     """
     Performs a ping test from a specified network interface within a Docker container.
 
     Args:
+        runner (Runner): Runner executing the commands in the containers.
         container (str): Name of the Docker container.
         interface (str): Network interface to use for the ping test.
         destination (str): IP address or hostname to ping.
+        count (int): Number of echo requests to send.
+        interval (float): Seconds between two echo requests (ping default: 1 second).
 
     Returns:
-        str: The output of the ping command.
-
-    Raises:
-        subprocess.CalledProcessError: If the ping command fails.
+        str: The output of the ping command (stdout and stderr), also when the ping fails.
     """
     
-    command = f"docker exec {container} ping -c 8 -n -I {interface} {destination}"
+    command = ["ping", "-c", str(count), "-n", "-I", interface]
+    if interval:
+        command += ["-i", str(interval)]
+    command.append(destination)
     
-    try:
-        # Execute the ping command and capture the output
-        ping_output = subprocess.check_output(command, shell=True, universal_newlines=True)
-        return ping_output
+    # Execute the ping command and capture the output
+    result = await runner.run(container, *command)
+    
+    if not result.ok:
+        print(f"Ping test failed: {container}[{interface}] -> {destination} ({result})")
+    
+    return result.output
 
-    except subprocess.CalledProcessError as e:
-        print(f"Ping test failed: {e}")
-        return None
+def parse_ping_output(ping_output):
+    """
+    Extracts the packet counters and the RTT statistics from the output of ping.
+
+    Args:
+        ping_output (str): The output of the ping command.
+
+    Returns:
+        dict: The keys "transmitted", "received", "loss" (%), "min", "avg", "max" and "mdev" (ms). 
+              A value is None when it is not present in the output.
+    """
+
+    stats = dict.fromkeys(["transmitted", "received", "loss", "min", "avg", "max", "mdev"])
+
+    match = re.search(r"(\d+) packets transmitted, (\d+) received.*?([\d.]+)% packet loss", ping_output)
+    if match:
+        stats["transmitted"] = int(match.group(1))
+        stats["received"] = int(match.group(2))
+        stats["loss"] = float(match.group(3))
+
+    # e.g. "rtt min/avg/max/mdev = 1.020/1.234/1.567/0.101 ms" (missing if no reply was received)
+    match = re.search(r"= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms", ping_output)
+    if match:
+        stats["min"], stats["avg"], stats["max"], stats["mdev"] = (float(value) for value in match.groups())
+
+    return stats
 
-def latency(network):
+async def latency(runner, network):
     """
     Tests the latency between User Equipment (UE) and network components (UPF Cloud, UPF MEC).
     
-    Iterates through all UEs in the network and pings the respective network components 
-    based on the interface type ('uesimtun0' or 'uesimtun1').
+    The destination of each UE interface depends on its session (the 'internet' session pings the 
+    UPF Cloud, the 'mec' session pings the UPF MEC). All the UE/slice pairs are pinged at the same time 
+    (up to the concurrency of the runner), so the test takes roughly as long as a single ping 
+    instead of growing with the number of UEs.
     
     Args:
+        runner (Runner): Runner executing the commands in the containers.
         network (Network): The network object containing UEs, UPF Cloud, and UPF MEC components.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
     """
 
-    results = []
-    # Loop through all UEs in the network
+    # Collect all the (UE, interface, destination) pairs to test
+    tests = []
     for ue in network.ue_list:
-        print(f"Test latency for {ue.name}")
-        
-        for interface in ue.interfaces:
-            if interface == "uesimtun0":
-                destination = network.upf_cld
-            elif interface == "uesimtun1":
-                destination = network.upf_mec
-            else:
-                continue
+        for session, interface in ue.sessions.items():
+            tests.append((ue, interface, network.session_upf(session)))
 
-            print(f"-    interface: {interface}")
-            print(f"-    {destination.name}")
-            # Perform the ping test and print the result
-            ping_output = ping_test(ue.name, interface, destination.ip)
-            result = ""
-            if not ping_output:
-                result = "Error"
-            elif "SO_BINDTODEVICE" in ping_output:
-                result = "Not Found"
-            else:
-                match = re.search(r"(\d+) packets transmitted, (\d+) received", ping_output)
-                if match:
-                    transmitted = int(match.group(1))
-                    received = int(match.group(2))
-                    result = f"{received}/{transmitted}"
-                else: 
-                    result = "Error"
-
-            results.append((f"{ue.name}[{interface}]", destination.name, result))
-            
-            print(ping_output)
+    if not tests:
+        print("No UE interface to test")
+        return []
+
+    async def run_test(ue, interface, destination):
+        ping_output = await ping_test(runner, ue.container, interface, destination.ip)
+        # Print every output as soon as its ping completes
+        print(f"Test latency for {ue.name}[{interface}] -> {destination.name}")
+        print(ping_output)
+        return ping_output
+
+    # Run all the ping tests concurrently
+    outputs = await asyncio.gather(*(run_test(*test) for test in tests))
 
-    field_names = ["From", "To", "Result"] 
-    print_table(field_names, results, True)
+    results = []
+    for (ue, interface, destination), ping_output in zip(tests, outputs):
+        stats = parse_ping_output(ping_output) if ping_output else None
+
+        if not ping_output:
+            result = "Error"
+        elif "SO_BINDTODEVICE" in ping_output:
+            result = "Not Found"
+        elif stats["transmitted"] is None:
+            result = "Error"
+        else:
+            result = f"{stats['received']}/{stats['transmitted']}"
+
+        if stats and stats["transmitted"] is not None:
+            rtt = [stats["loss"]] + ["-" if stats[key] is None else stats[key] for key in ("min", "avg", "max", "mdev")]
+        else:
+            rtt = ["-"] * 5
+
+        results.append((f"{ue.name}[{interface}]", destination.name, result, *rtt))
+
+    field_names = ["From", "To", "Result", "Loss (%)", "Min (ms)", "Avg (ms)", "Max (ms)", "Mdev (ms)"] 
+    return [(field_names, results)]
 
-def bandwidth(network):
+async def bandwidth(runner, network, duration=5, udp=False, bitrate=None):
     """
     Measures the available bandwidth between User Equipment (UE) and UPF components (MEC, Cloud).
 
     This function starts an iperf3 server on each UPF component (MEC and Cloud), then iterates over 
-    the UEs to perform bandwidth tests using iperf3 between the UEs and the UPFs.
+    the UEs to perform bandwidth tests using iperf3 between the UEs and the UPFs. The JSON output of 
+    iperf3 is parsed, so the results are correct whatever the order of magnitude of the throughput.
 
     Args:
+        runner (Runner): Runner executing the commands in the containers.
         network (Network): The network object containing UEs, UPF Cloud, and UPF MEC components.
+        duration (int): Duration of every test in seconds.
+        udp (bool): If True run UDP tests (reporting jitter and loss) instead of TCP tests.
+        bitrate (str): Target bitrate of the tests (e.g. "10M"), iperf3 uses 1 Mbits/sec for UDP by default.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
     """
     
     results = []
 
     # Iterate over the UPF components (MEC and Cloud)
-    for upf in [network.upf_mec, network.upf_cld]:
+    for session in ["mec", "internet"]:
+        upf = network.session_upf(session)
        
         # Starting the iperf3 server on the current UPF component
         print(f"Starting server {upf.name}")
         
         # Kill any existing iperf3 server process (if any)
-        command = f"docker exec {upf.name} pkill -2 -f iperf3"
-        subprocess.run(command, shell=True, universal_newlines=True)
+        await runner.run(upf.name, "pkill", "-2", "-f", "iperf3")
         
         # Start the iperf3 server
-        command = f"docker exec {upf.name} iperf3 -s"
-        subprocess.Popen(command, shell=True, universal_newlines=True, 
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        server = await start_iperf3_server(runner, upf.name, IPERF3_PORT, one_off=False)
 
         # Iterate over the list of UEs to run bandwidth tests
         print("Iterating over the list of UE")
 
         for ue in network.ue_list:
-            interface_ip = None
-            interface = None
-
-            # Find the IP address for the appropriate UE interface
-            if upf.name == "upf_mec":
-                interface = "uesimtun1"
-            elif upf.name == "upf_cld":
-                interface = "uesimtun0"
-                    
-            interface_ip = ue.interfaces[interface]
-            # Skip if no interface IP is found for the current UE
-            if not interface_ip:
+            # Find the UE interface of the session anchored by the UPF
+            interface = ue.sessions.get(session)
+            # Skip if the session is not established for the current UE
+            if not interface:
                 continue
+            interface_ip = ue.interfaces[interface]
             
             print(f"## {ue.name}[{interface}] ##")
             # Run the iperf3 bandwidth test from the UE to the UPF
-            command = ["docker", "exec", ue.name, "iperf3", "-c", upf.ip, "-B", interface_ip, "-t", "5"]
-            result = subprocess.run(command, capture_output=True, text=True)
-
-            # Process and print the result of the bandwidth test
-            final_result = []
-            lines = reversed(result.stdout.splitlines())
-            for line in lines:
-                final_result.append(line + "\n")
-                if line.startswith("[ ID]"):
-                    break
-
-            result = "".join(reversed(final_result))
+            command = iperf3.client_command(upf.ip, bind=interface_ip, duration=duration, udp=udp, bitrate=bitrate)
+            output = await runner.run(ue.container, *command, timeout=duration + COMMAND_TIMEOUT)
+            result = iperf3.parse_json(output.stdout)
             print(result)
 
-            # Regular expression to match the bitrate (Mbits/sec)
-            bitrate_pattern = r'(\d+\.\d+) Mbits/sec'
-            # Find all matches
-            bitrate_matches = re.findall(bitrate_pattern, result)
-
-            results.append((upf.name, ue.name, *bitrate_matches))
-
+            # CPU of the client and of the server host, either one may be missing from the JSON output
+            cpu = "/".join("-" if value is None else f"{value:.1f}" for value in (result.cpu_local, result.cpu_remote))
+            if result.error:
+                # Same number of columns as the headers, otherwise the row is not printed
+                row = (upf.name, ue.name, "Error", "Error") + ("-",) * (3 if udp else 2)
+            elif udp:
+                row = (upf.name, ue.name, iperf3.to_mbps(result.sent_bps), iperf3.to_mbps(result.received_bps),
+                       result.jitter_ms, result.lost_percent, cpu)
+            else:
+                row = (upf.name, ue.name, iperf3.to_mbps(result.sent_bps), iperf3.to_mbps(result.received_bps),
+                       result.retransmits, cpu)
+            results.append(row)
 
         # Stop the iperf3 server after the tests
         print("Stopping the server")
-        command = f"docker exec {upf.name} pkill -2 -f iperf3"
-        subprocess.run(command, shell=True, universal_newlines=True)
+        await stop_process(server)
+        await runner.run(upf.name, "pkill", "-2", "-f", "iperf3")
     
-    field_names = ["Server", "Host", "H->S (Mbits/sec)", "S->H (Mbits/sec)"]
-    print_table(field_names, results, True)
+    if udp:
+        field_names = ["Server", "Host", "Sent (Mbits/sec)", "Received (Mbits/sec)", "Jitter (ms)", "Loss (%)", "CPU H/S (%)"]
+    else:
+        field_names = ["Server", "Host", "Sent (Mbits/sec)", "Received (Mbits/sec)", "Retransmits", "CPU H/S (%)"]
+    return [(field_names, results)]
+
+async def start_iperf3_server(runner, upf, port, one_off=True, timeout=5):
+    """
+    Starts an iperf3 server inside a UPF container.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        upf (str): Name of the UPF container.
+        port (int): Port the server listens on.
+        one_off (bool): If True the server exits after serving one test.
+        timeout (float): Maximum number of seconds to wait for the server to be listening.
+
+    Returns:
+        asyncio.subprocess.Process or None: The server process, or None if it did not start listening in time.
+    """
+
+    # stdbuf forces iperf3 to flush its banner, so the readiness can be detected on the pipe
+    command = ["stdbuf", "-oL", "iperf3", "-s", "-p", str(port)]
+    if one_off:
+        command.append("-1")
+    process = await runner.spawn(upf, *command)
+
+    ready, output = await wait_for_text(process.stdout, "Server listening", timeout)
+    if not ready:
+        print(f"iperf3 server {upf}:{port} not ready: {output.strip()}")
+        await stop_process(process)
+        return None
+
+    return process
+
+def get_ambr(ue_name, session, direction):
+    """
+    Returns the AMBR (Aggregate Maximum Bit Rate) configured for a session of a UE, as generated 
+    by `ue_configuration.generate_subscriber`.
+
+    Args:
+        ue_name (str): Name of the UE (e.g. "ue3").
+        session (str): Name of the session ("internet" or "mec").
+        direction (str): "uplink" or "downlink".
+
+    Returns:
+        float or None: The AMBR in Mbits/sec, or None if the session is not found.
+    """
+
+    match = re.search(r"(\d+)", ue_name)
+    if not match:
+        return None
+
+    subscriber = ue_configuration.generate_subscriber(int(match.group(1)))
+    for subscriber_slice in subscriber["slice"]:
+        for subscriber_session in subscriber_slice["session"]:
+            if subscriber_session["name"] == session:
+                ambr = subscriber_session["ambr"][direction]
+                # Open5GS units: 0=bps, 1=Kbps, 2=Mbps, 3=Gbps, 4=Tbps
+                return ambr["value"] * 1000 ** (ambr["unit"] - 2)
 
-def routing(network):
+    return None
+
+def jain_index(values):
+    """
+    Computes the Jain's fairness index of a list of values (1 = perfectly fair, 1/n = one takes all).
+
+    Args:
+        values (list): The values to compare (e.g. throughput normalized by the AMBR).
+
+    Returns:
+        float or None: The fairness index, or None if it cannot be computed.
+    """
+
+    squares = sum(value ** 2 for value in values)
+    if not values or squares == 0:
+        return None
+
+    return sum(values) ** 2 / (len(values) * squares)
+
+async def load(runner, network, duration=10, udp=False, bitrate=None):
+    """
+    Saturates the UPF MEC and the UPF Cloud with the traffic of every UE at the same time.
+
+    One one-off iperf3 server per UE, slice and direction is started on the UPF (each on its own port), 
+    then all the clients are started at the same moment: uplink (UE -> UPF) and downlink (UPF -> UE, 
+    iperf3 reverse mode) run in parallel. The per-UE throughput is compared with the AMBR of the 
+    subscriber session, and the aggregate throughput and the Jain's fairness index are reported per UPF.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        network (Network): The network object containing UEs, UPF Cloud, and UPF MEC components.
+        duration (int): Duration of the test in seconds.
+        udp (bool): If True run UDP tests instead of TCP tests.
+        bitrate (str): Target bitrate of every client (e.g. "10M").
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
+    """
+
+    # Build the list of tests, every test with its own server port on the UPF
+    tests = []
+    ports = {upf.name: IPERF3_LOAD_PORT for upf in (network.upf_cld, network.upf_mec)}
+    for ue in network.ue_list:
+        for session, interface in ue.sessions.items():
+            upf = network.session_upf(session)
+
+            for direction in ("uplink", "downlink"):
+                tests.append({
+                    "ue": ue, "interface": interface, "upf": upf, "session": session,
+                    "direction": direction, "port": ports[upf.name],
+                })
+                ports[upf.name] += 1
+
+    if not tests:
+        print("No UE interface to test")
+        return []
+
+    # Start all the servers
+    print(f"Starting {len(tests)} iperf3 servers")
+    servers = await asyncio.gather(*(start_iperf3_server(runner, test["upf"].name, test["port"]) for test in tests))
+
+    # All the clients wait for the start event, so that they start at the same moment
+    start = asyncio.Event()
+
+    async def run_client(test):
+        command = iperf3.client_command(
+            test["upf"].ip, port=test["port"], bind=test["ue"].interfaces[test["interface"]], duration=duration,
+            reverse=test["direction"] == "downlink", udp=udp, bitrate=bitrate)
+
+        await start.wait()
+        output = await runner.run(test["ue"].container, *command, timeout=duration + COMMAND_TIMEOUT)
+        return iperf3.parse_json(output.stdout)
+
+    print(f"Running {len(tests)} iperf3 clients for {duration} seconds")
+    clients = [asyncio.ensure_future(run_client(test)) for test in tests]
+    await asyncio.sleep(0)  # Let every client reach the start line
+    start.set()
+    test_results = await asyncio.gather(*clients)
+
+    # Stop the servers that are still running (e.g. if their client failed): stopping the exec does not kill
+    # the server in the container, so every server is also killed by its own command line
+    await asyncio.gather(*(stop_process(server) for server in servers))
+    await asyncio.gather(*(runner.run(test["upf"].name, "pkill", "-2", "-f", f"iperf3 -s -p {test['port']} -1")
+                           for test in tests))
+
+    results = []
+    totals = {}
+    for test, result in zip(tests, test_results):
+        if result.error:
+            print(f"{test['ue'].name}[{test['interface']}] {test['direction']}: {result}")
+
+        # Throughput measured by the receiver
+        received = iperf3.to_mbps(result.received_bps)
+        ambr = get_ambr(test["ue"].name, test["session"], test["direction"])
+
+        share = None
+        if received is not None and ambr:
+            share = received / ambr
+            totals.setdefault((test["upf"].name, test["direction"]), []).append((received, share))
+
+        results.append((
+            test["upf"].name, f"{test['ue'].name}[{test['interface']}]", test["direction"],
+            "Error" if received is None else received,
+            "-" if ambr is None else ambr,
+            "-" if share is None else f"{share * 100:.1f}",
+        ))
+
+    tables = [(["Server", "Host", "Direction", "Mbits/sec", "AMBR (Mbits/sec)", "% of AMBR"], results)]
+
+    aggregates = []
+    for (upf, direction), values in sorted(totals.items()):
+        fairness = jain_index([share for _, share in values])
+        aggregates.append((
+            upf, direction, len(values), f"{sum(received for received, _ in values):.2f}",
+            "-" if fairness is None else f"{fairness:.3f}",
+        ))
+
+    tables.append((["Server", "Direction", "UEs", "Aggregate (Mbits/sec)", "Fairness (Jain)"], aggregates))
+    return tables
+
+async def echo_test(runner, ue, session, server, protocol="udp", count=ECHO_COUNT):
+    """
+    Measures the application-level latency from a session of a UE to the echo service of the MEC server.
+
+    The client runs on the host in the network namespace of the UE container (the UE images have no Python),
+    bound to the uesimtun interface of the session.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        ue (UE): The UE.
+        session (str): Name of the session ("internet" or "mec").
+        server (Component): The MEC server.
+        protocol (str): "udp" or "tcp".
+        count (int): Number of echo messages.
+
+    Returns:
+        dict or None: The results of the client (see `EchoSamples.result`), None if the test failed.
+    """
+    interface = ue.sessions[session]
+    result = await runner.run_in_network(
+        ue.container, sys.executable, ECHO_CLIENT, server.ip, "--protocol", protocol,
+        "--interface", interface, "--address", ue.interfaces[interface],
+        "--count", str(count), "--interval", str(ECHO_INTERVAL), "--timeout", str(ECHO_TIMEOUT),
+        timeout=count * ECHO_INTERVAL + ECHO_TIMEOUT + 10)
+
+    try:
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        output = {"error": result.stderr.strip() or str(result)}
+
+    if "error" in output:
+        print(f"Echo test failed for {ue.name}[{interface}]: {output['error']}")
+        return None
+    return output
+
+def format_percentiles(samples, percentiles=(50, 95, 99)):
+    """
+    Formats percentiles of latency samples for the tables.
+
+    Args:
+        samples (list): The samples in milliseconds.
+        percentiles (tuple): The percentiles to format.
+
+    Returns:
+        list: The percentiles in milliseconds ("-" without samples).
+    """
+    return ["-" if not samples else f"{percentile(samples, p):.2f}" for p in percentiles]
+
+async def echo(runner, network, protocol="udp", count=ECHO_COUNT):
+    """
+    Measures the application-level latency and loss from every UE to the MEC server, through both sessions.
+
+    The 'mec' session reaches the MEC server through the UPF MEC, the 'internet' session through the UPF
+    Cloud, so the two paths to the same server are compared. The server timestamps every message, so the
+    uplink and downlink latencies are measured separately from the round-trip time.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        network (Network): The network object containing all components.
+        protocol (str): "udp" or "tcp".
+        count (int): Number of echo messages of every test.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
+    """
+
+    tests = [(ue, session) for ue in network.ue_list for session in ue.sessions]
+    if not tests:
+        print("No UE interface to test")
+        return []
+
+    # Run all the tests concurrently
+    outputs = await asyncio.gather(*(echo_test(runner, ue, session, network.mec_server, protocol, count)
+                                     for ue, session in tests))
+
+    results = []
+    paths = {}  # Results of all the UEs, by UPF
+    for (ue, session), output in zip(tests, outputs):
+        upf = network.session_upf(session).name
+        if output is None:
+            results.append((f"{ue.name}[{ue.sessions[session]}]", upf, "Error", *["-"] * 8))
+            continue
+
+        path = paths.setdefault(upf, {"sent": 0, "received": 0, "rtt": [], "uplink": [], "downlink": []})
+        for key in path:
+            path[key] += output[key]
+
+        loss = 100 * (output["sent"] - output["received"]) / output["sent"]
+        results.append((f"{ue.name}[{ue.sessions[session]}]", upf, f"{output['received']}/{output['sent']}",
+                        f"{loss:.1f}", *format_percentiles(output["rtt"]),
+                        *format_percentiles(output["uplink"], (50, 95)),
+                        *format_percentiles(output["downlink"], (50, 95))))
+
+    field_names = ["From", "Through", "Replies", "Loss (%)", "RTT p50 (ms)", "RTT p95 (ms)", "RTT p99 (ms)",
+                   "Up p50 (ms)", "Up p95 (ms)", "Down p50 (ms)", "Down p95 (ms)"]
+
+    # Compare the paths over all the UEs
+    summary = []
+    for upf, path in sorted(paths.items()):
+        loss = 100 * (path["sent"] - path["received"]) / path["sent"] if path["sent"] else 0
+        summary.append((upf, protocol.upper(), path["received"], f"{loss:.1f}", *format_percentiles(path["rtt"]),
+                        *format_percentiles(path["uplink"], (50, 95)), *format_percentiles(path["downlink"], (50, 95))))
+
+    summary_names = ["Through", "Protocol", "Replies", "Loss (%)", "RTT p50 (ms)", "RTT p95 (ms)", "RTT p99 (ms)",
+                     "Up p50 (ms)", "Up p95 (ms)", "Down p50 (ms)", "Down p95 (ms)"]
+    return [(field_names, results), (summary_names, summary)]
+
+async def routing(runner, network):
     """
     Simulates and checks the routing path for User Equipment (UE) across different network components 
     including gNB, UPF Cloud, UPF MEC, and the MEC server. It also captures and analyzes network traffic 
     using tcpdump and performs ping tests for routing validation.
 
+    The captures are readiness-driven: the ping starts as soon as tcpdump is listening on the gNB and 
+    on the UPF, and every capture ends as soon as the packets generated by the ping have been seen.
+
     Args:
+        runner (Runner): Runner executing the commands in the containers.
         network (Network): The network object containing UEs, gNBs, UPFs, and the MEC server.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
     """
     
-    ngNB = len(network.gnb_list)  # Get the number of gNBs in the network
+    # Every echo request is captured together with its reply
+    expected = 2 * ROUTING_PING_COUNT
     
     results= [] 
 
     # Iterate through all User Equipment (UE) in the network
     for ue in network.ue_list:
-        match = re.search(r'(\d+)', ue.name)  # Extract the number from the UE's name
-        
-        if match:
-            n = int(match.group(1))  # Convert the matched group to an integer (UE number)
-        else:
-            continue  # Skip if the match is not found
-        
-        # Determine the corresponding gNB for the current UE
-        gnb = f"gnb{(n-1)%ngNB + 1}"
-        print(f"### Check routing {ue.name} -> {gnb} ###")
+        # The gNB serving the current UE
+        gnb = ue.gnb
         
-        # Start tcpdump to capture traffic on the gNB's s1 interface
-        process = start_tcpdump(gnb, f"{gnb}-s1")
-        time.sleep(2)  # Wait for tcpdump to start
-        
-        # Print tcpdump output for the current UE
-        print_tcpdump_output(process, ue.ip)
-        stop_tcpdump(process)  # Stop tcpdump after capturing traffic
-        
-        # Iterate through the interfaces of the current UE to simulate routing
-        for interface in ue.interfaces:
-            if interface not in ["uesimtun0", "uesimtun1"]:
-                continue  # Skip interfaces that are not relevant for routing tests
-
+        # Iterate through the sessions of the current UE to simulate routing
+        for session, interface in ue.sessions.items():
             upf = ""
             destination = ""
             routing = ""
             
-            # Simulate routing via UPF Cloud for "uesimtun0" interface
-            if interface == "uesimtun0":
+            # Simulate routing via UPF Cloud for the "internet" session
+            if session == "internet":
                 print(f"### Check routing {ue.name} -> {gnb} -> upf_cld ###")
                 destination = "www.google.com"  # Set the destination for UPF Cloud
                 upf = "upf_cld"
                 routing = f"Routing: {ue.name}[{interface}] -> {gnb} -> {upf} -> {destination}"
             
-            # Simulate routing via UPF MEC for "uesimtun1" interface
-            elif interface == "uesimtun1":
+            # Simulate routing via UPF MEC for the "mec" session
+            elif session == "mec":
                 print(f"### Check routing {ue.name} -> {gnb} -> upf_mec ###")
                 destination = network.mec_server.ip  # Get MEC server IP
                 upf = "upf_mec"
                 routing = f"Routing: {ue.name}[{interface}] -> {gnb} -> {upf} -> mec_server"
             
-            # Start tcpdump on the selected UPF (MEC or Cloud)
-            process1 = start_tcpdump(f"{upf}", "ogstun")
-            time.sleep(2)  # Wait for tcpdump to be ready
+            # Start tcpdump on the gNB's s1 interface (radio link traffic of the UE) and on the selected UPF
+            process, process1 = await asyncio.gather(
+                start_tcpdump(runner, gnb, f"{gnb}-s1", capture.udp(hosts=[ue.ip] if ue.ip else None), count=expected),
+                start_tcpdump(runner, upf, "ogstun", capture.icmp_echo(hosts=[ue.interfaces[interface]]), count=expected),
+            )
             
             # Perform a ping test from UE to the destination
             print(f"### Ping {ue.name}[{interface}] -> {destination} ###")
-            ping_test(ue.name, interface, destination)
+            await ping_test(runner, ue.container, interface, destination, count=ROUTING_PING_COUNT, interval=ROUTING_PING_INTERVAL)
             
-            # Display tcpdump output for the selected UPF
+            # Display tcpdump output for the gNB and the selected UPF (they end once the ping has been seen)
+            print(f"### Output tcpdump {gnb} ###")
+            gnb_output = await print_tcpdump_output(process)
             print(f"### Output tcpdump {upf} ###")
-            process_output = print_tcpdump_output(process1, None)
-            
-            # Stop tcpdump after completing the test
-            print(f"### Stopping tcpdump {upf} ###")
-            stop_tcpdump(process1)
+            upf_output = await print_tcpdump_output(process1)
             
             # Print the routing path
             print(routing)
-            time.sleep(2)  # Sleep before proceeding to the next test
 
             # Parse output to print in the table 
-            captured_match = re.search(r'(\d+) packets captured', process_output)
-            captured = int(captured_match.group(1)) if captured_match else None
-
-            received_match = re.search(r'(\d+) packets received by filter', process_output)
-            received = int(received_match.group(1)) if received_match else None
+            gnb_captured = re.search(r'(\d+) packets captured', gnb_output)
+            upf_captured = re.search(r'(\d+) packets captured', upf_output)
+            gnb_captured = int(gnb_captured.group(1)) if gnb_captured else None
+            upf_captured = int(upf_captured.group(1)) if upf_captured else None
 
             routing = routing.replace("Routing: ", "")
-            results.append((routing, f"{captured}/{received}"))
+            results.append((routing, f"{gnb_captured}/{expected}", f"{upf_captured}/{expected}"))
+
+    field_names = ["Routing", "gNB (captured/expected)", "UPF (captured/expected)"] 
+    return [(field_names, results)]
+
+async def stop_capture(runner, container, interface):
+    """
+    Stops the tcpdump capturing on an interface of a container, so that it prints its statistics and exits.
+
+    Terminating the local `docker exec` process is not enough, because the signal is not forwarded to 
+    the process running inside the container.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        container (str): Name of the Docker container.
+        interface (str): Interface of the capture.
+    """
+
+    await runner.run(container, "pkill", "-INT", "-f", f"tcpdump -i {interface} ")
+
+def packet_addresses(line):
+    """
+    Extracts the source and destination IPv4 addresses (without ports) from a tcpdump line.
+
+    Args:
+        line (str): A line printed by tcpdump, e.g. "12:00:00.1 IP 192.168.0.141.4997 > 192.168.0.131.4997: UDP".
+
+    Returns:
+        tuple or None: (source, destination), or None if the line is not an IPv4 packet.
+    """
+
+    match = re.search(r"IP (\d+\.\d+\.\d+\.\d+)\S* > (\d+\.\d+\.\d+\.\d+)\S*?:", line)
+    if not match:
+        return None
+
+    return match.group(1), match.group(2)
+
+async def count_packets(process, counts):
+    """
+    Reads a tcpdump capture until it ends and counts the packets sent or received by the given addresses.
+
+    Args:
+        process (asyncio.subprocess.Process): The tcpdump process returned by `start_tcpdump`.
+        counts (dict): IP addresses to look for, mapped to their counter (updated in place).
+    """
+
+    async for line in read_lines(process.stdout):
+        addresses = packet_addresses(line)
+        if not addresses:
+            continue
 
-    field_names = ["Routing", "Result"] 
-    print_table(field_names, results, True)
+        for address in set(addresses):
+            if address in counts:
+                counts[address] += 1
 
-def details(network):
+    await process.wait()
+
+async def routing_parallel(runner, network):
+    """
+    Checks the routing path of all the User Equipment (UE) at the same time.
+
+    Instead of starting new captures for every UE, one capture is opened on the s1 interface of every 
+    gNB and one on the ogstun interface of every UPF, then all the pings run concurrently. The captured 
+    packets are demultiplexed by address: the address of the UE container on the gNB (radio link 
+    traffic, shared by the UEs of a packed container) and the 10.45.x / 10.46.x address of the UE 
+    interface on the UPF. Every routing path still gets its own result.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        network (Network): The network object containing UEs, gNBs, UPFs, and the MEC server.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
+    """
+
+    # Every echo request is captured together with its reply
+    expected = 2 * ROUTING_PING_COUNT
+
+    # Collect the routing paths to check: (UE, interface, gNB, UPF, destination, description)
+    checks = []
+    for ue in network.ue_list:
+        gnb = ue.gnb
+
+        for session, interface in ue.sessions.items():
+            if session == "internet":
+                checks.append((ue, interface, gnb, "upf_cld", "www.google.com",
+                               f"{ue.name}[{interface}] -> {gnb} -> upf_cld -> www.google.com"))
+            elif session == "mec":
+                checks.append((ue, interface, gnb, "upf_mec", network.mec_server.ip,
+                               f"{ue.name}[{interface}] -> {gnb} -> upf_mec -> mec_server"))
+
+    if not checks:
+        print("No UE interface to test")
+        return []
+
+    # One capture per gNB and UPF, filtering in the kernel the addresses of its UEs, with one counter 
+    # per address and the number of packets expected for it
+    captures = {}
+    for ue, interface, gnb, upf, _, _ in checks:
+        gnb_capture = captures.setdefault((gnb, f"{gnb}-s1"), {"filter": capture.udp(), "counts": {}, "expected": {}})
+        gnb_capture["filter"].add_host(ue.ip)
+        gnb_capture["counts"][ue.ip] = 0
+        gnb_capture["expected"][ue.ip] = gnb_capture["expected"].get(ue.ip, 0) + expected
+
+        upf_capture = captures.setdefault((upf, "ogstun"), {"filter": capture.icmp_echo(), "counts": {}, "expected": {}})
+        upf_capture["filter"].add_host(ue.interfaces[interface])
+        upf_capture["counts"][ue.interfaces[interface]] = 0
+        upf_capture["expected"][ue.interfaces[interface]] = expected
+
+    # Start all the captures, waiting until every one of them is listening
+    print(f"### Starting {len(captures)} captures ###")
+    timeout = TCPDUMP_TIMEOUT + len(checks) * ROUTING_PING_COUNT * ROUTING_PING_INTERVAL
+    processes = dict(zip(captures, await asyncio.gather(*(
+        start_tcpdump(runner, *key, captures[key]["filter"], timeout=int(timeout) + 1) for key in captures))))
+
+    readers = [
+        asyncio.ensure_future(count_packets(process, captures[key]["counts"]))
+        for key, process in processes.items() if process
+    ]
+
+    # Run all the pings concurrently
+    print(f"### Running {len(checks)} pings ###")
+    await asyncio.gather(*(
+        ping_test(runner, ue.container, interface, destination, count=ROUTING_PING_COUNT, interval=ROUTING_PING_INTERVAL)
+        for ue, interface, _, _, destination, _ in checks
+    ))
+
+    # Wait until every capture has seen the expected packets (or the captures time out)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TCPDUMP_TIMEOUT
+    while loop.time() < deadline and not all(
+            capture["counts"][address] >= capture["expected"][address]
+            for key, capture in captures.items() if processes[key] for address in capture["counts"]):
+        await asyncio.sleep(0.1)
+
+    print("### Stopping the captures ###")
+    await asyncio.gather(*(
+        stop_capture(runner, container, interface)
+        for (container, interface), process in processes.items() if process
+    ))
+    if readers:
+        await asyncio.wait(readers, timeout=TCPDUMP_READY_TIMEOUT)
+
+    results = []
+    for ue, interface, gnb, upf, _, routing in checks:
+        gnb_capture = captures[(gnb, f"{gnb}-s1")]
+        upf_capture = captures[(upf, "ogstun")]
+        results.append((
+            routing,
+            f"{gnb_capture['counts'][ue.ip]}/{gnb_capture['expected'][ue.ip]}",
+            f"{upf_capture['counts'][ue.interfaces[interface]]}/{expected}",
+        ))
+
+    field_names = ["Routing", "gNB (captured/expected)", "UPF (captured/expected)"]
+    return [(field_names, results)]
+
+async def details(runner, network):
     """
     Prints the details of the entire network configuration, including UEs, gNBs, UPFs, and the MEC server.
 
     Args:
+        runner (Runner): Runner executing the commands in the containers (unused, the network is already loaded).
         network (Network): The network object containing all components (UEs, gNBs, UPFs, and MEC server).
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
     """
     print(network)  # Print the full network details (invokes the __str__ method of the Network class)
     field_names = ["Component name", "ip", "interfaces"]
@@ -594,7 +1231,57 @@ def details(network):
     for component in network.get_component_list():
         interfaces = " ".join([f"{name}:{ip}" for name, ip in component.interfaces.items()])
         result.append((component.name, component.ip, interfaces))
-    print_table(field_names, result, True)
+    return [(field_names, result)]
+    
+def format_ms(seconds):
+    """
+    Formats a duration in milliseconds for the tables.
+
+    Args:
+        seconds (float or None): The duration in seconds.
+
+    Returns:
+        str: The duration in milliseconds, or "-" if it is unknown.
+    """
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+async def attach(runner, network):
+    """
+    Reports the attach of every UE, read from the logs of the UEs: the time from the start of the UE to its
+    RRC connection, to its registration and to each of its PDU sessions, and the attach latency (until the 
+    last PDU session).
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers (unused, the logs are read on the host).
+        network (Network): The network object containing all components.
+
+    Returns:
+        list: The tables of the results, as (field names, rows) pairs.
+    """
+
+    containers = {}
+    for ue in network.ue_list:
+        containers.setdefault(ue.container, []).append(ue.number)
+
+    # The UE logs are rewritten when the UEs start: read them from the start
+    tracker = AttachTracker(LOG_FOLDER, containers, config_folder=CONFIG_FOLDER)
+    tracker.poll()
+
+    field_names = ["UE", "Container", "gNB", "RRC (ms)", "Registration (ms)", "PDU sessions (ms)", "Attach (ms)"]
+    results = []
+    for ue in network.ue_list:
+        ue_attach = tracker.ues[ue.number]
+        sessions = " ".join(f"{PDU_SESSIONS.get(psi, psi)}:{format_ms(ue_attach.latency(psi))}"
+                            for psi in sorted(ue_attach.pdu_sessions))
+        results.append((ue.name, ue.container, ue.gnb, format_ms(ue_attach.latency("rrc")),
+                        format_ms(ue_attach.latency("registered")), sessions or "-", format_ms(ue_attach.latency())))
+
+    summary = tracker.summary()
+    summary_names = ["UEs attached", "Min (ms)", "Avg (ms)", "P50 (ms)", "P95 (ms)", "Max (ms)"]
+    summary_row = (f"{summary['ready']}/{summary['total']}",
+                   *(format_ms(summary[key]) for key in ("min", "avg", "p50", "p95", "max")))
+
+    return [(field_names, results), (summary_names, [summary_row])]
     
 def print_table(field_names, rows, clear_screen=False):
     """
@@ -620,6 +1307,40 @@ def print_table(field_names, rows, clear_screen=False):
     print(table)
 
 
+async def run_commands(runner, command_functions, nUE, allocator, wait_attach=None):
+    """
+    Loads the network and runs the selected commands at the same time, then prints their results.
+
+    Args:
+        runner (Runner): Runner executing the commands in the containers.
+        command_functions (list): The commands to execute (coroutine functions taking the runner and the network).
+        nUE (int): Number of User Equipment (UE) components.
+        allocator (Allocator): The allocator of the network, giving the UE containers and the gNBs.
+        wait_attach (float): If set, maximum number of seconds to wait for all the UEs to be attached 
+                             (all their PDU sessions established) before loading the network.
+    """
+
+    try:
+        if wait_attach:
+            tracker = AttachTracker(LOG_FOLDER, containers_of(allocator, nUE), config_folder=CONFIG_FOLDER)
+            if await tracker.wait_ready(wait_attach):
+                print(f"All {nUE} UEs attached")
+            else:
+                print(f"Only {tracker.ready_count}/{nUE} UEs attached after {wait_attach}s")
+
+        # Get network components and create the network instance
+        network = Network(*await get_network_components(runner, nUE, allocator))
+
+        # Run all the commands concurrently, each one returns its tables
+        results = await asyncio.gather(*(command_function(runner, network) for command_function in command_functions))
+    finally:
+        await runner.close()
+
+    tables = [table for command_tables in results for table in command_tables]
+    for i, (field_names, rows) in enumerate(tables):
+        print_table(field_names, rows, clear_screen=i == 0)
+
+
 def main():
     """
     Main function that handles command-line arguments, sets up the network components, 
@@ -637,6 +1358,12 @@ def main():
           latency    Measures network latency.
           bandwidth  Measures available bandwidth.
           routing    Displays the route packets take.
+          load       Measures the throughput with all the UEs transmitting at once.
+          attach     Reports the attach latency of every UE (RRC, registration, PDU sessions).
+          echo       Measures the application-level latency to the MEC server through both UPFs.
+
+        Several commands separated by commas run at the same time, e.g. "-c latency,load"
+        measures the latency while the UPFs are loaded.
         """)
     )
 
@@ -644,51 +1371,170 @@ def main():
     parser.add_argument(
         "-c", "--command",
         type=str,
-        help="Execute a specific command. Use '-h' to see the full list."
+        help="Execute a specific command (or several, separated by commas). Use '-h' to see the full list."
+    )
+
+    # Define the command-line argument for the number of concurrent workers
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=None,
+        help="Maximum number of concurrent commands in the containers (default: no limit)."
+    )
+
+    # Define the command-line argument for the way the commands are executed in the containers
+    parser.add_argument(
+        "--backend",
+        choices=["api", "cli"],
+        default="api",
+        help="Execute the commands through the Docker Engine API socket (api) or the docker CLI (cli)."
+    )
+
+    # Define the command-line argument for the persistent shells executing the commands
+    parser.add_argument(
+        "-a", "--agents",
+        type=int,
+        default=0,
+        help="Run the short commands through up to this number of persistent shells per container (default: 0, one exec per command)."
+    )
+
+    # Define the command-line argument for the number of UEs per gNB (as given to multiUE-gNB.py)
+    parser.add_argument(
+        "-g", "--ues-per-gnb",
+        type=int,
+        default=allocation.UES_PER_GNB,
+        help=f"Maximum number of UEs served by a gNB (default: {allocation.UES_PER_GNB})."
+    )
+
+    # Define the command-line argument for the number of UEs per container (as given to multiUE-gNB.py)
+    parser.add_argument(
+        "-k", "--ues-per-container",
+        type=int,
+        default=allocation.UES_PER_CONTAINER,
+        help=f"Number of UEs hosted by a container (default: {allocation.UES_PER_CONTAINER})."
+    )
+
+    # Define the command-line argument for the timeout of the commands
+    parser.add_argument(
+        "-T", "--timeout",
+        type=float,
+        default=COMMAND_TIMEOUT,
+        help=f"Timeout in seconds of a command executed in a container (default: {COMMAND_TIMEOUT})."
+    )
+
+    # Define the command-line arguments of the iperf3 tests (bandwidth and load)
+    parser.add_argument(
+        "-t", "--duration",
+        type=int,
+        default=None,
+        help="Duration in seconds of the iperf3 tests (default: 5 for bandwidth, 10 for load)."
+    )
+    parser.add_argument(
+        "-u", "--udp",
+        action="store_true",
+        help="Run UDP iperf3 tests, reporting jitter and loss."
+    )
+    parser.add_argument(
+        "-b", "--bitrate",
+        type=str,
+        default=None,
+        help="Target bitrate of the iperf3 tests (e.g. 10M)."
+    )
+
+    # Define the command-line argument for the parallel routing check
+    parser.add_argument(
+        "-p", "--parallel",
+        action="store_true",
+        help="Check the routing of all the UEs at once, with one capture per gNB and UPF."
+    )
+
+    # Define the command-line arguments of the echo test
+    parser.add_argument(
+        "--echo-protocol",
+        choices=["udp", "tcp"],
+        default="udp",
+        help="Protocol of the echo test (default: udp)."
+    )
+    parser.add_argument(
+        "--echo-count",
+        type=int,
+        default=ECHO_COUNT,
+        help=f"Number of messages sent by every echo test (default: {ECHO_COUNT})."
+    )
+
+    # Define the command-line argument for waiting for the attach of the UEs
+    parser.add_argument(
+        "--wait-attach",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Wait up to this number of seconds for all the UEs to be attached before running the commands."
     )
 
     # Parse the command-line arguments
     args = parser.parse_args()
 
-    # Initialize the function variable to hold the selected command
-    command_function = None
-
-    # Match the provided command with the corresponding function
-    if args.command == "latency":
-        command_function = latency
-    elif args.command == "bandwidth":
-        command_function = bandwidth
-    elif args.command == "routing":
-        command_function = routing
-    elif args.command == "details":
-        command_function = details
-    elif args.command:
-        print(f"Command '{args.command}' not recognized.\n")
-        parser.print_help()
-        return
-    else:
+    if not args.command:
         # Show help if no command is provided
         parser.print_help()
         return
 
+    if args.echo_count < 1:
+        parser.error("The number of echo messages must be at least 1")
+
+    # Options shared by the iperf3 tests
+    iperf3_options = {"udp": args.udp, "bitrate": args.bitrate}
+    if args.duration:
+        iperf3_options["duration"] = args.duration
+
+    # Match every provided command with the corresponding function
+    command_functions = []
+    for command in args.command.split(","):
+        if command == "latency":
+            command_functions.append(latency)
+        elif command == "bandwidth":
+            command_functions.append(partial(bandwidth, **iperf3_options))
+        elif command == "routing" and args.parallel:
+            command_functions.append(routing_parallel)
+        elif command == "routing":
+            command_functions.append(routing)
+        elif command == "load":
+            command_functions.append(partial(load, **iperf3_options))
+        elif command == "details":
+            command_functions.append(details)
+        elif command == "attach":
+            command_functions.append(attach)
+        elif command == "echo":
+            command_functions.append(partial(echo, protocol=args.echo_protocol, count=args.echo_count))
+        else:
+            print(f"Command '{command}' not recognized.\n")
+            parser.print_help()
+            return
+
     # Initialize the network and print a message
     print("########### Loading Network ###########")
     
-    # Initialize Open5GS object (mocked with IP and port for this example)
-    O5GS = Open5GS("172.17.0.2", "27017")
-    
-    # Fetch subscribers from Open5GS
-    subscribers = O5GS._GetSubscribers()
+    # Initialize Open5GS object (the shared client only connects when the subscribers are counted)
+    O5GS = Open5GS()
     
-    # Calculate the number of UEs and gNBs based on the number of subscribers
-    nUE = len(subscribers)
-    ngNB = math.ceil(nUE / 3)
+    # Count the subscribers on the server (the profiles themselves are not needed)
+    try:
+        nUE = O5GS.countSubscribers()
+    except PyMongoError as e:
+        print(f"Unable to reach the Open5GS database: {e}")
+        return
     
-    # Get network components and create the network instance
-    network = Network(*get_network_components(nUE, ngNB))
+    # The UE containers and the gNBs are derived from the number of subscribers
+    try:
+        allocator = Allocator(ues_per_gnb=args.ues_per_gnb, ues_per_container=args.ues_per_container)
+    except ValueError as e:
+        parser.error(str(e))
     
-    # Execute the selected command with the network object
-    command_function(network)
+    # Execute the selected commands with the network object
+    runner = create_runner(args.backend, concurrency=args.workers, timeout=args.timeout)
+    if args.agents > 0:
+        runner = AgentRunner(runner, max_agents=args.agents)
+    asyncio.run(run_commands(runner, command_functions, nUE, allocator, args.wait_attach))
 
 
 if __name__ == '__main__':
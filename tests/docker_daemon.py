@@ -0,0 +1,175 @@
+import asyncio
+import json
+import struct
+
+
+# Reason phrases of the status codes answered by the stand-in
+REASONS = {200: "OK", 201: "Created", 404: "Not Found"}
+
+
+class DockerDaemonStandIn:
+    """
+    Stand-in of the Docker daemon serving the exec endpoints of the Engine API on a Unix socket.
+
+    It answers exec create and exec inspect on keep-alive connections, and exec start by hijacking the
+    connection and streaming the scripted output of the command in 8 bytes framed stdout/stderr chunks,
+    as the daemon does for an exec without a TTY. The commands are not executed: their output and exit
+    code are scripted in advance with `script`.
+    """
+
+    def __init__(self, socket_path, containers=("ue1",), chunk_size=None):
+        """
+        Initializes a DockerDaemonStandIn object (the socket is not opened until `start`).
+
+        Args:
+            socket_path (str): Path of the Unix socket to listen on.
+            containers (tuple): Names of the running containers.
+            chunk_size (int): If set, the output stream is written in chunks of this size, splitting the frames.
+        """
+        self.socket_path = socket_path
+        self.containers = set(containers)
+        self.chunk_size = chunk_size
+        self.scripts = {}  # Output frames, exit code and pending inspections of every command, by command line
+        self.execs = {}  # Exec instances, by ID
+        self.connections = 0  # Number of connections accepted
+        self._writers = set()  # Open keep-alive connections
+        self._handlers = set()  # Tasks serving the connections
+        self._server = None
+
+    def script(self, cmd, frames=(), exit_code=0, pending_inspects=0):
+        """
+        Scripts the result of a command (an unscripted command has no output and exits with 0).
+
+        Args:
+            cmd (list): The command and its arguments.
+            frames (list): The output of the command, as (stream, data) pairs (1 = stdout, 2 = stderr).
+            exit_code (int): The exit code of the command.
+            pending_inspects (int): Number of inspections still reporting the exec as running after the end of its
+                                    stream (the daemon may record the exit code a moment later).
+        """
+        self.scripts[tuple(cmd)] = (list(frames), exit_code, pending_inspects)
+
+    async def start(self):
+        """Starts listening on the Unix socket."""
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+
+    def drop_connections(self):
+        """Closes the idle keep-alive connections, as the daemon does after its idle timeout."""
+        for writer in list(self._writers):
+            writer.close()
+
+    async def stop(self):
+        """Stops listening and closes the open connections."""
+        self._server.close()
+        self.drop_connections()
+        await self._server.wait_closed()
+        await asyncio.gather(*self._handlers)
+
+    async def _handle(self, reader, writer):
+        # Serve the requests of a connection until it is closed or hijacked by an exec start
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+
+                method, path, body = request
+                parts = path.strip("/").split("/")
+                if method == "POST" and parts[0] == "exec" and parts[-1] == "start":
+                    self._writers.discard(writer)
+                    await self._start(parts[1], writer)
+                    break
+
+                status, response = self._route(method, parts, body)
+                self._respond(writer, status, response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # The client closed the connection
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _read_request(self, reader):
+        # Read the request line, the headers and the JSON body of a request (None when the connection is closed)
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        payload = await reader.readexactly(int(headers.get("content-length", 0)))
+        return method, path, json.loads(payload) if payload else None
+
+    def _route(self, method, parts, body):
+        # Answer exec create and exec inspect, as (status, JSON response) pairs
+        if method == "POST" and parts[0] == "containers" and parts[-1] == "exec":
+            container = parts[1]
+            if container not in self.containers:
+                return 404, {"message": f"No such container: {container}"}
+
+            exec_id = f"exec{len(self.execs) + 1}"
+            frames, exit_code, pending_inspects = self.scripts.get(tuple(body["Cmd"]), ([], 0, 0))
+            self.execs[exec_id] = {
+                "frames": frames, "exit_code": exit_code, "pending_inspects": pending_inspects, "ended": False,
+            }
+            return 201, {"Id": exec_id}
+
+        if method == "GET" and parts[0] == "exec" and parts[-1] == "json":
+            exec_instance = self.execs.get(parts[1])
+            if exec_instance is None:
+                return 404, {"message": f"No such exec instance: {parts[1]}"}
+
+            running = not exec_instance["ended"] or exec_instance["pending_inspects"] > 0
+            if exec_instance["ended"] and exec_instance["pending_inspects"]:
+                exec_instance["pending_inspects"] -= 1
+            exit_code = None if running else exec_instance["exit_code"]
+            return 200, {"ID": parts[1], "Running": running, "ExitCode": exit_code}
+
+        return 404, {"message": "page not found"}
+
+    def _respond(self, writer, status, response):
+        # Write a response with a JSON body on a keep-alive connection
+        payload = json.dumps(response).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode() + payload)
+
+    async def _start(self, exec_id, writer):
+        # Hijack the connection and stream the output of the exec, then end it by closing the connection
+        exec_instance = self.execs.get(exec_id)
+        if exec_instance is None:
+            self._respond(writer, 404, {"message": f"No such exec instance: {exec_id}"})
+            await writer.drain()
+            return
+
+        writer.write(
+            b"HTTP/1.1 101 UPGRADED\r\n"
+            b"Content-Type: application/vnd.docker.raw-stream\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Upgrade: tcp\r\n"
+            b"\r\n"
+        )
+
+        stream = b"".join(struct.pack(">BxxxL", kind, len(data)) + data for kind, data in exec_instance["frames"])
+        chunk_size = self.chunk_size or len(stream) or 1
+        for offset in range(0, len(stream), chunk_size):
+            writer.write(stream[offset:offset + chunk_size])
+            await writer.drain()
+            await asyncio.sleep(0)  # Let the client read every chunk on its own
+
+        exec_instance["ended"] = True
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from python_modules.docker_api import DockerApiError, DockerApiRunner, DockerClient
+from tests.docker_daemon import DockerDaemonStandIn
+
+
+class DockerApiTestCase(unittest.IsolatedAsyncioTestCase):
+    """Base of the tests of the Docker API client, run against a stand-in daemon on a temporary socket."""
+
+    chunk_size = None
+
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.folder, "docker.sock")
+        self.daemon = DockerDaemonStandIn(self.socket_path, chunk_size=self.chunk_size)
+        await self.daemon.start()
+        self.runner = DockerApiRunner(socket_path=self.socket_path)
+
+    async def asyncTearDown(self):
+        await self.runner.close()
+        await self.daemon.stop()
+        shutil.rmtree(self.folder)
+
+
+class TestExecProcess(DockerApiTestCase):
+    """Tests the demultiplexing of the output and the exit codes of the commands."""
+
+    async def test_demultiplexes_stdout_and_stderr(self):
+        self.daemon.script(["ip", "-j", "addr"], [(1, b"out1\n"), (2, b"err1\n"), (1, b"out2\n"), (2, b"err2\n")])
+
+        result = await self.runner.run("ue1", "ip", "-j", "addr")
+
+        self.assertEqual(result.stdout, "out1\nout2\n")
+        self.assertEqual(result.stderr, "err1\nerr2\n")
+        self.assertEqual(result.returncode, 0)
+
+    async def test_empty_frame_and_no_output(self):
+        self.daemon.script(["true"], [(1, b"")])
+
+        result = await self.runner.run("ue1", "true")
+
+        self.assertEqual((result.stdout, result.stderr, result.returncode), ("", "", 0))
+
+    async def test_exit_code(self):
+        self.daemon.script(["ping", "-c", "1", "10.45.0.1"], [(2, b"unreachable\n")], exit_code=2)
+
+        result = await self.runner.run("ue1", "ping", "-c", "1", "10.45.0.1")
+
+        self.assertEqual(result.returncode, 2)
+        self.assertFalse(result.ok)
+        self.assertEqual(result.stderr, "unreachable\n")
+
+    async def test_exit_code_recorded_after_the_stream(self):
+        self.daemon.script(["false"], exit_code=1, pending_inspects=3)
+
+        result = await self.runner.run("ue1", "false")
+
+        self.assertEqual(result.returncode, 1)
+
+    async def test_unknown_container(self):
+        result = await self.runner.run("ue9", "true")
+
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("No such container: ue9", result.stderr)
+
+    async def test_unknown_exec(self):
+        with self.assertRaises(DockerApiError) as context:
+            await self.runner.client.exec_start("exec42")
+
+        self.assertEqual(context.exception.status, 404)
+
+
+class TestFragmentedStream(DockerApiTestCase):
+    """Tests the demultiplexing of frames split across several reads."""
+
+    chunk_size = 3
+
+    async def test_reassembles_split_frames(self):
+        data = bytes(range(256)) * 40
+        self.daemon.script(["cat", "capture.pcap"], [(1, data[:5000]), (2, b"done\n"), (1, data[5000:])])
+
+        process = await self.runner.spawn("ue1", "cat", "capture.pcap")
+        stdout, stderr = await process.communicate()
+
+        self.assertEqual(stdout, data)
+        self.assertEqual(stderr, b"done\n")
+        self.assertEqual(process.returncode, 0)
+
+
+class TestDockerClient(DockerApiTestCase):
+    """Tests the pool of keep-alive connections of the client."""
+
+    async def test_reuses_the_pooled_connection(self):
+        for _ in range(3):
+            await self.runner.run("ue1", "true")
+
+        # One pooled connection for every create and inspect, plus one hijacked connection per start
+        self.assertEqual(self.daemon.connections, 1 + 3)
+
+    async def test_retries_on_a_fresh_connection(self):
+        client = DockerClient(self.socket_path)
+        exec_id = await client.exec_create("ue1", ["true"])
+
+        # Fill the pool with two connections, then let the daemon close them while they are idle
+        await asyncio.gather(client.exec_inspect(exec_id), client.exec_inspect(exec_id))
+        self.assertEqual(len(client._idle), 2)
+        self.daemon.drop_connections()
+        await asyncio.sleep(0.05)
+
+        connections = self.daemon.connections
+        state = await client.exec_inspect(exec_id)
+        await client.close()
+
+        self.assertTrue(state["Running"])
+        self.assertEqual(self.daemon.connections, connections + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,49 +1,29 @@
 import os
+import sys
 
-def generate_yaml(ngNB):
-    """
-    Deletes all existing 'open5gs_gnb*' files in the current directory and generates new YAML configuration files 
-    for the specified number of gNodeBs (ngNB).
-
-    This function creates a YAML configuration for each gNodeB with essential parameters like 
-    MCC (Mobile Country Code), MNC (Mobile Network Code), Cell Identity, IP addresses for different
-    interfaces (Radio Link, N2, N3), and other parameters required for the gNB setup. The configuration
-    is saved to a file for each gNodeB.
+if __name__ == '__main__':
+    # Run as a script: make the python_modules package importable from the root of the repository
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
 
-    Args:
-        ngNB (int): The number of gNodeBs to generate YAML configurations for.
+from python_modules.allocator import Allocator
+from python_modules.template import Template, remove_stale, render_files
 
-    Returns:
-        None
-    """
-    
-    # Get the current directory where the script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Delete all existing 'open5gs_gnb*' files in the current directory
-    for file_name in os.listdir(script_dir):
-        if file_name.startswith("open5gs_gnb") and file_name.endswith(".yaml"):
-            os.remove(os.path.join(script_dir, file_name))
-            print(f"Deleted existing file: {file_name}")
-    
-    # Loop through the number of gNodeBs to create their configurations
-    for i in range(1, ngNB + 1):
-        # Generate the YAML configuration content for each gNB
-        yaml = f"""
-mcc: '001'         # Mobile Country Code value
-mnc: '01'          # Mobile Network Code value (2 or 3 digits)
+# Template of the gNB configuration, parsed once: the PLMN, the IP address of the gNB and of the AMF
+GNB_TEMPLATE = Template("""
+mcc: '{mcc}'         # Mobile Country Code value
+mnc: '{mnc}'          # Mobile Network Code value (2 or 3 digits)
 
 nci: '0x000000010'  # NR Cell Identity (36-bit)
 idLength: 32        # NR gNB ID length in bits [22...32]
 tac: 1              # Tracking Area Code
 
-linkIp: 192.168.0.{130+i}   # gNB's local IP address for Radio Link Simulation (Usually same with local IP)
-ngapIp: 192.168.0.{130+i}   # gNB's local IP address for N2 Interface (Usually same with local IP)
-gtpIp: 192.168.0.{130+i}    # gNB's local IP address for N3 Interface (Usually same with local IP)
+linkIp: {ip}   # gNB's local IP address for Radio Link Simulation (Usually same with local IP)
+ngapIp: {ip}   # gNB's local IP address for N2 Interface (Usually same with local IP)
+gtpIp: {ip}    # gNB's local IP address for N3 Interface (Usually same with local IP)
 
 # List of AMF address information
 amfConfigs:
-  - address: 192.168.0.111
+  - address: {amf_ip}
     port: 38412
 
 # List of supported S-NSSAIs by this gNB
@@ -55,13 +35,48 @@ slices:
 
 # Indicates whether or not SCTP stream number errors should be ignored.
 ignoreStreamIds: true
-"""
-        # Write the generated YAML configuration to a file
-        with open(f"./ueransim/config/open5gs_gnb{i}.yaml", "w") as file:
-            file.write(yaml)
+""")
+
+def generate_yaml(ngNB, allocator=None):
+    """
+    Generates the YAML configuration files for the specified number of gNodeBs (ngNB).
+
+    This function creates a YAML configuration for each gNodeB with essential parameters like 
+    MCC (Mobile Country Code), MNC (Mobile Network Code), Cell Identity, IP addresses for different
+    interfaces (Radio Link, N2, N3), and other parameters required for the gNB setup. The configurations
+    are rendered from a shared template and only the files whose content changed are (atomically) written.
+    The 'open5gs_gnb*' files of gNodeBs that no longer exist are deleted.
+
+    Args:
+        ngNB (int): The number of gNodeBs to generate YAML configurations for.
+        allocator (Allocator): The allocator of the addresses and identifiers (default settings if None).
+
+    Returns:
+        list: The paths of the files written (new or changed).
+    """
+    
+    # Get the current directory where the script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    allocator = allocator or Allocator()
+
+    # Values of the template for each gNodeB, by file
+    files = {
+        os.path.join(script_dir, f"open5gs_gnb{i}.yaml"): {
+            "mcc": allocator.mcc,
+            "mnc": allocator.mnc,
+            "ip": allocator.gnb_ip(i),
+            "amf_ip": allocator.address("cp"),
+        }
+        for i in range(1, ngNB + 1)
+    }
+
+    # Write the changed configurations and delete the ones of the gNodeBs that no longer exist
+    written = render_files(GNB_TEMPLATE, files)
+    removed = remove_stale(script_dir, "open5gs_gnb", ".yaml", files)
+    print(f"gNB configurations: {len(written)} written, {ngNB - len(written)} unchanged, {len(removed)} deleted")
 
-    # Return after completing the YAML generation
-    return
+    return written
 
 if __name__ == '__main__':
     generate_yaml(6)  # Generate YAML for 6 gNBs
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# wait_stage <stage> <seconds>: waits for the signal of multiUE-gNB.py, or for a fixed delay
+source "$(dirname "$0")/wait_stage.sh"
 
-sleep 20
+
+wait_stage gnb 20
 ./nr-gnb -c "/mnt/ueransim/open5gs_gnb$1.yaml" > "/mnt/log/gnb$1.log" 2>&1
@@ -1,4 +1,13 @@
 #!/bin/bash
+# Usage: open5gs_ue_init.sh <container number> [<number of UEs>]
+# With a number of UEs the container hosts that many UEs in a single nr-ue process (packed mode)
 
-sleep 25
-./nr-ue -c "/mnt/ueransim/open5gs_ue$1.yaml" -i "imsi-00101123456780$1" > "/mnt/log/ue$1.log" 2>&1
+# wait_stage <stage> <seconds>: waits for the signal of multiUE-gNB.py, or for a fixed delay
+source "$(dirname "$0")/wait_stage.sh"
+
+wait_stage ue 25
+if [ -n "$2" ]; then
+    ./nr-ue -c "/mnt/ueransim/open5gs_uepack$1.yaml" -n "$2" > "/mnt/log/uepack$1.log" 2>&1
+else
+    ./nr-ue -c "/mnt/ueransim/open5gs_ue$1.yaml" > "/mnt/log/ue$1.log" 2>&1
+fi
@@ -1,45 +1,21 @@
 import os
+import sys
 
-def generate_yaml(nUE, gnNB):
-    """
-    Deletes all existing 'open5gs_ue*' files in the current directory and generates new YAML configuration files 
-    for the specified number of User Equipments (UEs).
-
-    This function creates a YAML configuration for each UE with essential parameters such as IMSI, 
-    Mobile Country Code (MCC), Mobile Network Code (MNC), Authentication Management Field (AMF), 
-    Device IMEI, PDU session information, and encryption configuration. The configuration is saved 
-    to a file for each UE.
-
-    Args:
-        nUE (int): The number of User Equipments (UEs) to generate YAML configurations for.
-        gnNB (int): The number of gNodeBs, used to determine the IP address for each UE.
-
-    Returns:
-        None
-    """
-    
-    # Get the current directory where the script is located
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+if __name__ == '__main__':
+    # Run as a script: make the python_modules package importable from the root of the repository
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
 
-    # Delete all existing 'open5gs_ue*' files in the current directory
-    for file_name in os.listdir(script_dir):
-        if file_name.startswith("open5gs_ue") and file_name.endswith(".yaml"):
-            os.remove(os.path.join(script_dir, file_name))
-            print(f"Deleted existing file: {file_name}")
-    
-    # Loop through the number of UEs (nUE) to generate their configurations
-    for i in range(1, nUE + 1):
-        # Calculate the final gNB IP address for the UE
-        ipfinal = str(131 + (i - 1) % gnNB)
+from python_modules.allocator import Allocator
+from python_modules.template import Template, remove_stale, render_files
 
-        # Generate the YAML configuration content for each UE
-        yaml = f"""
+# Template of the UE configuration, parsed once: the identifiers of the UE and the IP address of its gNB
+UE_TEMPLATE = Template("""
 # IMSI number of the UE. IMSI = [MCC|MNC|MSISDN] (In total 15 or 16 digits)
-supi: 'imsi-0010112345678{i:02d}'
+supi: 'imsi-{imsi}'
 # Mobile Country Code value of HPLMN
-mcc: '001'
+mcc: '{mcc}'
 # Mobile Network Code value of HPLMN (2 or 3 digits)
-mnc: '01'
+mnc: '{mnc}'
 
 # Permanent subscription key
 key: '8baf473f2f8fd09487cccbd7097c6862'
@@ -50,13 +26,13 @@ opType: 'OP'
 # Authentication Management Field (AMF) value
 amf: '8000'
 # IMEI number of the device. It is used if no SUPI is provided
-imei: '3569380356438{i:02d}'
+imei: '{imei}'
 # IMEISV number of the device. It is used if no SUPI and IMEI is provided
-imeiSv: '43708161258161{i:02d}'
+imeiSv: '{imeisv}'
 
 # List of gNB IP addresses for Radio Link Simulation
 gnbSearchList:
-  - 192.168.0.{ipfinal}
+  - {gnb_ip}
 
 # UAC Access Identities Configuration
 uacAic:
@@ -115,13 +91,55 @@ ciphering:
 integrityMaxRate:
   uplink: 'full'
   downlink: 'full'
-"""
-        # Write the generated YAML configuration to a file
-        with open(f"./ueransim/config/open5gs_ue{i}.yaml", "w") as file:
-            file.write(yaml)
+""")
+
+def generate_yaml(nUE, gnNB, allocator=None):
+    """
+    Generates the YAML configuration files for the specified number of User Equipments (UEs).
+
+    This function creates a YAML configuration for each UE container with essential parameters such as IMSI, 
+    Mobile Country Code (MCC), Mobile Network Code (MNC), Authentication Management Field (AMF), 
+    Device IMEI, PDU session information, and encryption configuration. The configurations are rendered
+    from a shared template and only the files whose content changed are (atomically) written, so the
+    containers that bind-mount the folder do not see unchanged files being rewritten. The 'open5gs_ue*'
+    files of UEs that no longer exist are deleted.
+
+    In packed mode every container gets one configuration ('open5gs_uepack<k>.yaml') holding the identifiers
+    of its first UE: `nr-ue -n` increments the IMSI, IMEI and IMEISV for the following UEs.
+
+    Args:
+        nUE (int): The number of User Equipments (UEs) to generate YAML configurations for.
+        gnNB (int): The number of gNodeBs, used to determine the IP address for each UE.
+        allocator (Allocator): The allocator of the addresses and identifiers (default settings if None).
+
+    Returns:
+        list: The paths of the files written (new or changed).
+    """
+    
+    # Get the current directory where the script is located
+    script_dir = os.path.dirname(os.path.abspath(__file__))
 
-    # Return after completing the YAML generation
-    return
+    allocator = allocator or Allocator()
+
+    # Values of the template for each UE container (i.e. its first UE), by file
+    files = {}
+    for k in range(1, allocator.container_count(nUE) + 1):
+        i = allocator.container_ues(k, nUE)[0]
+        files[os.path.join(script_dir, f"open5gs_{allocator.container_name(k)}.yaml")] = {
+            "imsi": allocator.imsi(i),
+            "mcc": allocator.mcc,
+            "mnc": allocator.mnc,
+            "imei": allocator.imei(i),
+            "imeisv": allocator.imeisv(i),
+            "gnb_ip": allocator.gnb_ip(allocator.ue_gnb(i, gnNB)),
+        }
+
+    # Write the changed configurations and delete the ones of the UEs that no longer exist
+    written = render_files(UE_TEMPLATE, files)
+    removed = remove_stale(script_dir, "open5gs_ue", ".yaml", files)
+    print(f"UE configurations: {len(written)} written, {len(files) - len(written)} unchanged, {len(removed)} deleted")
+
+    return written
 
 
 if __name__ == '__main__':
@@ -0,0 +1,12 @@
+#!/bin/bash
+# Sourced by the init scripts of this folder.
+
+# Waits before a start-up stage: until multiUE-gNB.py signals it when the start-up is orchestrated
+# (ORCHESTRATED set), otherwise for a fixed delay. Usage: wait_stage <stage> <seconds>
+wait_stage() {
+    if [[ -n "$ORCHESTRATED" ]]; then
+        until [[ -e "/tmp/start_$1" ]]; do sleep 0.1; done
+    else
+        sleep "$2"
+    fi
+}